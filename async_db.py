@@ -0,0 +1,258 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+from db_manager import (DBManager, attempts_to_fields, fields_to_attempts, model_to_row, row_to_model,
+                        state_to_fields, state_to_model)
+from metrics import METRICS
+from model_cache import ModelCache
+from storage import MODEL_SELECT
+from model_codec import encode_array_text
+from write_behind import WriteBehindQueue
+
+# How often the Tk side checks whether a request has finished
+POLL_MS = 10
+
+
+def deliver(widget, result, on_done, on_error=None):
+    """
+    Calls on_done(value) on the Tk thread once result is ready.
+
+    result is either a Future from AsyncDBManager, polled with
+    widget.after() so Tk is only ever touched from its own thread, or a
+    plain value from the sync DBManager, delivered right away.
+    """
+    if not isinstance(result, Future):
+        on_done(result)
+        return
+
+    def poll():
+        if not result.done():
+            widget.after(POLL_MS, poll)
+            return
+        error = result.exception()
+        if error is not None:
+            if on_error is None:
+                raise error
+            on_error(error)
+        else:
+            on_done(result.result())
+
+    poll()
+
+
+class ThreadedDBManager(DBManager):
+    """
+    DBManager whose model lookups that miss the cache run on a worker
+    thread and return Futures (see deliver); everything else stays inline.
+
+    For backends that are local but may go to the network on a miss
+    (LocalFirstBackend reads through to the remote), so a login never
+    waits on it in the Tk thread.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reads = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-read")
+
+    def get_model(self, user_id: str):
+        cached = self.cache.get(user_id)
+        if cached is not None:
+            done = Future()
+            done.set_result(cached)
+            return done
+        return self.reads.submit(self._load_model_timed, user_id)
+
+    @METRICS.timed("db.get_model")
+    def _load_model_timed(self, user_id):
+        return self._load_model(user_id)
+
+    def close(self):
+        self.reads.shutdown()
+        super().close()
+
+
+class AsyncDBManager:
+    """
+    DBManager with the same methods, run on a background asyncio loop.
+
+    Every call returns a concurrent.futures.Future immediately, so the Tk
+    mainloop never waits on Supabase. All requests share one AsyncClient,
+    i.e. one pooled HTTP client. Cache hits complete without touching the
+    loop at all.
+    """
+
+    def __init__(self, url: str, key: str, cache: ModelCache = None, client=None,
+                 write_behind: float = None):
+        self.cache = cache if cache is not None else ModelCache()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="db-loop", daemon=True)
+        self.thread.start()
+
+        self.supabase = client
+        self.connecting = None
+        if client is None:
+            self.connecting = self._submit(self._connect(url, key))
+        # listener(user_id, model) after every model write (see DBManager)
+        self.model_listeners = []
+        # Adaptive updates coalesced and flushed every write_behind seconds (see DBManager)
+        self.writes = None
+        if write_behind is not None:
+            self.writes = WriteBehindQueue(self._write_updates, write_behind)
+
+    def add_model_listener(self, listener):
+        """Same as DBManager.add_model_listener; listeners run on the loop thread."""
+        self.model_listeners.append(listener)
+
+    def _notify(self, user_id, model):
+        for listener in self.model_listeners:
+            listener(user_id, model)
+
+    def _submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    async def _connect(self, url, key):
+        # Imported here, on the loop thread: supabase alone takes ~1 s to import
+        from supabase import acreate_client
+        self.supabase = await acreate_client(url, key)
+
+    async def _client(self):
+        if self.supabase is None:
+            await asyncio.wrap_future(self.connecting)
+        return self.supabase
+
+    def _write_updates(self, updates):
+        # Runs on the write-behind thread; the requests themselves go out concurrently
+        self._submit(self._update_models(updates)).result()
+
+    def flush(self):
+        """Writes any queued adaptive updates now."""
+        if self.writes is not None:
+            self.writes.flush()
+
+    def close(self):
+        if self.writes is not None:
+            self.writes.close()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    # --- Public API (mirrors DBManager, returns Futures) ---
+    def register_user(self, username: str):
+        return self._submit(self._register_user(username))
+
+    def save_model(self, user_id: str, transform_matrix, mean_vector, threshold: float,
+                   online_state=None, training_samples=None):
+        return self._submit(self._save_model(user_id, transform_matrix, mean_vector, threshold,
+                                             online_state, training_samples))
+
+    def update_online_model(self, user_id: str, state):
+        return self._submit(self._update_online_model(user_id, state))
+
+    def update_mean_vector(self, user_id: str, mean_vector):
+        return self._submit(self._update_mean_vector(user_id, mean_vector))
+
+    def save_recent_attempts(self, user_id: str, vectors):
+        return self._submit(self._update_model(user_id, attempts_to_fields(vectors)))
+
+    def get_recent_attempts(self, user_id: str):
+        return self._submit(self._get_recent_attempts(user_id))
+
+    def get_model(self, user_id: str):
+        cached = self.cache.get(user_id)
+        if cached is not None:
+            done = Future()
+            done.set_result(cached)
+            return done
+        return self._submit(self._get_model(user_id))
+
+    # --- Coroutines (run on the loop thread) ---
+    # Timed on the loop, from the request going out to its reply
+    @METRICS.timed("db.register_user")
+    async def _register_user(self, username):
+        supabase = await self._client()
+        resp = await supabase.table("users").upsert(
+            {"username": username}, on_conflict="username"
+        ).execute()
+        if resp.data:
+            return resp.data[0]
+        return None
+
+    @METRICS.timed("db.save_model")
+    async def _save_model(self, user_id, transform_matrix, mean_vector, threshold, online_state,
+                          training_samples):
+        supabase = await self._client()
+        data = model_to_row(user_id, transform_matrix, mean_vector, threshold, online_state,
+                            training_samples)
+        if self.writes is not None:
+            # discard() waits out a batch in flight, which needs this loop: wait off it
+            queued = await self.loop.run_in_executor(None, self.writes.discard, user_id) or {}
+            if "recent_attempts" in queued:
+                data["recent_attempts"] = queued["recent_attempts"]
+
+        await supabase.table("biometrics").upsert(data, on_conflict="user_id").execute()
+
+        model = {
+            "transform_matrix": np.asarray(transform_matrix),
+            "mean_vector": np.asarray(mean_vector),
+            "threshold": float(threshold),
+            "online_state": online_state
+        }
+        self.cache.put(user_id, model)
+        self._notify(user_id, model)
+
+    @METRICS.timed("db.update_online_model")
+    async def _update_online_model(self, user_id, state):
+        await self._update_model(user_id, state_to_fields(state))
+
+        model = state_to_model(state)
+        self.cache.put(user_id, model)
+        self._notify(user_id, model)
+
+    @METRICS.timed("db.update_mean_vector")
+    async def _update_mean_vector(self, user_id, mean_vector):
+        await self._update_model(user_id, {
+            "mean_vector": encode_array_text(mean_vector)
+        })
+
+        self.cache.update(user_id, mean_vector=np.asarray(mean_vector))
+        self._notify(user_id, {"mean_vector": np.asarray(mean_vector)})
+
+    async def _update_model(self, user_id, fields):
+        if self.writes is not None:
+            self.writes.put(user_id, fields)
+            return
+        supabase = await self._client()
+        await supabase.table("biometrics").update(fields).eq("user_id", user_id).execute()
+
+    async def _update_models(self, updates):
+        supabase = await self._client()
+        await asyncio.gather(*(
+            supabase.table("biometrics").update(fields).eq("user_id", user_id).execute()
+            for user_id, fields in updates
+        ))
+
+    @METRICS.timed("db.get_recent_attempts")
+    async def _get_recent_attempts(self, user_id):
+        queued = self.writes.get(user_id) if self.writes is not None else None
+        if queued and "recent_attempts" in queued:
+            return fields_to_attempts(queued["recent_attempts"])
+        supabase = await self._client()
+        resp = await supabase.table("biometrics").select("recent_attempts").eq("user_id", user_id).execute()
+        if resp.data:
+            return fields_to_attempts(resp.data[0]["recent_attempts"])
+        return None
+
+    @METRICS.timed("db.get_model")
+    async def _get_model(self, user_id):
+        supabase = await self._client()
+        resp = await supabase.table("biometrics").select(MODEL_SELECT).eq("user_id", user_id).execute()
+        if resp.data:
+            record = resp.data[0]
+            if self.writes is not None:
+                record.update(self.writes.get(user_id) or {})
+            model = row_to_model(record)
+            self.cache.put(user_id, model)
+            return model
+        return None
@@ -0,0 +1,101 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+
+import numpy as np
+
+from async_db import AsyncDBManager, deliver
+from db_manager_test import FakeSupabase, FakeQuery
+
+
+class SlowQuery(FakeQuery):
+    async def execute(self):
+        await asyncio.sleep(self.db.latency)
+        return super().execute()
+
+
+class SlowAsyncSupabase(FakeSupabase):
+    """Async stand-in with injected network latency per round trip."""
+
+    def __init__(self, latency):
+        super().__init__()
+        self.latency = latency
+
+    def table(self, name):
+        return SlowQuery(self, name)
+
+
+class FakeTk:
+    """Single-threaded after() scheduler standing in for the Tk mainloop."""
+
+    def __init__(self):
+        self.timers = []
+        self.order = itertools.count()
+
+    def after(self, ms, callback):
+        heapq.heappush(self.timers, (time.monotonic() + ms / 1000, next(self.order), callback))
+
+    def run_until(self, condition, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            assert time.monotonic() < deadline, "mainloop timed out"
+            if self.timers and self.timers[0][0] <= time.monotonic():
+                heapq.heappop(self.timers)[2]()
+            else:
+                time.sleep(0.001)
+
+
+def test_mainloop_keeps_running_while_requests_are_in_flight():
+    latency = 0.1
+    client = SlowAsyncSupabase(latency)
+    db = AsyncDBManager(None, None, client=client)
+    tk = FakeTk()
+
+    # A UI heartbeat, like redraws and key events, every 10 ms
+    ticks = []
+
+    def heartbeat():
+        ticks.append(time.monotonic())
+        tk.after(10, heartbeat)
+
+    heartbeat()
+
+    results = {}
+
+    def on_user(user):
+        results["thread"] = threading.current_thread()
+        results["user"] = user
+
+    start = time.monotonic()
+    future = db.register_user("alice")  # returns immediately
+    assert time.monotonic() - start < latency
+    deliver(tk, future, on_user)
+    tk.run_until(lambda: "user" in results)
+
+    # The injected round-trip latency went by, the loop kept ticking, and
+    # the callback ran on the mainloop thread.
+    elapsed = time.monotonic() - start
+    assert elapsed >= latency
+    assert len([t for t in ticks if t > start]) >= 0.5 * elapsed / 0.010
+    assert results["thread"] is threading.main_thread()
+    assert results["user"]["username"] == "alice"
+
+    # Save then load: the load is a cache hit and doesn't touch the network
+    user_id = results["user"]["id"]
+    done = []
+    deliver(tk, db.save_model(user_id, np.full(3, 0.02), np.full(3, 0.1), 3.0), done.append)
+    tk.run_until(lambda: done)
+    trips = client.round_trips
+    deliver(tk, db.get_model(user_id), done.append)
+    assert client.round_trips == trips and np.array_equal(done[-1]["mean_vector"], np.full(3, 0.1))
+
+    errors = []
+    deliver(tk, db._submit(_fail()), done.append, errors.append)
+    tk.run_until(lambda: errors)
+    db.close()
+
+
+async def _fail():
+    raise ConnectionError("network down")
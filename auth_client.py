@@ -0,0 +1,241 @@
+"""
+Client for the verification daemon (auth_daemon.py).
+
+    client = AuthClient("unix:/tmp/bioauth.sock")   # or "127.0.0.1:7710"
+    user = client.register_user("alice")
+    client.enroll(user["id"], samples)
+    accepted, distance, score, replay = client.verify(user["id"], features)
+
+Protocol: every message, either way, is a 4-byte big-endian length and
+then that many bytes of UTF-8 JSON. A request is {"op": ..., "id": n,
+...fields}; its response echoes "id" and has "ok": true plus the
+results, or "ok": false and "error". Requests on one connection are
+answered in order, and a connection is kept open between requests
+(until the daemon's idle timeout).
+"""
+import json
+import socket
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Largest message either side accepts
+MAX_FRAME = 4 * 2**20
+HEADER = struct.Struct(">I")
+
+
+class AuthDaemonError(Exception):
+    """The daemon answered a request with an error (or was too busy to take it)."""
+
+
+def parse_address(address):
+    """"unix:/path" or a path -> the path; "host:port" -> (host, port)."""
+    if isinstance(address, tuple):
+        return address
+    if address.startswith("unix:"):
+        return address[len("unix:"):]
+    if "/" in address:
+        return address
+    host, _, port = address.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+
+def encode_frame(message):
+    body = json.dumps(message, separators=(",", ":")).encode("utf-8")
+    if len(body) > MAX_FRAME:
+        raise ValueError(f"message of {len(body)} bytes is over MAX_FRAME")
+    return HEADER.pack(len(body)) + body
+
+
+def _features(x):
+    return np.asarray(x, dtype=float).tolist()
+
+
+def _verify_result(response):
+    # An unusable attempt has no replay field
+    return response["accepted"], response["distance"], response["score"], response.get("replay", False)
+
+
+class AuthClient:
+    """
+    Blocking client over one persistent connection; safe to share
+    between threads (calls take turns). If the daemon closed an idle
+    connection, the next call reconnects and resends once: a request
+    that never got a single response byte was never processed.
+
+    Also answers register_user and get_model like DBManager, so AuthUI
+    can use it as its db.
+    """
+
+    def __init__(self, address, timeout=5.0):
+        self.address = parse_address(address)
+        self.timeout = timeout
+        self.sock = None
+        self.lock = threading.Lock()
+        self.ids = 0
+
+    def _connect(self):
+        family = socket.AF_UNIX if isinstance(self.address, str) else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.address)
+        except OSError:
+            sock.close()
+            raise
+        if family == socket.AF_INET:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def _recv_exactly(self, n):
+        data = bytearray()
+        while len(data) < n:
+            chunk = self.sock.recv(n - len(data))
+            if not chunk:
+                raise ConnectionResetError("daemon closed the connection")
+            data += chunk
+        return bytes(data)
+
+    def _roundtrip(self, frame):
+        try:
+            self.sock.sendall(frame)
+        except (ConnectionResetError, BrokenPipeError):
+            # The daemon may have answered ("busy") and closed before we sent;
+            # read that answer, or fail below with a ConnectionResetError
+            pass
+        length, = HEADER.unpack(self._recv_exactly(HEADER.size))
+        if length > MAX_FRAME:
+            raise AuthDaemonError(f"response of {length} bytes is over MAX_FRAME")
+        return json.loads(self._recv_exactly(length))
+
+    def call(self, op, **fields):
+        """Sends one request and returns its response dict (raises AuthDaemonError if not ok)."""
+        with self.lock:
+            self.ids += 1
+            frame = encode_frame({"op": op, "id": self.ids, **fields})
+            reused = self.sock is not None
+            if not reused:
+                self.sock = self._connect()
+            try:
+                response = self._roundtrip(frame)
+            except (ConnectionResetError, BrokenPipeError):
+                self.close_socket()
+                if not reused:
+                    raise
+                # Most likely closed while idle; nothing of this request was read
+                self.sock = self._connect()
+                try:
+                    response = self._roundtrip(frame)
+                except OSError:
+                    self.close_socket()
+                    raise
+            except OSError:
+                self.close_socket()
+                raise
+        if not response.get("ok"):
+            raise AuthDaemonError(response.get("error", "request failed"))
+        return response
+
+    def close_socket(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def close(self):
+        with self.lock:
+            self.close_socket()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- Operations ---
+    def ping(self):
+        """The pid of the worker process that answered."""
+        return self.call("ping")["pid"]
+
+    def register_user(self, username):
+        return self.call("register", username=username)["user"]
+
+    def get_model(self, user_id):
+        """The stored model with arrays decoded (no online_state), or None."""
+        model = self.call("get_model", user_id=user_id)["model"]
+        if model is None:
+            return None
+        return {
+            "transform_matrix": np.asarray(model["transform_matrix"]),
+            "mean_vector": np.asarray(model["mean_vector"]),
+            "threshold": float(model["threshold"]),
+            "online_state": None,
+        }
+
+    def enroll(self, user_id, samples):
+        """Trains and stores a model from enrollment feature vectors; returns get_model's dict."""
+        self.call("enroll", user_id=user_id, samples=[_features(x) for x in samples])
+        return self.get_model(user_id)
+
+    def verify(self, user_id, features, adapt=False):
+        """
+        (is_authenticated, distance, score, replay): authenticate's result,
+        except that a near-repeat of a recent accepted attempt is not
+        authenticated and has replay True. adapt=True lets the daemon apply
+        the adaptive update on a confident accept.
+        """
+        response = self.call("verify", user_id=user_id, features=_features(features), adapt=adapt)
+        return _verify_result(response)
+
+    def verify_events(self, user_id, char_codes, event_types, timestamps_ns, adapt=False):
+        """verify from raw key events (KeystrokeBuffer.view()); the daemon extracts features."""
+        response = self.call("verify", user_id=user_id, adapt=adapt, events={
+            "codes": np.asarray(char_codes).tolist(),
+            "types": np.asarray(event_types).tolist(),
+            "timestamps_ns": np.asarray(timestamps_ns).tolist(),
+        })
+        return _verify_result(response)
+
+    def identify(self, features, k=5):
+        """The k closest enrolled users as [(user_id, distance), ...]."""
+        return [tuple(m) for m in self.call("identify", features=_features(features), k=k)["matches"]]
+
+
+class ThreadedAuthClient:
+    """
+    AuthClient for the Tk thread: every call runs on a worker thread and
+    returns a Future (see async_db.deliver), so a slow or unreachable
+    daemon never blocks the window, and its errors (AuthDaemonError,
+    OSError) reach deliver's on_error. Calls run one at a time, in order.
+    """
+
+    def __init__(self, address, timeout=5.0):
+        self.client = AuthClient(address, timeout)
+        self.calls = ThreadPoolExecutor(max_workers=1, thread_name_prefix="auth-client")
+
+    def close(self):
+        self.calls.shutdown()
+        self.client.close()
+
+    def ping(self):
+        return self.calls.submit(self.client.ping)
+
+    def register_user(self, username):
+        return self.calls.submit(self.client.register_user, username)
+
+    def get_model(self, user_id):
+        return self.calls.submit(self.client.get_model, user_id)
+
+    def enroll(self, user_id, samples):
+        return self.calls.submit(self.client.enroll, user_id, samples)
+
+    def verify(self, user_id, features, adapt=False):
+        return self.calls.submit(self.client.verify, user_id, features, adapt)
+
+    def verify_events(self, user_id, char_codes, event_types, timestamps_ns, adapt=False):
+        return self.calls.submit(self.client.verify_events, user_id, char_codes, event_types,
+                                 timestamps_ns, adapt)
+
+    def identify(self, features, k=5):
+        return self.calls.submit(self.client.identify, features, k)
@@ -0,0 +1,379 @@
+"""
+Headless verification daemon: register / enroll / verify / identify over
+a Unix-domain or localhost TCP socket, without the GUI stack.
+
+    python auth_daemon.py --socket /tmp/bioauth.sock --workers 4 --sqlite bioauth.db
+    python auth_daemon.py --tcp 127.0.0.1:7710 --storage local-first
+
+Pre-fork model: the parent binds one listening socket and starts
+`workers` processes that all accept on it, each running its own asyncio
+loop, BiometricsEngine and DBManager, so a request never crosses a
+process boundary and throughput grows with cores. The parent only
+restarts workers that die. Protocol and client: auth_client.py.
+
+Backpressure: a worker reads a connection's next request only once it
+has answered the last one and the answer has drained to the socket, so
+a client that pipelines faster than it reads stalls only itself. Beyond
+max_connections open connections, a worker answers a new connection
+with a "busy" error and closes it. Connections idle for idle_timeout
+seconds are closed; clients reconnect on the next call.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import sys
+import time
+
+import numpy as np
+
+from auth_client import HEADER, MAX_FRAME, encode_frame, parse_address
+
+# An accepted attempt scoring above this updates the model (as AuthUI does)
+ADAPT_SCORE = 85
+
+
+class RequestError(Exception):
+    """A bad request; reported to the client, the connection stays open."""
+
+
+class DaemonConfig:
+    """Everything a worker needs to build its own engine and DBManager."""
+
+    def __init__(self, storage="sqlite", sqlite_path="bioauth.db", supabase_url=None,
+                 supabase_key=None, scorer="manhattan", cache_size=4096, cache_ttl=1.0,
+                 max_connections=256, idle_timeout=60.0, index_refresh=60.0):
+        self.storage = storage
+        self.sqlite_path = sqlite_path
+        self.supabase_url = supabase_url
+        self.supabase_key = supabase_key
+        self.scorer = scorer
+        # Short: another worker's adaptive update shows up within cache_ttl
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        # Identification index age before a rebuild picks up other workers' enrollments
+        self.index_refresh = index_refresh
+
+
+class Worker:
+    """One daemon process: answers requests from its share of the connections."""
+
+    def __init__(self, config):
+        # Imported here so the supervising parent never loads the scoring stack
+        from biometrics import BiometricsEngine
+        from db_manager import DBManager
+        from model_cache import ModelCache
+        from replay_guard import ReplayGuard
+        from scorers import get_scorer
+        from storage import create_backend
+
+        self.config = config
+        backend = create_backend(config.storage, config.supabase_url, config.supabase_key,
+                                 sqlite_path=config.sqlite_path)
+        self.db = DBManager(cache=ModelCache(config.cache_size, config.cache_ttl), backend=backend)
+        self.bio = BiometricsEngine(get_scorer(config.scorer))
+        self.index = None
+        self.index_built = 0.0
+        self.replays = ReplayGuard(max_users=config.cache_size)
+        self.db.add_model_listener(self._index_update)
+        self.writers = set()  # open connections
+        self.requests = 0
+        self.ops = {
+            "ping": self.op_ping,
+            "register": self.op_register,
+            "get_model": self.op_get_model,
+            "enroll": self.op_enroll,
+            "verify": self.op_verify,
+            "identify": self.op_identify,
+        }
+
+    async def serve(self, sock):
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGTERM, stop.set)
+        loop.add_signal_handler(signal.SIGINT, stop.set)
+        if sock.family == socket.AF_UNIX:
+            server = await asyncio.start_unix_server(self.handle, sock=sock)
+        else:
+            server = await asyncio.start_server(self.handle, sock=sock)
+        await stop.wait()
+        server.close()
+        await server.wait_closed()
+        # Closing a connection ends its handler at the next read
+        for writer in list(self.writers):
+            writer.close()
+        deadline = time.monotonic() + 5
+        while self.writers and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        self.db.close()
+
+    async def handle(self, reader, writer):
+        if len(self.writers) >= self.config.max_connections:
+            writer.write(encode_frame({"ok": False, "error": "busy"}))
+            await _close(writer)
+            return
+        self.writers.add(writer)
+        try:
+            while True:
+                try:
+                    header = await asyncio.wait_for(reader.readexactly(HEADER.size),
+                                                    self.config.idle_timeout)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    return  # closed by the client, or idle
+                length, = HEADER.unpack(header)
+                if length > MAX_FRAME:
+                    writer.write(encode_frame({"ok": False, "error": f"frame of {length} bytes is too large"}))
+                    return
+                try:
+                    body = await reader.readexactly(length)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                writer.write(encode_frame(self.dispatch(body)))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.writers.discard(writer)
+            await _close(writer)
+
+    def dispatch(self, body):
+        request_id = None
+        try:
+            request = json.loads(body)
+            request_id = request.get("id")
+            op = self.ops.get(request.get("op"))
+            if op is None:
+                raise RequestError(f"unknown op {request.get('op')!r}")
+            response = op(request)
+            response.update(id=request_id, ok=True)
+        except (RequestError, ValueError, KeyError, TypeError) as e:
+            response = {"id": request_id, "ok": False, "error": f"{type(e).__name__}: {e}"}
+        except Exception as e:
+            # Storage failures and the like; the worker keeps serving
+            print(f"[ERROR] Daemon request failed: {e!r}")
+            response = {"id": request_id, "ok": False, "error": f"internal error: {e}"}
+        self.requests += 1
+        return response
+
+    # --- Operations ---
+    def op_ping(self, request):
+        return {"pid": os.getpid(), "requests": self.requests, "connections": len(self.writers)}
+
+    def op_register(self, request):
+        return {"user": self.db.register_user(request["username"])}
+
+    def op_get_model(self, request):
+        model = self.db.get_model(request["user_id"])
+        if model is None:
+            return {"model": None}
+        return {"model": {
+            "transform_matrix": np.asarray(model["transform_matrix"]).tolist(),
+            "mean_vector": np.asarray(model["mean_vector"]).tolist(),
+            "threshold": float(model["threshold"]),
+        }}
+
+    def op_enroll(self, request):
+        samples = np.asarray(request["samples"], dtype=float)
+        if samples.ndim != 2 or len(samples) < 2:
+            raise RequestError("samples must be at least two feature vectors")
+        # Same as AuthUI: the model plus the state for online updates
+        transform, mean, threshold, state = self.bio.enroll(samples)
+        self.db.save_model(request["user_id"], transform, mean, threshold, state, samples)
+        return {"threshold": float(threshold)}
+
+    def op_verify(self, request):
+        user_id = request["user_id"]
+        model = self.db.get_model(user_id)
+        if model is None:
+            raise RequestError(f"no model for user {user_id}")
+        x = self._features(request, len(model["mean_vector"]))
+        if x is None:
+            return {"accepted": False, "distance": None, "score": 0.0, "usable": False}
+
+        accepted, distance, score = self.bio.authenticate(
+            x, model["mean_vector"], model["transform_matrix"], model["threshold"])
+        replay = False
+        if accepted:
+            # Re-read: the last accepted attempt may have gone to another worker
+            self.replays.load(user_id, self.db.get_recent_attempts(user_id))
+            if self.replays.is_replay(user_id, x):
+                replay = True
+                accepted = False
+            else:
+                self.replays.record(user_id, x)
+                self.db.save_recent_attempts(user_id, self.replays.history(user_id))
+        adapted = False
+        if (accepted and request.get("adapt") and score > ADAPT_SCORE
+                and np.ndim(model["transform_matrix"]) == 1):
+            self.db.update_online_model(user_id, self.bio.adapt_online_model(model, x))
+            adapted = True
+        return {"accepted": bool(accepted), "distance": float(distance), "score": float(score),
+                "usable": True, "adapted": adapted, "replay": replay}
+
+    def op_identify(self, request):
+        index = self._index()
+        x = self._features(request, index.means.shape[1] if index.means is not None else None)
+        if x is None:
+            return {"matches": []}
+        return {"matches": [[u, d] for u, d in index.query(x, k=int(request.get("k", 5)))]}
+
+    def _features(self, request, n_features):
+        """The request's feature vector, from "features" or raw "events"; None if unusable."""
+        if "features" in request:
+            x = np.asarray(request["features"], dtype=float)
+        elif "events" in request:
+            events = request["events"]
+            codes = np.asarray(events["codes"], dtype=np.int32)
+            X, valid = self.bio.extract_features_batch(
+                codes, np.asarray(events["types"], dtype=np.int8),
+                np.asarray(events["timestamps_ns"], dtype=np.int64), [0, len(codes)],
+                timestamp_scale=1e-9)
+            if not valid[0]:
+                return None
+            x = X[0]
+        else:
+            raise RequestError("request needs features or events")
+        if x.ndim != 1 or (n_features is not None and len(x) != n_features):
+            return None
+        return x
+
+    def _index(self):
+        from identification import IdentificationIndex
+        if self.index is None or time.monotonic() - self.index_built > self.config.index_refresh:
+            self.index = IdentificationIndex.from_db(self.db)
+            self.index_built = time.monotonic()
+        return self.index
+
+    def _index_update(self, user_id, model):
+        if self.index is not None:
+            self.index.update(user_id, model)
+
+
+async def _close(writer):
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except ConnectionError:
+        pass
+
+
+def run_worker(sock, config):
+    """Process entry point."""
+    asyncio.run(Worker(config).serve(sock))
+
+
+class AuthDaemon:
+    """
+    Binds the listening socket and supervises the worker processes.
+
+        with AuthDaemon("unix:/tmp/bioauth.sock", workers=4, config=DaemonConfig()) as daemon:
+            ...
+    """
+
+    def __init__(self, address, workers=2, config=None, backlog=1024):
+        self.address = parse_address(address)
+        self.n_workers = workers
+        self.config = config if config is not None else DaemonConfig()
+        self.backlog = backlog
+        self.sock = None
+        self.processes = []
+        self.stopping = False
+
+    def start(self):
+        import multiprocessing
+
+        if isinstance(self.address, str):
+            if os.path.exists(self.address):
+                os.unlink(self.address)  # a stale socket from a previous run
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(self.address)
+        self.sock.listen(self.backlog)
+        # Connections queue in the backlog until a worker accepts them.
+        # Fresh interpreters (spawn): nothing inherited from whatever threads the parent runs
+        self.context = multiprocessing.get_context("spawn")
+        self.processes = [self._spawn() for _ in range(self.n_workers)]
+        return self
+
+    @property
+    def bound_address(self):
+        """The address clients should use (the real port if 0 was asked for)."""
+        return self.sock.getsockname()
+
+    def _spawn(self):
+        process = self.context.Process(target=run_worker, args=(self.sock, self.config),
+                                       name="auth-worker", daemon=True)
+        process.start()
+        return process
+
+    def supervise(self, interval=1.0):
+        """Restarts dead workers until stop() (or a signal) ends it."""
+        while not self.stopping:
+            for i, process in enumerate(self.processes):
+                if not process.is_alive() and not self.stopping:
+                    print(f"[ERROR] Worker {process.pid} exited ({process.exitcode}); restarting")
+                    self.processes[i] = self._spawn()
+            time.sleep(interval)
+
+    def stop(self, timeout=5.0):
+        self.stopping = True
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()  # SIGTERM: the worker closes its DBManager and exits
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.kill()
+        if self.sock is not None:
+            self.sock.close()
+            if isinstance(self.address, str) and os.path.exists(self.address):
+                os.unlink(self.address)
+            self.sock = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    where = parser.add_mutually_exclusive_group()
+    where.add_argument("--socket", default="/tmp/bioauth.sock", help="Unix socket path")
+    where.add_argument("--tcp", help="host:port (localhost only, no auth on the wire)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--storage", default=os.getenv("STORAGE_BACKEND", "sqlite"))
+    parser.add_argument("--sqlite", default=os.getenv("SQLITE_PATH", "bioauth.db"))
+    parser.add_argument("--scorer", default=os.getenv("SCORER", "manhattan"))
+    parser.add_argument("--max-connections", type=int, default=256, help="per worker")
+    parser.add_argument("--idle-timeout", type=float, default=60.0)
+    args = parser.parse_args(argv)
+
+    config = DaemonConfig(storage=args.storage, sqlite_path=args.sqlite,
+                          supabase_url=os.getenv("SUPABASE_URL"), supabase_key=os.getenv("SUPABASE_KEY"),
+                          scorer=args.scorer, max_connections=args.max_connections,
+                          idle_timeout=args.idle_timeout)
+    daemon = AuthDaemon(args.tcp or args.socket, workers=args.workers, config=config).start()
+    print(f"[INFO] Auth daemon on {daemon.bound_address} with {args.workers} workers")
+
+    def shutdown(signum, frame):
+        daemon.stopping = True
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    try:
+        daemon.supervise()
+    finally:
+        daemon.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
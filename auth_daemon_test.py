@@ -0,0 +1,120 @@
+import time
+
+import numpy as np
+import pytest
+
+from async_db import deliver
+from async_db_test import FakeTk
+from auth_client import AuthClient, AuthDaemonError, ThreadedAuthClient
+from auth_daemon import AuthDaemon, DaemonConfig
+from biometrics import BiometricsEngine
+from db_manager import DBManager
+from load_generator import run
+from model_cache import ModelCache
+from population import TypistPopulation
+from storage import SQLiteBackend
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    config = DaemonConfig(sqlite_path=str(tmp_path / "bioauth.db"), idle_timeout=0.5)
+    with AuthDaemon(f"unix:{tmp_path / 'bioauth.sock'}", workers=2, config=config) as daemon:
+        yield daemon
+
+
+def test_enroll_verify_identify_match_local_scoring(daemon):
+    pop = TypistPopulation(2, seed=0, pause_rate=0, backspace_rate=0)
+    rng = np.random.default_rng(0)
+    bio = BiometricsEngine()
+    with AuthClient(daemon.bound_address) as client:
+        users = [client.register_user(name)["id"] for name in ("alice", "bob")]
+        for u, user_id in enumerate(users):
+            model = client.enroll(user_id, pop.features(np.full(10, u), rng)[0])
+        assert model["transform_matrix"].shape == (pop.n_features,)
+
+        attempts, _ = pop.features([0, 1], rng)
+        model = client.get_model(users[0])
+        for x in attempts:
+            expected = bio.authenticate(x, model["mean_vector"], model["transform_matrix"], model["threshold"])
+            accepted, distance, score, replay = client.verify(users[0], x)
+            assert accepted == expected[0] and np.isclose(distance, expected[1]) and not replay
+        assert client.identify(attempts[1], k=2)[0][0] == users[1]
+
+        # Accepted once; played back (to whichever worker) it is refused
+        assert bio.authenticate(attempts[0], model["mean_vector"], model["transform_matrix"], model["threshold"])[0]
+        for _ in range(3):
+            client.close()  # a new connection may land on the other worker
+            accepted, _, _, replay = client.verify(users[0], attempts[0] + 0.001)
+            assert not accepted and replay
+
+        # Raw events of the same session, with features extracted by the daemon
+        codes, types, timestamps, _ = pop.packed([0], np.random.default_rng(5))
+        x = pop.features([0], np.random.default_rng(5))[0][0]
+        from_events = client.verify_events(users[0], codes, types, np.round(timestamps * 1e9).astype(np.int64))
+        assert np.isclose(from_events[1], client.verify(users[0], x)[1], rtol=1e-6)
+
+        with pytest.raises(AuthDaemonError, match="unknown op"):
+            client.call("nope")
+        with pytest.raises(AuthDaemonError, match="no model"):
+            client.verify("nobody", attempts[0])
+        assert client.get_model("nobody") is None
+
+
+def test_adaptive_verify_keeps_the_online_state(daemon):
+    pop = TypistPopulation(1, seed=0, pause_rate=0, backspace_rate=0)
+    rng = np.random.default_rng(0)
+    # The client's models carry no online state; read it from the daemon's database
+    stored = DBManager(backend=SQLiteBackend(daemon.config.sqlite_path), cache=ModelCache(ttl=0))
+    with AuthClient(daemon.bound_address) as client:
+        user_id = client.register_user("carol")["id"]
+        client.enroll(user_id, pop.features(np.zeros(10, int), rng)[0])
+        model = stored.get_model(user_id)
+        assert model["online_state"] is not None
+
+        # Closer to the mean than most attempts, so confident enough to adapt on
+        y = pop.features([0], rng)[0][0]
+        x = model["mean_vector"] + 0.5 * (y - model["mean_vector"])
+        assert client.verify(user_id, x, adapt=True)[0]
+        adapted = stored.get_model(user_id)
+        assert adapted["online_state"].count == model["online_state"].count + 1
+        assert model["threshold"] <= adapted["threshold"] < 1.3 * model["threshold"]
+    stored.close()
+
+
+def test_idle_connections_reconnect(daemon):
+    with AuthClient(daemon.bound_address) as client:
+        client.ping()
+        time.sleep(1.0)  # past idle_timeout: the daemon closes the connection
+        assert client.ping() > 0
+
+
+def test_unreachable_daemon_errors_reach_deliver(tmp_path):
+    client = ThreadedAuthClient(f"unix:{tmp_path / 'missing.sock'}", timeout=0.5)
+    tk = FakeTk()
+    results, errors = [], []
+    try:
+        # Returns at once; the failed connect surfaces as on_error, not a raise
+        deliver(tk, client.register_user("alice"), results.append, errors.append)
+        deliver(tk, client.verify(1, [0.1, 0.2]), results.append, errors.append)
+        tk.run_until(lambda: len(errors) == 2)
+    finally:
+        client.close()
+    assert results == []
+    assert all(isinstance(error, OSError) for error in errors)
+
+
+def test_busy_beyond_max_connections(tmp_path):
+    config = DaemonConfig(sqlite_path=str(tmp_path / "bioauth.db"), max_connections=1)
+    with AuthDaemon(f"unix:{tmp_path / 'bioauth.sock'}", workers=1, config=config) as daemon:
+        with AuthClient(daemon.bound_address) as first, AuthClient(daemon.bound_address) as second:
+            first.ping()
+            with pytest.raises(AuthDaemonError, match="busy"):
+                second.ping()
+
+
+def test_load_generator_reports_each_worker_count():
+    report = run(worker_counts=(1, 2), n_clients=2, n_requests=20, n_users=4, verbose=False)
+    assert set(report) == {1, 2}
+    for result in report.values():
+        assert result["requests"] == 40 and result["throughput"] > 0
+        assert result["p50_us"] <= result["p99_us"] <= result["max_us"]
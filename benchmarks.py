@@ -0,0 +1,567 @@
+"""
+Performance benchmarks for the capture -> extract -> train -> authenticate
+pipeline.
+
+    python benchmarks.py --out results.json
+    python benchmarks.py --baseline baseline.json --tolerance 0.25
+
+run_suite() times every hot path over the requested sizes and writes
+machine-readable JSON; with --baseline the run fails (exit 1) when any
+case is slower than the baseline by more than the tolerance.
+
+benchmarks_baseline.json is a --quick run, checked in as the reference:
+
+    python benchmarks.py --quick --baseline benchmarks_baseline.json
+
+Timings are machine specific; on other hardware, regenerate it first
+(python benchmarks.py --quick --out benchmarks_baseline.json) from the
+commit to compare against.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import tracemalloc
+import uuid
+import threading
+import time
+
+import numpy as np
+
+from biometrics import EVENT_DOWN, EVENT_UP, BiometricsEngine, encode_char, pack_key_events
+from keystroke_buffer import TIMESTAMP_SCALE, KeystrokeBuffer, clock
+from micro_batch import MicroBatchAuthenticator
+from model_codec import encode_array_text, decode_array_text
+from model_store import ModelStore
+from db_manager import DBManager, model_to_row, row_to_model
+from model_cache import ModelCache
+from online_model import OnlineModelState
+from scorers import MahalanobisScorer, ScaledManhattanScorer
+from storage import SQLiteBackend
+
+PASSPHRASE = "The quick brown fox jumps over the lazy dog"
+N_FEATURES = 2 * len(PASSPHRASE) - 1
+
+
+def phrase_of_length(n):
+    """PASSPHRASE repeated or cut to n characters."""
+    return (PASSPHRASE * (n // len(PASSPHRASE) + 1))[:n]
+
+
+def make_sessions(phrase, n_sessions, rng, dwell_mean=0.1, flight_mean=0.15, noise=0.01):
+    """n_sessions key event streams [(char, 'down'/'up', t), ...] typing phrase."""
+    n = len(phrase)
+    dwell = np.maximum(0.01, rng.normal(dwell_mean, noise, size=(n_sessions, n)))
+    flight = np.maximum(0.01, rng.normal(flight_mean, noise, size=(n_sessions, n)))
+    flight[:, -1] = 0.0
+    downs = np.cumsum(dwell + flight, axis=1) - dwell - flight
+    ups = downs + dwell
+
+    sessions = []
+    for d, u in zip(downs.tolist(), ups.tolist()):
+        events = []
+        for char, t_down, t_up in zip(phrase, d, u):
+            events.append((char, 'down', t_down))
+            events.append((char, 'up', t_up))
+        sessions.append(events)
+    return sessions
+
+
+def make_models(n_users, rng):
+    """Random (attempts, means, stds, thresholds) shaped like real models."""
+    means = rng.uniform(0.05, 0.25, size=(n_users, N_FEATURES))
+    stds = means * rng.uniform(0.1, 0.3, size=(n_users, N_FEATURES))
+    attempts = means + rng.normal(0, 1, size=means.shape) * stds
+    thresholds = np.full(n_users, float(N_FEATURES))
+    return attempts, means, stds, thresholds
+
+
+def bench_authenticate(n_requests=20000, n_clients=8, seed=0):
+    """Requests/sec of authenticate: scalar loop vs one batch vs the micro-batch queue."""
+    bio = BiometricsEngine()
+    attempts, means, stds, thresholds = make_models(n_requests, np.random.default_rng(seed))
+
+    start = time.perf_counter()
+    for i in range(n_requests):
+        bio.authenticate(attempts[i], means[i], stds[i], thresholds[i])
+    scalar = n_requests / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    bio.authenticate_batch(attempts, means, stds, thresholds)
+    batch = n_requests / (time.perf_counter() - start)
+
+    # Concurrent callers, each submitting a slice of the requests
+    batcher = MicroBatchAuthenticator(bio, max_batch=256, max_wait=0.002)
+    per_client = n_requests // n_clients
+
+    def client(c):
+        rows = range(c * per_client, (c + 1) * per_client)
+        futures = [batcher.submit(attempts[i], means[i], stds[i], thresholds[i]) for i in rows]
+        for f in futures:
+            f.result()
+
+    threads = [threading.Thread(target=client, args=(c,)) for c in range(n_clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    queued = per_client * n_clients / (time.perf_counter() - start)
+    batcher.close()
+
+    print(f"authenticate scalar:      {scalar:12,.0f} req/s")
+    print(f"authenticate_batch:       {batch:12,.0f} req/s ({batch / scalar:.1f}x)")
+    print(f"MicroBatchAuthenticator:  {queued:12,.0f} req/s ({queued / scalar:.1f}x, {n_clients} clients)")
+    return {"scalar": scalar, "batch": batch, "queued": queued}
+
+
+def bench_model_codec(repeat=2000, seed=0):
+    """Encode/decode time and stored size: legacy JSON lists vs model_codec."""
+    rng = np.random.default_rng(seed)
+    arrays = {
+        "vector": rng.uniform(0.01, 0.3, size=N_FEATURES),
+        "matrix": rng.normal(size=(N_FEATURES, N_FEATURES)),
+    }
+    formats = {
+        "json": (lambda a: json.dumps(a.tolist()), lambda s: np.array(json.loads(s))),
+        "binary f64": (encode_array_text, decode_array_text),
+        "binary f32": (lambda a: encode_array_text(a, np.float32), decode_array_text),
+    }
+
+    results = {}
+    for shape_name, arr in arrays.items():
+        for fmt, (encode, decode) in formats.items():
+            n = repeat if arr.ndim == 1 else max(1, repeat // 20)
+            start = time.perf_counter()
+            for _ in range(n):
+                text = encode(arr)
+            encode_us = (time.perf_counter() - start) / n * 1e6
+
+            start = time.perf_counter()
+            for _ in range(n):
+                decode(text)
+            decode_us = (time.perf_counter() - start) / n * 1e6
+
+            results[f"{shape_name} {fmt}"] = {"encode_us": encode_us, "decode_us": decode_us, "bytes": len(text)}
+            print(f"{shape_name:6} {fmt:10}  encode {encode_us:9.1f} us  decode {decode_us:9.1f} us  "
+                  f"{len(text):7,} bytes")
+    return results
+
+
+def bench_storage(n_users=1000, n_lookups=5000, path=":memory:", seed=0):
+    """Model lookup latency from the SQLite backend with the model cache bypassed."""
+    rng = np.random.default_rng(seed)
+    db = DBManager(backend=SQLiteBackend(path), cache=ModelCache(max_size=0))
+    _, means, stds, thresholds = make_models(n_users, rng)
+    user_ids = []
+    for i in range(n_users):
+        user = db.register_user(f"user{i}")
+        db.save_model(user["id"], stds[i], means[i], thresholds[i])
+        user_ids.append(user["id"])
+
+    order = rng.integers(0, n_users, size=n_lookups)
+    start = time.perf_counter()
+    for i in order:
+        db.get_model(user_ids[i])
+    lookup_us = (time.perf_counter() - start) / n_lookups * 1e6
+    db.close()
+
+    print(f"SQLite get_model (uncached): {lookup_us:9.1f} us")
+    return {"lookup_us": lookup_us}
+
+
+def bench_write_behind(n_users=200, burst=10, seed=0):
+    """
+    Adaptive updates from users verifying in bursts, written inline vs
+    through the write-behind queue, into a SQLite file.
+    """
+    rng = np.random.default_rng(seed)
+    X, means, stds, thresholds = make_models(n_users, rng)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, write_behind in (("inline", None), ("write_behind", 60)):
+            backend = SQLiteBackend(os.path.join(tmp, f"{name}.db"))
+            db = DBManager(backend=backend, write_behind=write_behind)
+            user_ids = [db.register_user(f"user{i}")["id"] for i in range(n_users)]
+            states = []
+            for i, user_id in enumerate(user_ids):
+                db.save_model(user_id, stds[i], means[i], thresholds[i])
+                states.append(OnlineModelState.from_model(stds[i], means[i], thresholds[i]))
+
+            # Rows changed across the pool's connections
+            changes = lambda: sum(conn.total_changes for conn in backend.connections)
+            before = changes()
+            # Every user verifies `burst` times back to back
+            start = time.perf_counter()
+            for i, user_id in enumerate(user_ids):
+                for _ in range(burst):
+                    states[i].update(X[i])
+                    db.update_online_model(user_id, states[i])
+            caller_us = (time.perf_counter() - start) / (n_users * burst) * 1e6
+            db.flush()
+            total_ms = (time.perf_counter() - start) * 1e3
+            rows = changes() - before
+            db.close()
+
+            results[name] = {"rows": rows, "caller_us": caller_us, "total_ms": total_ms}
+            print(f"{name:>13}: {rows:6d} rows written  {caller_us:8.1f} us/update (caller)  "
+                  f"{total_ms:8.1f} ms total")
+    return results
+
+
+def bench_model_store(n_users=1_000_000, n_lookups=100_000, seed=0):
+    """
+    ModelStore memory, build, lookup and snapshot load at n_users, against
+    the per-user dict of float64 arrays get_model returns (measured on 10k).
+    """
+    rng = np.random.default_rng(seed)
+    user_ids = [str(uuid.UUID(int=int(i), version=4)) for i in rng.integers(0, 2**63, n_users)]
+
+    # Per-user cost of the dict-of-arrays models, extrapolated
+    tracemalloc.start()
+    models = {u: {"transform_matrix": rng.random(N_FEATURES), "mean_vector": rng.random(N_FEATURES),
+                  "threshold": 85.0, "online_state": None} for u in user_ids[:10_000]}
+    dict_bytes = tracemalloc.get_traced_memory()[0] / len(models) * n_users
+    tracemalloc.stop()
+    del models
+
+    start = time.perf_counter()
+    store = ModelStore(N_FEATURES, capacity=n_users)
+    chunk = 100_000
+    for lo in range(0, n_users, chunk):
+        hi = min(lo + chunk, n_users)
+        part = ModelStore.from_arrays(user_ids[lo:hi], rng.uniform(0.01, 0.05, (hi - lo, N_FEATURES)),
+                                      rng.uniform(0.05, 0.25, (hi - lo, N_FEATURES)), 85.0)
+        store.means[lo:hi], store.stds[lo:hi], store.thresholds[lo:hi] = part.means, part.stds, part.thresholds
+        store.user_ids[lo:hi] = part.user_ids
+    store.n = n_users
+    store._rehash(len(store.slots))
+    build_s = time.perf_counter() - start
+
+    order = rng.integers(0, n_users, n_lookups)
+    start = time.perf_counter()
+    for i in order:
+        store.get(user_ids[i])
+    lookup_us = (time.perf_counter() - start) / n_lookups * 1e6
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "models.snapshot")
+        start = time.perf_counter()
+        store.save(path)
+        save_s = time.perf_counter() - start
+        start = time.perf_counter()
+        mapped = ModelStore.load(path)
+        load_ms = (time.perf_counter() - start) * 1e3
+        assert np.array_equal(mapped.get(user_ids[123])[1], store.get(user_ids[123])[1])
+        del mapped
+
+    print(f"ModelStore, {n_users} users: {store.nbytes / 2**20:7.0f} MiB  "
+          f"(dict of float64 arrays: ~{dict_bytes / 2**20:.0f} MiB)")
+    print(f"  build {build_s:.1f} s  get {lookup_us:.2f} us  save {save_s:.1f} s  mmap load {load_ms:.1f} ms")
+    return {"store_bytes": store.nbytes, "dict_bytes": dict_bytes, "lookup_us": lookup_us,
+            "load_ms": load_ms}
+
+
+def bench_identification(n_users=100_000, n_queries=200, n_samples=8, seed=0):
+    """1:N identification: IdentificationIndex vs an exact scan of every model."""
+    from identification import IdentificationIndex
+    from population import TypistPopulation
+
+    bio = BiometricsEngine()
+    pop = TypistPopulation(n_users, seed=seed, pause_rate=0, backspace_rate=0)
+    index = IdentificationIndex()
+    for lo in range(0, n_users, 10000):
+        users = np.arange(lo, min(n_users, lo + 10000))
+        X, _ = pop.features(np.repeat(users, n_samples))
+        stds, means, _ = bio.train_models_batch(X.reshape(len(users), n_samples, -1))
+        for u, mean, std in zip(users, means, stds):
+            index._put(int(u), mean, std)
+    start = time.perf_counter()
+    index.build()
+    build_s = time.perf_counter() - start
+
+    owners = np.random.default_rng(seed).integers(0, n_users, size=n_queries)
+    attempts, _ = pop.features(owners, rng=np.random.default_rng(seed + 1))
+    start = time.perf_counter()
+    exact = [index.query(x, k=5, exact=True) for x in attempts]
+    scan_ms = (time.perf_counter() - start) / n_queries * 1e3
+    start = time.perf_counter()
+    found = [index.query(x, k=5) for x in attempts]
+    index_ms = (time.perf_counter() - start) / n_queries * 1e3
+
+    same_top1 = np.mean([a[0] == b[0] for a, b in zip(found, exact)])
+    owner_top5 = np.mean([u in [user for user, _ in r] for u, r in zip(owners, found)])
+    print(f"identification build ({n_users:,} users): {build_s:9.2f} s")
+    print(f"identification exact scan:   {scan_ms:9.2f} ms/query")
+    print(f"identification index:        {index_ms:9.2f} ms/query ({scan_ms / index_ms:.1f}x), "
+          f"top-1 as exact {same_top1:.0%}, owner in top-5 {owner_top5:.0%}")
+    return {"build_s": build_s, "scan_ms": scan_ms, "index_ms": index_ms,
+            "same_top1": same_top1, "owner_top5": owner_top5}
+
+
+def bench_scorers(n_users=200, n_enroll=10, n_attempts=6, seed=0):
+    """Accuracy (EER, FAR/FRR at the trained thresholds) and latency per scorer."""
+    from population import TypistPopulation
+
+    bio = BiometricsEngine()
+    users = np.arange(n_users)
+    pop = TypistPopulation(n_users, seed=seed, pause_rate=0, backspace_rate=0)
+    enroll, _ = pop.features(np.repeat(users, n_enroll), rng=np.random.default_rng(seed + 1))
+    enroll = enroll.reshape(n_users, n_enroll, -1)
+    attempts, _ = pop.features(np.repeat(users, n_attempts), rng=np.random.default_rng(seed + 2))
+    owners = np.repeat(users, n_attempts)
+    genuine = owners[:, None] == users[None, :]
+
+    results = {}
+    for scorer in (ScaledManhattanScorer(), MahalanobisScorer()):
+        start = time.perf_counter()
+        models = [scorer.fit(bio.clean_samples(samples)) for samples in enroll]
+        fit_ms = (time.perf_counter() - start) / n_users * 1e3
+        transforms = np.stack([m[0] for m in models])
+        means = np.stack([m[1] for m in models])
+        thresholds = np.array([m[2] for m in models])
+
+        # Every attempt against every model
+        D = np.stack([scorer.distance_batch(np.broadcast_to(x, means.shape), means, transforms)
+                      for x in attempts])
+        accepted = D <= thresholds
+        far = accepted[~genuine].mean()
+        frr = 1.0 - accepted[genuine].mean()
+        # EER over a common scale: distance relative to each model's threshold
+        rel = D / thresholds
+        cuts = np.quantile(rel, np.linspace(0, 1, 2001))
+        fars = np.array([(rel[~genuine] <= c).mean() for c in cuts])
+        frrs = np.array([(rel[genuine] > c).mean() for c in cuts])
+        j = int(np.argmin(np.abs(fars - frrs)))
+        eer = (fars[j] + frrs[j]) / 2
+
+        i = np.arange(len(attempts)) % n_users
+        start = time.perf_counter()
+        for a, u in zip(attempts, i):
+            bio.authenticate(a, means[u], transforms[u], thresholds[u])
+        auth_us = (time.perf_counter() - start) / len(attempts) * 1e6
+
+        results[scorer.name] = {"eer": eer, "far": far, "frr": frr,
+                                "fit_ms": fit_ms, "authenticate_us": auth_us}
+        print(f"{scorer.name:12} EER {eer:6.2%}  FAR {far:6.2%}  FRR {frr:6.2%}  "
+              f"fit {fit_ms:7.2f} ms  authenticate {auth_us:7.2f} us")
+    return results
+
+
+# --- Suite ---
+DEFAULT_SIZES = {
+    "phrase_len": [20, 43, 100],
+    "samples": [10, 50],
+    "users": [100],
+    "attempts": [1000],
+}
+QUICK_SIZES = {
+    "phrase_len": [43],
+    "samples": [10],
+    "users": [20],
+    "attempts": [200],
+}
+
+
+def time_per_op(fn, n_ops, repeat=3):
+    """Best-of-repeat seconds per op of fn(), which performs n_ops operations."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best / n_ops
+
+
+def suite_cases(bio, phrase_len, samples, users, attempts, rng):
+    """Yields (case name, fn, n_ops) for one combination of sizes."""
+    phrase = phrase_of_length(phrase_len)
+    n_features = 2 * phrase_len - 1
+    p = f"L={phrase_len}"
+
+    sessions = make_sessions(phrase, attempts, rng)
+    packed = pack_key_events(sessions)
+    yield (f"extract_features[{p},N={attempts}]",
+           lambda: [bio.extract_features(ev) for ev in sessions], attempts)
+    yield (f"extract_features_batch[{p},N={attempts}]",
+           lambda: bio.extract_features_batch(*packed), attempts)
+
+    # Per key event work of the Tk handlers: wall clock + tuple list (the
+    # old capture) vs perf_counter_ns + KeystrokeBuffer, then with the
+    # streaming extractor the handlers also feed
+    chars = [char for char, _, _ in sessions[0]]
+    types = [EVENT_DOWN if event_type == 'down' else EVENT_UP for _, event_type, _ in sessions[0]]
+    coded = list(zip([encode_char(c) for c in chars], types))
+    n_events = len(coded) * attempts
+    buffer = KeystrokeBuffer(capacity=len(coded))
+    stream = bio.new_stream(phrase_len, TIMESTAMP_SCALE)
+
+    def list_capture():
+        for _ in range(attempts):
+            keys = []
+            for char, event_type in zip(chars, types):
+                keys.append((char, event_type, time.time()))
+
+    def buffer_capture():
+        for _ in range(attempts):
+            buffer.clear()
+            for code, event_type in coded:
+                buffer.push(code, event_type, clock())
+
+    def key_handlers():
+        for _ in range(attempts):
+            buffer.clear()
+            stream.reset()
+            for code, event_type in coded:
+                timestamp = clock()
+                buffer.push(code, event_type, timestamp)
+                stream.push_code(code, event_type, timestamp)
+    yield f"key_capture_list[{p},N={attempts}]", list_capture, n_events
+    yield f"key_capture_buffer[{p},N={attempts}]", buffer_capture, n_events
+    yield f"key_handlers[{p},N={attempts}]", key_handlers, n_events
+
+    X = np.asarray([bio.extract_features(ev) for ev in make_sessions(phrase, users * samples, rng)])
+    per_user = X.reshape(users, samples, n_features)
+    yield (f"train_model[{p},S={samples},U={users}]",
+           lambda: [bio.train_model(s) for s in per_user], users)
+    yield (f"train_models_batch[{p},S={samples},U={users}]",
+           lambda: bio.train_models_batch(per_user), users)
+
+    means = per_user.mean(axis=1)
+    stds = np.maximum(per_user.std(axis=1), 0.1 * means)
+    thresholds = np.full(users, float(n_features))
+    idx = rng.integers(0, users, size=attempts)
+    A, M, S, T = X[rng.integers(0, len(X), size=attempts)], means[idx], stds[idx], thresholds[idx]
+    yield (f"authenticate[{p},N={attempts}]",
+           lambda: [bio.authenticate(A[i], M[i], S[i], T[i]) for i in range(attempts)], attempts)
+    yield (f"authenticate_batch[{p},N={attempts}]",
+           lambda: bio.authenticate_batch(A, M, S, T), attempts)
+
+    # Mahalanobis: one mat-vec and a norm against a precomputed whitening matrix
+    W = np.stack([MahalanobisScorer().fit(bio.clean_samples(s))[0] for s in per_user])[idx]
+    yield (f"authenticate_mahalanobis[{p},N={attempts}]",
+           lambda: [bio.authenticate(A[i], M[i], W[i], T[i]) for i in range(attempts)], attempts)
+
+    yield (f"adapt_model[{p},N={attempts}]",
+           lambda: [bio.adapt_model(M[i], A[i]) for i in range(attempts)], attempts)
+    state = OnlineModelState.from_samples(per_user[0])
+    yield (f"adapt_online_model[{p},N={attempts}]",
+           lambda: [state.update(A[i]) for i in range(attempts)], attempts)
+
+    # Model rows: codec alone, then DBManager against a local SQLite stand-in
+    rows = [model_to_row(str(u), stds[u], means[u], thresholds[u]) for u in range(users)]
+    yield (f"model_encode[{p},U={users}]",
+           lambda: [model_to_row(str(u), stds[u], means[u], thresholds[u]) for u in range(users)], users)
+    yield (f"model_decode[{p},U={users}]",
+           lambda: [row_to_model(r) for r in rows], users)
+
+    db = DBManager(backend=SQLiteBackend(":memory:"), cache=ModelCache(max_size=0))
+    user_ids = [db.register_user(f"user{u}")["id"] for u in range(users)]
+
+    def save_and_load():
+        for u, user_id in enumerate(user_ids):
+            db.save_model(user_id, stds[u], means[u], thresholds[u])
+            db.get_model(user_id)
+    yield f"db_save_get[{p},U={users}]", save_and_load, users
+
+
+def run_suite(sizes=None, repeat=3, seed=0, verbose=True):
+    """
+    Times every case for each combination of sizes.
+    Returns {"meta": ..., "results": {case: {"seconds_per_op", "ops_per_sec"}}}.
+    """
+    sizes = {**DEFAULT_SIZES, **(sizes or {})}
+    bio = BiometricsEngine()
+    results = {}
+    for phrase_len, samples, users, attempts in itertools.product(
+            sizes["phrase_len"], sizes["samples"], sizes["users"], sizes["attempts"]):
+        rng = np.random.default_rng(seed)
+        for name, fn, n_ops in suite_cases(bio, phrase_len, samples, users, attempts, rng):
+            if name in results:
+                continue  # same case reached through another size combination
+            seconds = time_per_op(fn, n_ops, repeat)
+            results[name] = {"seconds_per_op": seconds, "ops_per_sec": 1.0 / seconds}
+            if verbose:
+                print(f"{name:48} {seconds * 1e6:12.2f} us/op {1.0 / seconds:14,.0f} ops/s")
+
+    meta = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "sizes": sizes,
+        "repeat": repeat,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    return {"meta": meta, "results": results}
+
+
+def compare_results(current, baseline, tolerance=0.25):
+    """
+    Cases slower than the baseline by more than tolerance (0.25 = 25%).
+    Returns [(case, baseline s/op, current s/op, ratio)], worst first.
+    Cases missing from either run are skipped.
+    """
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        ratio = result["seconds_per_op"] / base["seconds_per_op"]
+        if ratio > 1.0 + tolerance:
+            regressions.append((name, base["seconds_per_op"], result["seconds_per_op"], ratio))
+    return sorted(regressions, key=lambda r: -r[3])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="small sizes for a fast check")
+    parser.add_argument("--phrase-len", type=int, nargs="+")
+    parser.add_argument("--samples", type=int, nargs="+", help="enrollment samples per user")
+    parser.add_argument("--users", type=int, nargs="+")
+    parser.add_argument("--attempts", type=int, nargs="+")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown vs the baseline (0.25 = 25%%)")
+    parser.add_argument("--extra", action="store_true",
+                        help="also run the micro-batch, codec size, storage, write-behind, model store, identification and scorer benchmarks")
+    args = parser.parse_args(argv)
+
+    sizes = dict(QUICK_SIZES if args.quick else DEFAULT_SIZES)
+    for key in sizes:
+        value = getattr(args, key)
+        if value:
+            sizes[key] = value
+
+    report = run_suite(sizes, repeat=args.repeat)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.extra:
+        bench_authenticate()
+        bench_model_codec()
+        bench_storage()
+        bench_write_behind()
+        bench_model_store()
+        bench_identification()
+        bench_scorers()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_results(report, baseline, args.tolerance)
+        for name, base, cur, ratio in regressions:
+            print(f"REGRESSION {name}: {base * 1e6:.2f} -> {cur * 1e6:.2f} us/op ({ratio:.2f}x)")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%} of {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,32 @@
+import json
+
+from benchmarks import compare_results, main, run_suite
+
+
+def test_suite_reports_every_hot_path():
+    sizes = {"phrase_len": [10], "samples": [6], "users": [3], "attempts": [5]}
+    report = run_suite(sizes, repeat=1, verbose=False)
+    names = {name.split("[")[0] for name in report["results"]}
+    assert {"extract_features", "train_model", "authenticate", "adapt_model",
+            "model_encode", "model_decode", "db_save_get", "key_capture_list",
+            "key_capture_buffer", "key_handlers"} <= names
+    assert all(r["seconds_per_op"] > 0 for r in report["results"].values())
+    json.dumps(report)
+
+
+def test_regressions_against_baseline(tmp_path):
+    baseline = {"results": {"a": {"seconds_per_op": 1.0}, "b": {"seconds_per_op": 1.0}}}
+    current = {"results": {"a": {"seconds_per_op": 1.2}, "b": {"seconds_per_op": 2.0},
+                           "new": {"seconds_per_op": 9.0}}}
+    assert compare_results(current, baseline, tolerance=0.25) == [("b", 1.0, 2.0, 2.0)]
+
+    # A baseline nothing can beat fails the run
+    path = tmp_path / "baseline.json"
+    out = tmp_path / "out.json"
+    args = ["--phrase-len", "10", "--samples", "6", "--users", "3", "--attempts", "5", "--repeat", "1"]
+    assert main(args + ["--out", str(out)]) == 0
+    report = json.loads(out.read_text())
+    for r in report["results"].values():
+        r["seconds_per_op"] /= 1000
+    path.write_text(json.dumps(report))
+    assert main(args + ["--baseline", str(path)]) == 1
@@ -1,10 +1,178 @@
+from collections import defaultdict, deque
+
 import numpy as np
-from scipy.linalg import fractional_matrix_power
+from online_model import OnlineModelState
+from metrics import METRICS
+from scorers import MANHATTAN, ScaledManhattanScorer, scorer_for
+
+# Packed event encoding used by the batch (array) APIs
+EVENT_DOWN = 0
+EVENT_UP = 1
+BACKSPACE_CODE = -1
+INVALID_CODE = -2
+
+# Flights longer than this (seconds) mean the user paused mid-phrase
+MAX_PAUSE = 2.0
+
+
+def encode_char(char):
+    """Maps a captured char to the integer code used in packed event arrays."""
+    if char == "Key.backspace":
+        return BACKSPACE_CODE
+    if char is None:
+        return INVALID_CODE
+    return ord(char)
+
+
+def decode_char(code):
+    """Inverse of encode_char."""
+    if code == BACKSPACE_CODE:
+        return "Key.backspace"
+    if code == INVALID_CODE:
+        return None
+    return chr(code)
+
+
+def pack_key_events(sessions, timestamp_dtype=np.float64):
+    """
+    Packs a list of key event streams [(char, 'down'/'up', timestamp), ...]
+    into flat arrays (char_codes, event_types, timestamps, offsets).
+    Session i occupies [offsets[i], offsets[i+1]).
+    """
+    lengths = [len(events) for events in sessions]
+    offsets = np.zeros(len(sessions) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    total = int(offsets[-1])
+    char_codes = np.empty(total, dtype=np.int32)
+    event_types = np.empty(total, dtype=np.int8)
+    timestamps = np.empty(total, dtype=timestamp_dtype)
+
+    i = 0
+    for events in sessions:
+        for char, event_type, timestamp in events:
+            char_codes[i] = encode_char(char)
+            event_types[i] = EVENT_DOWN if event_type == 'down' else EVENT_UP
+            timestamps[i] = timestamp
+            i += 1
+
+    return char_codes, event_types, timestamps, offsets
+
+
+class StreamingFeatureExtractor:
+    """
+    Incremental extract_features for a phrase of n_keys keystrokes.
+
+    Feed events in arrival order with push(). Dwell and flight values are
+    filled in as soon as both of their timestamps are known, so once
+    is_complete is True, features() returns the same vector
+    extract_features would in O(1). Streams it can't vouch for (out of
+    order or tied timestamps, extra or dangling keys) never complete, and
+    callers should fall back to extract_features on the raw events.
+    """
+
+    def __init__(self, n_keys, timestamp_scale=1.0):
+        self.n_keys = n_keys
+        # Integer timestamps (e.g. perf_counter_ns with scale 1e-9) are kept
+        # exact; intervals are converted to seconds like extract_features_batch
+        self.timestamp_scale = timestamp_scale
+        self.reset()
+
+    def reset(self):
+        # Fresh buffers, so a vector handed out earlier stays untouched.
+        # Timestamps stay Python numbers and the vector is written through
+        # a memoryview: NumPy item access costs more than the rest of push().
+        self.vector = np.zeros(2 * self.n_keys - 1)
+        self._vector = memoryview(self.vector)
+        self.downs = [0] * self.n_keys
+        self.ups = [0] * self.n_keys
+        self.released = [False] * self.n_keys
+        self.pending_downs = defaultdict(deque)
+        self.n_down = 0
+        self.n_up = 0
+        self.last_ts = None
+        self.rejected = False  # extract_features would return None
+        self.inexact = False   # needs the full extract_features pass
+
+    def push(self, char, event_type, timestamp):
+        """Adds one event. Returns True if it completed the vector."""
+        return self.push_code(encode_char(char), EVENT_DOWN if event_type == 'down' else EVENT_UP,
+                              timestamp)
+
+    def push_code(self, code, event_type, timestamp):
+        """push() for an encoded event (see encode_char, EVENT_DOWN/EVENT_UP)."""
+        if code < 0:
+            self.rejected = True
+        if self.rejected or self.inexact:
+            return False
+
+        if self.last_ts is not None and timestamp <= self.last_ts:
+            # extract_features sorts by time and breaks Down ties by Up order
+            self.inexact = True
+            return False
+        self.last_ts = timestamp
+
+        if event_type == EVENT_DOWN:
+            slot = self.n_down
+            if slot >= self.n_keys:
+                self.inexact = True
+                return False
+            self.downs[slot] = timestamp
+            self.pending_downs[code].append(slot)
+            self.n_down += 1
+            if slot > 0 and self.released[slot - 1]:
+                self._set_flight(slot - 1)
+        else:
+            if not self.pending_downs[code]:
+                return False  # no matching Down, dropped like extract_features
+            # Match with the earliest unmatched down for this char
+            slot = self.pending_downs[code].popleft()
+            self.ups[slot] = timestamp
+            self.released[slot] = True
+            self.n_up += 1
+            self._vector[slot] = timestamp - self.downs[slot]
+            if slot + 1 < self.n_down:
+                self._set_flight(slot)
+
+        return self.is_complete
+
+    def _set_flight(self, slot):
+        # Flight: Down(N+1) - Up(N). Negative flight is VALID (rollover).
+        flight = self.downs[slot + 1] - self.ups[slot]
+        self._vector[self.n_keys + slot] = flight
+        if float(flight) * self.timestamp_scale > MAX_PAUSE:
+            self.rejected = True
+
+    @property
+    def is_complete(self):
+        return (not self.rejected and not self.inexact
+                and self.n_up == self.n_keys)
+
+    @property
+    def is_waiting(self):
+        """Every key is down, but some key-ups haven't arrived yet."""
+        return (not self.rejected and not self.inexact
+                and self.n_down == self.n_keys and self.n_up < self.n_keys)
+
+    def features(self):
+        """The finished feature vector, or None if not complete."""
+        if not self.is_complete:
+            return None
+        if self.timestamp_scale != 1.0:
+            return self.vector * self.timestamp_scale
+        return self.vector
+
 
 class BiometricsEngine:
-    def __init__(self):
-        pass
+    def __init__(self, scorer=None):
+        # Scorer used by fit_model (scorers.py); authenticate reads any model
+        self.scorer = scorer if scorer is not None else MANHATTAN
+
+    def new_stream(self, n_keys, timestamp_scale=1.0):
+        """Creates a StreamingFeatureExtractor for a phrase of n_keys keys."""
+        return StreamingFeatureExtractor(n_keys, timestamp_scale)
 
+    @METRICS.timed("biometrics.extract_features")
     def extract_features(self, key_events):
         """
         Extracts Dwell Times and Flight Times.
@@ -73,21 +241,302 @@ class BiometricsEngine:
                 
                 # Outlier check for pauses (e.g. > 2.0s)
                 # Note: Negative flight is VALID (rollover).
-                if flight > 2.0:
+                if flight > MAX_PAUSE:
                     return None 
                     
                 flight_times.append(flight)
         
         return np.array(dwell_times + flight_times)
 
-    def train_model(self, sample_vectors):
+    # Sessions are processed in blocks of about this many events so the
+    # working set of the batch path stays in cache.
+    BATCH_CHUNK_EVENTS = 1 << 17
+
+    # Longest run of other events between a Down and its Up that the
+    # look-ahead path follows before falling back to full FIFO matching.
+    MAX_ROLLOVER = 8
+
+    @METRICS.timed("biometrics.extract_features_batch")
+    def extract_features_batch(self, char_codes, event_types, timestamps, offsets,
+                               n_keys=None, timestamp_scale=1.0):
         """
-        Computes robust Mean and Standard Deviation vectors.
-        Includes Outlier Removal to ensure the best possible model.
+        Vectorized extract_features over many sessions at once.
+
+        Takes packed arrays (see pack_key_events) and returns (X, valid):
+        X is a (n_sessions, 2*n_keys - 1) matrix of [dwells..., flights...]
+        and valid is a boolean mask. Rows that extract_features would reject
+        (backspace, pause > MAX_PAUSE, no keystrokes) or that don't have
+        exactly n_keys keystrokes are invalid and filled with NaN.
+        If n_keys is None, the largest keystroke count in the batch is used.
+        timestamp_scale converts timestamp units to seconds (1e-9 for ns).
+        """
+        codes = np.asarray(char_codes)
+        events = np.asarray(event_types)
+        ts = np.asarray(timestamps)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        n_sessions = len(offsets) - 1
+
+        # Split on session boundaries into cache-sized blocks
+        targets = np.arange(0, offsets[-1], self.BATCH_CHUNK_EVENTS)
+        bounds = np.unique(np.concatenate([np.searchsorted(offsets, targets), [0, n_sessions]]))
+        blocks = list(zip(bounds[:-1], bounds[1:]))
+
+        def paired_blocks():
+            for first, last in blocks:
+                lo, hi = offsets[first], offsets[last]
+                yield self._pair_keystrokes(codes[lo:hi], events[lo:hi], ts[lo:hi],
+                                            offsets[first:last + 1] - lo)
+
+        paired = paired_blocks()
+        if n_keys is None:
+            paired = list(paired)
+            n_keys = max([int(p[0].max()) for p in paired if len(p[0])] or [0])
+
+        X = np.empty((n_sessions, max(2 * n_keys - 1, 0)))
+        valid = np.zeros(n_sessions, dtype=bool)
+        for (first, last), (counts, bad, ks_down, ks_up) in zip(blocks, paired):
+            self._fill_features(X[first:last], valid[first:last], counts, bad,
+                                ks_down, ks_up, n_keys, timestamp_scale)
+
+        return X, valid
+
+    def _pair_keystrokes(self, codes, events, ts, offsets):
+        """
+        Pairs Down/Up events of a block of sessions into keystrokes.
+        Returns (counts, bad, ks_down, ks_up): keystrokes per session, the
+        sessions rejected outright, and Down/Up times of every keystroke,
+        grouped by session and ordered by Down time within it.
+        """
+        n_sessions = len(offsets) - 1
+        lengths = np.diff(offsets)
+        session_end = np.zeros(len(codes), dtype=bool)
+        session_end[offsets[1:][lengths > 0] - 1] = True
+
+        # 1. Validation for Bad Keys (whole session is rejected)
+        bad = np.zeros(n_sessions, dtype=bool)
+        bad_pos = np.flatnonzero(codes < 0)
+        if bad_pos.size:
+            bad[np.searchsorted(offsets, bad_pos, side='right') - 1] = True
+
+        # 2. Sort events by time within each session. Captured streams are
+        # almost always in order already, so only sort when needed
+        # (lexsort is stable, same as sorted() in extract_features).
+        if np.any((ts[1:] < ts[:-1]) & ~session_end[:-1]):
+            session = np.repeat(np.arange(n_sessions), lengths)
+            time_order = np.lexsort((ts, session))
+            codes = codes[time_order]
+            events = events[time_order]
+            ts = ts[time_order]
+
+        # 3. Regular sessions take the cheap look-ahead path, the rest
+        # replay the full FIFO matching.
+        down_pos, up_pos, irregular = self._pair_adjacent(codes, events, offsets, session_end)
+
+        if irregular is None:
+            # Every session is regular: all Downs are paired, and each
+            # session has as many Downs as Ups.
+            ks_down = ts[down_pos]
+            ks_up = ts[up_pos]
+            if np.any(ks_down[1:] == ks_down[:-1]):
+                ks_session = np.searchsorted(offsets, down_pos, side='right') - 1
+                ks_down, ks_up = self._break_down_ties(ks_session, ks_down, ks_up, up_pos)
+            return lengths // 2, bad, ks_down, ks_up
+
+        session = np.repeat(np.arange(n_sessions), lengths)
+        irregular &= ~bad
+
+        keep = ~irregular[session[down_pos]]
+        down_pos, up_pos = down_pos[keep], up_pos[keep]
+        ks_session = session[down_pos]
+        ks_down = ts[down_pos]
+        ks_up = ts[up_pos]
+        ks_down, ks_up = self._break_down_ties(ks_session, ks_down, ks_up, up_pos)
+
+        sub = irregular[session]
+        pieces = self._pair_fifo(codes[sub], events[sub], ts[sub], session[sub])
+        ks_session = np.concatenate([ks_session, pieces[0]])
+        ks_down = np.concatenate([ks_down, pieces[1]])
+        ks_up = np.concatenate([ks_up, pieces[2]])
+
+        # Keep every session's keystrokes contiguous and in session order
+        by_session = np.argsort(ks_session, kind='stable')
+        counts = np.bincount(ks_session, minlength=n_sessions)
+        return counts, bad, ks_down[by_session], ks_up[by_session]
+
+    def _fill_features(self, X, valid, counts, bad, ks_down, ks_up, n_keys, timestamp_scale):
+        """
+        Writes [dwells..., flights...] rows for one block of sessions.
+        Sessions with exactly n_keys keystrokes reshape straight into rows.
+        """
+        if n_keys == 0:
+            X[:] = np.nan
+            return
+
+        full = counts == n_keys
+        rows = np.flatnonzero(full)
+        if len(rows) < len(counts):
+            keep = np.repeat(full, counts)
+            ks_down, ks_up = ks_down[keep], ks_up[keep]
+            dwell = np.empty((len(rows), n_keys))
+            flight = np.empty((len(rows), n_keys - 1))
+        else:
+            dwell = X[:, :n_keys]
+            flight = X[:, n_keys:]
+
+        downs = ks_down.reshape(-1, n_keys)
+        ups = ks_up.reshape(-1, n_keys)
+        np.subtract(ups, downs, out=dwell)
+        np.subtract(downs[:, 1:], ups[:, :-1], out=flight)
+        if timestamp_scale != 1.0:
+            dwell *= timestamp_scale
+            flight *= timestamp_scale
+
+        # Outlier check for pauses (negative flight is VALID rollover)
+        valid[rows] = ~bad[rows] & ~np.any(flight > MAX_PAUSE, axis=1)
+        if len(rows) < len(counts):
+            X[rows, :n_keys] = dwell
+            X[rows, n_keys:] = flight
+        X[~valid] = np.nan
+
+    def _pair_adjacent(self, codes, events, offsets, session_end):
+        """
+        Pairs each Down with the next event of the same char in its session.
+        That is exact FIFO matching whenever every char strictly alternates
+        Down, Up, Down, Up... Returns (down_pos, up_pos, irregular), where
+        irregular flags sessions that break this (dangling or repeated
+        events, or a rollover deeper than MAX_ROLLOVER), or is None when
+        every session is regular.
+        """
+        n_events = len(codes)
+        is_down = events == EVENT_DOWN
+
+        # Most keys are released before the next one goes down, so check the
+        # very next event with plain slices before chasing rollovers.
+        next_same = np.zeros(n_events, dtype=bool)
+        next_same[:-1] = codes[1:] == codes[:-1]
+        next_same &= ~session_end
+
+        down_pos = np.flatnonzero(is_down)
+        up_pos = down_pos + 1
+        miss = ~next_same[down_pos]
+        up_pos[miss] = -1
+
+        pending = np.flatnonzero(miss)
+        pending = pending[~session_end[down_pos[pending]]]
+        for k in range(2, self.MAX_ROLLOVER + 1):
+            if not pending.size:
+                break
+            src = down_pos[pending]
+            dst = src + k
+            # Stop at the end of the session
+            alive = ~session_end[np.minimum(dst, n_events) - 1]
+            pending, src, dst = pending[alive], src[alive], dst[alive]
+
+            hit = codes[dst] == codes[src]
+            up_pos[pending[hit]] = dst[hit]
+            pending = pending[~hit]
+
+        # Regular means the next same-char event of every Down is an Up, and
+        # every Up is claimed. Claims are distinct, so comparing totals is
+        # enough for the common all-regular case.
+        found = up_pos >= 0
+        all_found = found.all()
+        if all_found and not is_down[up_pos].any() and 2 * len(down_pos) == n_events:
+            return down_pos, up_pos, None
+
+        n_sessions = len(offsets) - 1
+        session = np.repeat(np.arange(n_sessions), np.diff(offsets))
+        irregular = np.zeros(n_sessions, dtype=bool)
+        if not all_found:
+            irregular[session[down_pos[~found]]] = True
+
+        claimed = np.zeros(n_events, dtype=bool)
+        claimed[up_pos[found]] = True
+        irregular[session[claimed & is_down]] = True
+        irregular[session[~is_down & ~claimed]] = True
+
+        return down_pos, up_pos, irregular
+
+    def _pair_fifo(self, codes, events, ts, session):
+        """
+        General Down/Up pairing for a time-ordered stream: each Up matches the
+        earliest pending Down of the same char, Ups with nothing pending are
+        dropped, as in extract_features.
+        """
+        n_events = len(codes)
+        if not n_events:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, ts[:0], ts[:0]
+
+        # A stable sort on the char code alone keeps each (char, session) run
+        # contiguous and in time order, because the stream is session-ordered.
+        shifted = codes - codes.min()
+        if shifted.max() < 2 ** 16:
+            shifted = shifted.astype(np.uint16)
+        order = np.argsort(shifted, kind='stable')
+        s = session[order]
+        c = codes[order]
+        is_down = events[order] == EVENT_DOWN
+        is_up = ~is_down
+
+        new_group = np.ones(n_events, dtype=bool)
+        new_group[1:] = (s[1:] != s[:-1]) | (c[1:] != c[:-1])
+        group_id = np.cumsum(new_group) - 1
+        group_start = np.flatnonzero(new_group)
+
+        # The number of dropped Ups so far is the running max of
+        # (ups - downs), floored at 0, within the group (queue reflection).
+        step = is_up.astype(np.int64) - is_down
+        balance = np.cumsum(step)
+        balance -= (balance - step)[group_start][group_id]
+
+        span = 2 * n_events + 2
+        dropped = np.maximum.accumulate(np.maximum(balance, 0) + group_id * span) - group_id * span
+        dropped_prev = np.zeros_like(dropped)
+        dropped_prev[1:] = dropped[:-1]
+        dropped_prev[group_start] = 0
+        matched_up = is_up & (dropped == dropped_prev)
+
+        # The m-th matched Up of a group pairs with the m-th Down (FIFO)
+        ups_seen = np.cumsum(is_up)
+        ups_seen -= (ups_seen - is_up)[group_start][group_id]
+        rank = (ups_seen - dropped)[matched_up] - 1
+
+        down_pos = np.flatnonzero(is_down)
+        downs_before = np.cumsum(is_down) - is_down
+        up_idx = np.flatnonzero(matched_up)
+        down_idx = down_pos[downs_before[group_start][group_id[up_idx]] + rank]
+
+        # Back to positions in the time-ordered stream, sorted by Down
+        up_pos = order[up_idx]
+        down_pos = order[down_idx]
+        by_down = np.argsort(down_pos)
+        down_pos = down_pos[by_down]
+        up_pos = up_pos[by_down]
+
+        ks_session = session[down_pos]
+        ks_down, ks_up = self._break_down_ties(ks_session, ts[down_pos], ts[up_pos], up_pos)
+        return ks_session, ks_down, ks_up
+
+    def _break_down_ties(self, ks_session, ks_down, ks_up, up_pos):
+        """
+        Keystrokes come ordered by Down position. keystrokes.sort() in
+        extract_features orders by Down timestamp and breaks ties by
+        completion (Up) order, so only equal Down times need re-sorting.
+        """
+        ties = (ks_session[1:] == ks_session[:-1]) & (ks_down[1:] == ks_down[:-1])
+        if np.any(ties):
+            tie_order = np.lexsort((up_pos, ks_down, ks_session))
+            ks_down = ks_down[tie_order]
+            ks_up = ks_up[tie_order]
+        return ks_down, ks_up
+
+    def clean_samples(self, sample_vectors):
+        """
+        Drops the enrollment samples furthest from the median (worst 20%).
         """
         X = np.array(sample_vectors)
         
-        # 1. Outlier Removal (The "Smart" Cleaning)
         # We calculate a temporary median vector (robust center)
         median_vec = np.median(X, axis=0)
         
@@ -102,51 +551,121 @@ class BiometricsEngine:
         # Fallback if too many removed (shouldn't happen with percentile)
         if len(clean_X) < 5:
             clean_X = X
-            
-        # 2. Compute Parameters on CLEAN data
-        mean_vector = np.mean(clean_X, axis=0)
-        
-        # Standard Deviation (Scaling Factor)
-        std_vector = np.std(clean_X, axis=0)
-        
-        # Enforce Minimum Variance (The "Best Math" Fix for Overfitting)
-        # We assume human variance is at least 10% of the duration.
-        # This prevents the denominator from being too small, which would explode the distance.
-        min_std = mean_vector * 0.10
-        std_vector = np.maximum(std_vector, min_std)
-        
-        # 3. Threshold Calculation
-        # Calculate self-distance (Validation)
-        scores = []
-        for x in clean_X:
-            # Scaled Manhattan: sum( |x - mean| / std )
-            dist = np.sum(np.abs(x - mean_vector) / std_vector)
-            scores.append(dist)
-            
-        mu_dist = np.mean(scores)
-        sigma_dist = np.std(scores)
-        
-        # Threshold: Mean + 6.0*Std
-        calculated_threshold = mu_dist + 6.0 * sigma_dist
-        
-        # Enforce Theoretical Lower Bound (Chi-Square Expected Value)
-        # Expected distance for D degrees of freedom is D.
-        # We shouldn't demand better than random chance variation (1 sigma).
-        min_threshold = len(mean_vector) # ~85
-        
-        threshold = max(calculated_threshold, min_threshold)
-        
-        return std_vector, mean_vector, threshold
+        return clean_X
+
+    @METRICS.timed("biometrics.train_model")
+    def train_model(self, sample_vectors):
+        """
+        Computes robust Mean and Standard Deviation vectors.
+        Includes Outlier Removal to ensure the best possible model.
+        """
+        # 1. Outlier Removal (The "Smart" Cleaning)
+        clean_X = self.clean_samples(sample_vectors)
+        return MANHATTAN.fit(clean_X)
 
+    @METRICS.timed("biometrics.fit_model")
+    def fit_model(self, sample_vectors):
+        """
+        train_model with the engine's scorer: (transform_matrix,
+        mean_vector, threshold), where transform_matrix is a std vector
+        (scaled Manhattan) or a whitening matrix (Mahalanobis).
+        """
+        return self.scorer.fit(self.clean_samples(sample_vectors))
+
+    def enroll(self, sample_vectors):
+        """
+        fit_model plus, for scaled Manhattan scorers, the OnlineModelState
+        behind the model (None for other scorers): (transform_matrix,
+        mean_vector, threshold, online_state).
+        """
+        if isinstance(self.scorer, ScaledManhattanScorer):
+            state = self.train_online_model(sample_vectors)
+            return (*state.model(), state)
+        # Other scorers store their own transform (e.g. a whitening matrix)
+        return (*self.fit_model(sample_vectors), None)
+
+    def train_models_batch(self, samples, sample_counts=None):
+        """
+        Vectorized train_model for many users at once.
+
+        samples is a (users, samples, features) array. sample_counts says
+        which samples are real: a per-user count (the first n rows are
+        used) or a (users, samples) boolean mask. Default: all of them.
+        Returns (std_vectors, mean_vectors, thresholds); row u equals
+        train_model(user u's samples) exactly. Users with no samples get
+        NaN rows.
+        """
+        X, counts = self._batch_samples(samples, sample_counts)
+        n_users, _, n_features = X.shape
+
+        stds = np.full((n_users, n_features), np.nan)
+        means = np.full((n_users, n_features), np.nan)
+        thresholds = np.full(n_users, np.nan)
+        for rows, clean_X in self._clean_sample_groups(X, counts):
+            stds[rows], means[rows], thresholds[rows] = MANHATTAN.fit_batch(clean_X)
+        return stds, means, thresholds
+
+    def train_online_models_batch(self, samples, sample_counts=None):
+        """
+        train_online_model for many users (arguments as train_models_batch).
+        Returns a list with an OnlineModelState per user (None without samples).
+        """
+        X, counts = self._batch_samples(samples, sample_counts)
+        states = [None] * len(X)
+        for rows, clean_X in self._clean_sample_groups(X, counts):
+            for row, state in zip(rows, OnlineModelState.from_samples_batch(clean_X)):
+                states[row] = state
+        return states
+
+    def _batch_samples(self, samples, sample_counts):
+        """(X, counts) with each user's samples packed at the front of X."""
+        X = np.asarray(samples, dtype=float)
+        n_users, n_samples, _ = X.shape
+        if sample_counts is None:
+            return X, np.full(n_users, n_samples)
+
+        sample_counts = np.asarray(sample_counts)
+        if sample_counts.ndim == 2:
+            # Move each user's masked samples to the front, in order
+            mask = sample_counts.astype(bool)
+            order = np.argsort(~mask, axis=1, kind="stable")
+            return np.take_along_axis(X, order[:, :, None], axis=1), mask.sum(axis=1)
+        return X, sample_counts.astype(np.int64)
+
+    def _clean_sample_groups(self, X, counts):
+        """
+        Yields (user rows, clean samples (G, n_clean, F)) after the
+        clean_samples outlier cut. Users with the same sample count share
+        one block, so every reduction matches the scalar code exactly.
+        """
+        n_features = X.shape[2]
+        for n in np.unique(counts[counts > 0]):
+            users = np.flatnonzero(counts == n)
+            Xn = X[users, :n]
+
+            # 1. Outlier Removal, as clean_samples
+            median_vec = np.median(Xn, axis=1)
+            distances = np.sum(np.abs(Xn - median_vec[:, None, :]), axis=2)
+            cutoff = np.percentile(distances, 80, axis=1)
+            keep = distances <= cutoff[:, None]
+            n_clean = keep.sum(axis=1)
+            keep[n_clean < 5] = True
+            n_clean = keep.sum(axis=1)
+
+            # Then one block per clean count
+            for c in np.unique(n_clean):
+                group = np.flatnonzero(n_clean == c)
+                yield users[group], Xn[group][keep[group]].reshape(len(group), c, n_features)
+
+    @METRICS.timed("biometrics.authenticate")
     def authenticate(self, attempt_vector, mean_vector, std_vector, threshold):
         """
-        Verifies a user attempt using Scaled Manhattan Distance.
+        Verifies a user attempt using Scaled Manhattan Distance
+        (or Mahalanobis distance for a model with a whitening matrix).
         """
         # 1. Calculate Distance
-        # Vectorized operation: |x - u| / sigma
-        diff = np.abs(attempt_vector - mean_vector)
-        scaled_diff = diff / std_vector
-        distance = np.sum(scaled_diff)
+        # std_vector is a std vector (scaled Manhattan) or a whitening matrix (Mahalanobis)
+        distance = scorer_for(std_vector).distance(attempt_vector, mean_vector, std_vector)
         
         is_authenticated = distance <= threshold
         
@@ -164,6 +683,51 @@ class BiometricsEngine:
             
         return is_authenticated, distance, max(0, score)
 
+    @METRICS.timed("biometrics.authenticate_batch")
+    def authenticate_batch(self, attempt_vectors, mean_vectors, std_vectors, thresholds):
+        """
+        Vectorized authenticate for N attempts at once.
+        Row i of each matrix is one attempt and its claimed user's model.
+        Returns (is_authenticated, distance, score) arrays of length N.
+        """
+        X = np.asarray(attempt_vectors, dtype=float)
+        thresholds = np.asarray(thresholds, dtype=float)
+
+        # Scaled Manhattan per row: sum(|x - u| / sigma), or ||W (x - u)|| for (N, F, F) whitening matrices
+        distances = scorer_for(std_vectors, batch=True).distance_batch(X, mean_vectors, std_vectors)
+        is_authenticated = distances <= thresholds
+
+        # Same piecewise score as authenticate (100% -> 70% -> 0%)
+        scores = np.where(
+            is_authenticated,
+            100 - (30 * (distances / thresholds)),
+            70 - (70 * ((distances - thresholds) / thresholds)),
+        )
+        return is_authenticated, distances, np.maximum(0, scores)
+
     def adapt_model(self, current_mean, new_sample, learning_rate=0.1):
         """EMA Update for Mean Vector."""
         return ((1.0 - learning_rate) * current_mean) + (learning_rate * new_sample)
+
+    @METRICS.timed("biometrics.train_online_model")
+    def train_online_model(self, sample_vectors):
+        """
+        Enrollment as an OnlineModelState; its model() equals train_model's.
+        """
+        return OnlineModelState.from_samples(self.clean_samples(sample_vectors))
+
+    def adapt_online_model(self, model, new_sample):
+        """
+        Online update of mean, std and threshold from one accepted attempt.
+        model is a dict as returned by DBManager.get_model; models saved
+        before online updates get their state seeded from the stored values.
+        Returns the updated OnlineModelState.
+        """
+        state = model.get('online_state')
+        if state is None:
+            state = OnlineModelState.from_model(
+                model['transform_matrix'], model['mean_vector'], model['threshold'])
+        else:
+            # The cached model keeps its state until the new one is saved
+            state = state.copy()
+        return state.update(new_sample)
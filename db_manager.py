@@ -1,56 +1,271 @@
-import json
 import numpy as np
-from supabase import create_client, Client
+
+from metrics import METRICS
+from model_cache import ModelCache
+from model_codec import encode_array_text, decode_array_text
+from online_model import OnlineModelState
+from storage import StorageBackend, SupabaseBackend
+from write_behind import WriteBehindQueue
+
+
+def model_to_row(user_id, transform_matrix, mean_vector, threshold, online_state=None,
+                 training_samples=None):
+    """
+    biometrics row for a model. Arrays use the compact binary encoding.
+    Without training_samples the column is left out, so stored samples stay.
+    """
+    row = {
+        "user_id": user_id,
+        "transform_matrix": encode_array_text(transform_matrix),
+        "mean_vector": encode_array_text(mean_vector),
+        "threshold": threshold,
+        "online_state": online_state.encode() if online_state is not None else None
+    }
+    if training_samples is not None:
+        row["training_samples"] = encode_array_text(np.asarray(training_samples, dtype=float))
+    return row
+
+
+def state_to_fields(state: OnlineModelState):
+    """Columns written by an online model update (model and its state)."""
+    std_vector, mean_vector, threshold = state.model()
+    return {
+        "transform_matrix": encode_array_text(std_vector),
+        "mean_vector": encode_array_text(mean_vector),
+        "threshold": threshold,
+        "online_state": state.encode()
+    }
+
+
+def state_to_model(state: OnlineModelState):
+    """Decoded model dict (as get_model returns) for an online state."""
+    std_vector, mean_vector, threshold = state.model()
+    return {
+        "transform_matrix": std_vector,
+        "mean_vector": mean_vector,
+        "threshold": threshold,
+        "online_state": state
+    }
+
+
+def attempts_to_fields(vectors):
+    """Column written for a user's recent accepted attempts (replay_guard history)."""
+    return {"recent_attempts": encode_array_text(np.asarray(vectors, dtype=np.float32))}
+
+
+def fields_to_attempts(value):
+    """Decodes a recent_attempts column (None when unset)."""
+    return decode_array_text(value) if value else None
+
+
+def row_to_model(record):
+    """Decodes a biometrics row. Reads both binary and legacy JSON rows."""
+    state = record.get('online_state')
+    return {
+        "transform_matrix": decode_array_text(record['transform_matrix']),
+        "mean_vector": decode_array_text(record['mean_vector']),
+        "threshold": float(record['threshold']),
+        "online_state": OnlineModelState.decode(state) if state else None
+    }
+
 
 class DBManager:
-    def __init__(self, url: str, key: str):
-        self.supabase: Client = create_client(url, key)
+    def __init__(self, url: str = None, key: str = None, cache: ModelCache = None,
+                 client=None, backend: StorageBackend = None, write_behind: float = None):
+        # Supabase unless another backend (storage.py) is passed in
+        self.backend = backend if backend is not None else SupabaseBackend(url, key, client)
+        # Decoded models, so repeat logins skip the round trip and JSON parsing
+        self.cache = cache if cache is not None else ModelCache()
+        # Called as listener(user_id, model) after every model write
+        self.model_listeners = []
+        # Adaptive updates coalesced and flushed every write_behind seconds (None: write inline)
+        self.writes = None
+        if write_behind is not None:
+            self.writes = WriteBehindQueue(self.backend.update_models, write_behind)
+
+    def add_model_listener(self, listener):
+        """
+        Registers listener(user_id, model) to run after each model write
+        (e.g. to keep an IdentificationIndex current). model is a decoded
+        model dict; a mean-only update passes just {"mean_vector": ...}.
+        """
+        self.model_listeners.append(listener)
 
+    def _notify(self, user_id, model):
+        for listener in self.model_listeners:
+            listener(user_id, model)
+
+    @METRICS.timed("db.register_user")
     def register_user(self, username: str):
-        """register or login user"""
-        resp = self.supabase.table("users").select("*").eq("username", username).execute()
-        if resp.data:
-            return resp.data[0]
-        
-        resp = self.supabase.table("users").insert({"username": username}).execute()
-        if resp.data:
-            return resp.data[0]
-        return None
+        """
+        register or login user
+        Single atomic upsert on the unique username; returns the existing row
+        or the new one in one round trip.
+        """
+        return self.backend.upsert_user(username)
 
-    def save_model(self, user_id: str, transform_matrix, mean_vector, threshold: float):
+    @METRICS.timed("db.save_model")
+    def save_model(self, user_id: str, transform_matrix, mean_vector, threshold: float,
+                   online_state: OnlineModelState = None, training_samples=None):
         """
         Saves the biometric model.
-        Converts numpy arrays to lists for JSON serialization.
+        Arrays are stored in the compact binary encoding (model_codec).
+        training_samples (the enrollment vectors) are kept for retraining.
         """
-        data = {
-            "user_id": user_id,
-            "transform_matrix": json.dumps(transform_matrix.tolist()),
-            "mean_vector": json.dumps(mean_vector.tolist()),
-            "threshold": threshold
-        }
+        data = model_to_row(user_id, transform_matrix, mean_vector, threshold, online_state,
+                            training_samples)
+        if self.writes is not None:
+            # The new row replaces any adaptive update still queued...
+            queued = self.writes.discard(user_id) or {}
+            # ...but not a queued attempt history, which it doesn't carry
+            if "recent_attempts" in queued:
+                data["recent_attempts"] = queued["recent_attempts"]
         
-        # Upsert logic (check if exists first)
-        resp = self.supabase.table("biometrics").select("*").eq("user_id", user_id).execute()
-        if resp.data:
-             self.supabase.table("biometrics").update(data).eq("user_id", user_id).execute()
+        # Atomic upsert on the unique user_id (one round trip, no race)
+        self.backend.upsert_model(data)
+
+        model = {
+            "transform_matrix": np.asarray(transform_matrix),
+            "mean_vector": np.asarray(mean_vector),
+            "threshold": float(threshold),
+            "online_state": online_state
+        }
+        self.cache.put(user_id, model)
+        self._notify(user_id, model)
+
+    @METRICS.timed("db.save_models_bulk")
+    def save_models_bulk(self, rows):
+        """
+        Writes many model rows (model_to_row) in bulk upserts and drops the
+        cached copies of those users.
+        """
+        if self.writes is not None:
+            rows = list(rows)
+            for i, row in enumerate(rows):
+                queued = self.writes.discard(row["user_id"]) or {}
+                if "recent_attempts" in queued:
+                    rows[i] = dict(row, recent_attempts=queued["recent_attempts"])
+        self.backend.upsert_models(rows)
+        for row in rows:
+            self.cache.invalidate(row["user_id"])
+            if self.model_listeners:
+                self._notify(row["user_id"], row_to_model(row))
+
+    def changed_since(self, rows):
+        """
+        user_ids of rows ({user_id, online_state} as read earlier) whose
+        model has been updated since: the stored or queued online state
+        is no longer the one read.
+        """
+        current = self.backend.fetch_online_states([r["user_id"] for r in rows])
+        changed = set()
+        for row in rows:
+            user_id = row["user_id"]
+            queued = self.writes.get(user_id) if self.writes is not None else None
+            state = (queued or {}).get("online_state", current.get(user_id))
+            if state != row["online_state"]:
+                changed.add(user_id)
+        return changed
+
+    def iter_training_pages(self, page_size: int = 1000, after: str = None):
+        """
+        Yields pages of {user_id, training_samples, online_state} rows in user_id order,
+        using keyset pagination (user_id > last seen), so every page costs
+        the same however deep into the table it is.
+        """
+        return self._iter_pages(self.backend.fetch_training_page, page_size, after)
+
+    def iter_models(self, page_size: int = 1000):
+        """Yields (user_id, decoded model) for every stored model, page by page."""
+        for page in self._iter_pages(self.backend.fetch_model_page, page_size, None):
+            for row in page:
+                yield row["user_id"], row_to_model(row)
+
+    def _iter_pages(self, fetch, page_size, after):
+        while True:
+            page = fetch(after, page_size)
+            if not page:
+                return
+            yield page
+            if len(page) < page_size:
+                return
+            after = page[-1]["user_id"]
+
+    @METRICS.timed("db.update_online_model")
+    def update_online_model(self, user_id: str, state: OnlineModelState):
+        """
+        Adaptive learning: stores the updated mean, std, threshold and the
+        online state behind them in one partial update.
+        With write_behind the write is queued and coalesced instead.
+        """
+        self._update_model(user_id, state_to_fields(state))
+        model = state_to_model(state)
+        self.cache.put(user_id, model)
+        self._notify(user_id, model)
+
+    @METRICS.timed("db.update_mean_vector")
+    def update_mean_vector(self, user_id: str, mean_vector):
+        """
+        Adaptive learning: replaces only the stored mean vector
+        (partial-column update, one round trip).
+        """
+        self._update_model(user_id, {
+            "mean_vector": encode_array_text(mean_vector)
+        })
+
+        self.cache.update(user_id, mean_vector=np.asarray(mean_vector))
+        self._notify(user_id, {"mean_vector": np.asarray(mean_vector)})
+
+    @METRICS.timed("db.save_recent_attempts")
+    def save_recent_attempts(self, user_id: str, vectors):
+        """
+        Stores the user's recent accepted attempts (ReplayGuard.history),
+        as a partial update; queued and coalesced with write_behind.
+        """
+        self._update_model(user_id, attempts_to_fields(vectors))
+
+    @METRICS.timed("db.get_recent_attempts")
+    def get_recent_attempts(self, user_id: str):
+        """The stored recent attempts as an (n, n_features) matrix, or None."""
+        queued = self.writes.get(user_id) if self.writes is not None else None
+        if queued and "recent_attempts" in queued:
+            return fields_to_attempts(queued["recent_attempts"])
+        return fields_to_attempts(self.backend.fetch_recent_attempts(user_id))
+
+    def _update_model(self, user_id, fields):
+        if self.writes is not None:
+            self.writes.put(user_id, fields)
         else:
-             self.supabase.table("biometrics").insert(data).execute()
+            self.backend.update_model(user_id, fields)
 
+    @METRICS.timed("db.get_model")
     def get_model(self, user_id: str):
         """
-        Retrieves model and converts lists back to numpy arrays.
-        """
-        resp = self.supabase.table("biometrics").select("*").eq("user_id", user_id).execute()
-        if resp.data:
-            record = resp.data[0]
-            
-            transform_matrix = np.array(json.loads(record['transform_matrix']))
-            mean_vector = np.array(json.loads(record['mean_vector']))
-            threshold = float(record['threshold'])
-            
-            return {
-                "transform_matrix": transform_matrix,
-                "mean_vector": mean_vector,
-                "threshold": threshold
-            }
+        Retrieves model and decodes arrays back to numpy.
+        """
+        cached = self.cache.get(user_id)
+        if cached is not None:
+            return cached
+        return self._load_model(user_id)
+
+    def _load_model(self, user_id):
+        """get_model past a cache miss: reads, decodes and caches the row."""
+        record = self.backend.fetch_model(user_id)
+        if record is not None:
+            if self.writes is not None:
+                # Queued updates are newer than the stored row
+                record.update(self.writes.get(user_id) or {})
+            model = row_to_model(record)
+            self.cache.put(user_id, model)
+            return model
         return None
+
+    def flush(self):
+        """Writes any queued adaptive updates now."""
+        if self.writes is not None:
+            self.writes.flush()
+
+    def close(self):
+        if self.writes is not None:
+            self.writes.close()
+        self.backend.close()
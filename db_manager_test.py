@@ -0,0 +1,223 @@
+import itertools
+import json
+
+import numpy as np
+
+from db_manager import DBManager
+from model_cache import ModelCache
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeQuery:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.op = None
+        self.payload = None
+        self.filters = []
+        self.order_by = None
+        self.row_limit = None
+
+    def select(self, columns="*"):
+        self.op = "select"
+        return self
+
+    def insert(self, data):
+        self.op, self.payload = "insert", data
+        return self
+
+    def update(self, data):
+        self.op, self.payload = "update", data
+        return self
+
+    def upsert(self, data, on_conflict=""):
+        self.op, self.payload, self.on_conflict = "upsert", data, on_conflict
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda r: r.get(column) == value)
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(lambda r: r.get(column) in values)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda r: r.get(column) is not None and r.get(column) > value)
+        return self
+
+    @property
+    def not_(self):
+        return FakeNot(self)
+
+    def order(self, column):
+        self.order_by = column
+        return self
+
+    def limit(self, n):
+        self.row_limit = n
+        return self
+
+    def execute(self):
+        # Every execute() is one round trip to the server
+        self.db.round_trips += 1
+        rows = self.db.tables.setdefault(self.table, [])
+        matching = [r for r in rows if all(f(r) for f in self.filters)]
+
+        if self.op == "select":
+            if self.order_by:
+                matching.sort(key=lambda r: r[self.order_by])
+            return FakeResponse([dict(r) for r in matching[:self.row_limit]])
+        if self.op == "insert":
+            row = {"id": str(next(self.db.ids)), **self.payload}
+            rows.append(row)
+            return FakeResponse([dict(row)])
+        if self.op == "update":
+            for r in matching:
+                r.update(self.payload)
+            return FakeResponse([dict(r) for r in matching])
+        if self.op == "upsert" and isinstance(self.payload, list):
+            # Bulk upsert: one round trip for every row
+            out = []
+            for payload in self.payload:
+                out.extend(self._upsert(rows, payload))
+            return FakeResponse(out)
+        if self.op == "upsert":
+            return FakeResponse(self._upsert(rows, self.payload))
+        raise ValueError(self.op)
+
+    def _upsert(self, rows, payload):
+        key = payload[self.on_conflict]
+        existing = [r for r in rows if r.get(self.on_conflict) == key]
+        if existing:
+            existing[0].update(payload)
+            return [dict(existing[0])]
+        row = {"id": str(next(self.db.ids)), **payload}
+        rows.append(row)
+        return [dict(row)]
+
+
+class FakeNot:
+    def __init__(self, query):
+        self.query = query
+
+    def is_(self, column, value):
+        assert value == "null"
+        self.query.filters.append(lambda r: r.get(column) is not None)
+        return self.query
+
+
+class FakeSupabase:
+    """In-memory stand-in for the supabase client's table() query builder."""
+
+    def __init__(self):
+        self.tables = {}
+        self.round_trips = 0
+        self.ids = itertools.count(1)
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_model_cache_hits_skip_round_trips():
+    client = FakeSupabase()
+    db = DBManager(None, None, cache=ModelCache(max_size=2, ttl=60), client=client)
+
+    user = db.register_user("alice")
+    db.save_model(user["id"], np.full(3, 0.02), np.full(3, 0.1), 3.0)
+    trips = client.round_trips
+
+    # Served from the write-through entry
+    for _ in range(5):
+        model = db.get_model(user["id"])
+    assert client.round_trips == trips
+    assert np.array_equal(model["mean_vector"], np.full(3, 0.1))
+
+    # Adaptive update writes through, callers' copies stay independent
+    model["mean_vector"] = None
+    db.update_mean_vector(user["id"], np.full(3, 0.12))
+    assert np.array_equal(db.get_model(user["id"])["mean_vector"], np.full(3, 0.12))
+    assert db.cache.stats()["hits"] == 6
+
+
+def test_model_cache_lru_and_ttl_eviction():
+    clock = FakeClock()
+    cache = ModelCache(max_size=2, ttl=10, clock=clock)
+
+    cache.put("a", {"threshold": 1.0})
+    cache.put("b", {"threshold": 2.0})
+    assert cache.get("a") is not None   # a is now most recent
+    cache.put("c", {"threshold": 3.0})  # evicts b
+    assert cache.get("b") is None
+
+    clock.now = 11
+    assert cache.get("a") is None
+
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["expirations"] == 1
+    assert stats["hits"] == 1 and stats["misses"] == 2
+
+
+def test_each_write_is_one_round_trip():
+    client = FakeSupabase()
+    db = DBManager(None, None, client=client)
+
+    def trips(call, *args):
+        before = client.round_trips
+        result = call(*args)
+        return client.round_trips - before, result
+
+    n, user = trips(db.register_user, "bob")
+    assert n == 1
+    n, again = trips(db.register_user, "bob")
+    assert n == 1 and again["id"] == user["id"]
+    assert len(client.tables["users"]) == 1
+
+    for mean in (np.full(3, 0.1), np.full(3, 0.2)):
+        n, _ = trips(db.save_model, user["id"], np.full(3, 0.02), mean, 3.0)
+        assert n == 1
+    assert len(client.tables["biometrics"]) == 1
+
+    n, _ = trips(db.update_mean_vector, user["id"], np.full(3, 0.3))
+    assert n == 1
+
+    db.cache.clear()
+    model = db.get_model(user["id"])
+    assert np.array_equal(model["mean_vector"], np.full(3, 0.3))
+    assert np.array_equal(model["transform_matrix"], np.full(3, 0.02))
+
+
+def test_binary_model_rows_and_legacy_json_rows():
+    client = FakeSupabase()
+    db = DBManager(None, None, client=client)
+
+    std, mean = np.linspace(0.01, 0.05, 85), np.linspace(0.1, 0.3, 85)
+    db.save_model("u1", std, mean, 85.0)
+    row = client.tables["biometrics"][0]
+    assert not row["mean_vector"].startswith("[")
+
+    # Rows written before the binary format hold JSON float lists
+    client.tables["biometrics"].append({
+        "user_id": "u2",
+        "transform_matrix": json.dumps(std.tolist()),
+        "mean_vector": json.dumps(mean.tolist()),
+        "threshold": 85.0,
+    })
+
+    db.cache.clear()
+    for user_id in ("u1", "u2"):
+        model = db.get_model(user_id)
+        assert np.array_equal(model["transform_matrix"], std)
+        assert np.array_equal(model["mean_vector"], mean)
@@ -0,0 +1,291 @@
+import argparse
+import json
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from online_model import THRESHOLD_SIGMAS
+
+# Threshold multipliers (k in mean + k*std) the ROC is evaluated at
+DEFAULT_MULTIPLIERS = np.round(np.arange(0.0, 20.0 + 1e-9, 0.05), 2)
+
+
+class ModelSet:
+    """
+    Enrolled models as arrays; row u belongs to user u.
+
+    Besides mean and std vectors it keeps the mean and std of each model's
+    enrollment self-distances, so the threshold for any multiplier k can
+    be rebuilt exactly as train_model does: max(mean + k*std, D).
+    """
+
+    def __init__(self, means, stds, score_means, score_stds):
+        self.means = np.asarray(means, dtype=float)
+        self.stds = np.asarray(stds, dtype=float)
+        self.score_means = np.asarray(score_means, dtype=float)
+        self.score_stds = np.asarray(score_stds, dtype=float)
+        self.n_users, self.n_features = self.means.shape
+
+    @classmethod
+    def enroll(cls, bio, samples):
+        """Trains one model per user from samples[u] (enrollment vectors)."""
+        means, stds, score_means, score_stds = [], [], [], []
+        for user_samples in samples:
+            state = bio.train_online_model(user_samples)
+            means.append(state.mean)
+            stds.append(state.std())
+            score_means.append(state.score_mean)
+            score_stds.append(np.sqrt(state.score_m2 / state.score_count))
+        return cls(means, stds, score_means, score_stds)
+
+    def thresholds(self, multiplier=THRESHOLD_SIGMAS):
+        return np.maximum(self.score_means + multiplier * self.score_stds, self.n_features)
+
+
+class EvaluationReport:
+    """
+    FAR/FRR at every threshold multiplier of an evaluation run.
+
+    far[j] and frr[j] hold the rates with thresholds built from
+    multipliers[j]. roc() gives (FAR, TAR) pairs.
+    """
+
+    def __init__(self, multipliers, genuine_accepted, impostor_accepted,
+                 n_genuine, n_impostor, n_invalid=0):
+        self.multipliers = multipliers
+        self.genuine_accepted = genuine_accepted
+        self.impostor_accepted = impostor_accepted
+        self.n_genuine = n_genuine
+        self.n_impostor = n_impostor
+        self.n_invalid = n_invalid
+        self.far = impostor_accepted / max(n_impostor, 1)
+        self.frr = 1.0 - genuine_accepted / max(n_genuine, 1)
+
+    def at(self, multiplier=THRESHOLD_SIGMAS):
+        """(FAR, FRR) at the multiplier (the nearest evaluated one)."""
+        j = int(np.argmin(np.abs(self.multipliers - multiplier)))
+        return float(self.far[j]), float(self.frr[j])
+
+    def eer(self):
+        """
+        Equal error rate and the multiplier where FAR and FRR cross
+        (linear interpolation between evaluated multipliers).
+        """
+        diff = self.far - self.frr  # rises with the multiplier
+        j = int(np.searchsorted(diff, 0.0))
+        if j == 0:
+            return float(self.far[0]), float(self.multipliers[0])
+        if j == len(diff):
+            return float(self.frr[-1]), float(self.multipliers[-1])
+        t = -diff[j - 1] / (diff[j] - diff[j - 1])
+        rate = self.far[j - 1] + t * (self.far[j] - self.far[j - 1])
+        k = self.multipliers[j - 1] + t * (self.multipliers[j] - self.multipliers[j - 1])
+        return float(rate), float(k)
+
+    def multiplier_for_far(self, target_far):
+        """Largest multiplier whose FAR stays at or below target_far (lowest FRR)."""
+        ok = np.flatnonzero(self.far <= target_far)
+        if len(ok) == 0:
+            return None
+        return float(self.multipliers[ok[-1]])
+
+    def roc(self):
+        return self.far.copy(), 1.0 - self.frr
+
+    def summary(self):
+        eer, eer_k = self.eer()
+        far, frr = self.at(THRESHOLD_SIGMAS)
+        return {
+            "n_genuine": int(self.n_genuine),
+            "n_impostor": int(self.n_impostor),
+            "n_invalid": int(self.n_invalid),
+            "far_at_default": far,
+            "frr_at_default": frr,
+            "eer": eer,
+            "eer_multiplier": eer_k,
+        }
+
+
+def required_multipliers(distances, score_means, score_stds, n_features):
+    """
+    Smallest multiplier k at which each distance is accepted, i.e. the k
+    where distance <= max(mean + k*std, D) starts to hold. -inf for
+    distances under the floor D, which every multiplier accepts.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        k = (distances - score_means) / score_stds
+    k = np.where(score_stds > 0, k, np.where(distances <= score_means, -np.inf, np.inf))
+    k[distances <= n_features] = -np.inf
+    return k
+
+
+def _accept_counts(k, genuine, multipliers):
+    """Per multiplier, how many genuine and impostor pairs are accepted."""
+    # Pair accepted at multipliers[j] iff k <= multipliers[j]
+    first = np.searchsorted(multipliers, k, side="left")
+    n = len(multipliers) + 1
+    gen = np.bincount(first[genuine], minlength=n)[:-1]
+    imp = np.bincount(first[~genuine], minlength=n)[:-1]
+    return np.cumsum(gen), np.cumsum(imp)
+
+
+def _block_distances(X, means, inv_stds, out, work):
+    """
+    Scaled Manhattan distance of every attempt in X to every model:
+    out[a, m] = sum_f |X[a, f] - means[m, f]| * inv_stds[m, f].
+
+    One feature at a time, so the working set is two (a, m) buffers
+    rather than an (a, m, f) cube.
+    """
+    out[:] = 0.0
+    for f in range(X.shape[1]):
+        np.subtract(X[:, f, None], means[None, :, f], out=work)
+        np.abs(work, out=work)
+        work *= inv_stds[None, :, f]
+        out += work
+    return out
+
+
+def evaluate(models, attempts, attempt_users, multipliers=DEFAULT_MULTIPLIERS,
+             impostors_per_attempt=None, workers=None, chunk_pairs=1 << 18, seed=0):
+    """
+    Scores attempts against enrolled models and returns an EvaluationReport.
+
+    attempt_users[i] is who typed attempts[i]; scored against that user's
+    model it is a genuine attempt, against any other it is an impostor
+    one. With impostors_per_attempt=None every attempt meets every model;
+    otherwise each meets its own model plus that many random others, for
+    populations where the full cross product is too large.
+
+    Distances are computed in blocks of about chunk_pairs attempt/model
+    pairs and reduced to per-multiplier counts right away, so memory
+    stays bounded. Blocks run on a thread pool (NumPy releases the GIL);
+    workers defaults to the CPU count. Rows with NaN (rejected sessions)
+    are left out and counted as invalid.
+    """
+    attempts = np.asarray(attempts, dtype=float)
+    attempt_users = np.asarray(attempt_users, dtype=np.int64)
+    multipliers = np.asarray(multipliers, dtype=float)
+
+    ok = ~np.isnan(attempts).any(axis=1)
+    n_invalid = int(len(ok) - ok.sum())
+    attempts, attempt_users = attempts[ok], attempt_users[ok]
+
+    inv_stds = 1.0 / models.stds
+    workers = workers or os.cpu_count() or 1
+
+    if impostors_per_attempt and models.n_users < 2:
+        raise ValueError("Sampling impostors needs at least two enrolled users")
+    if impostors_per_attempt is None:
+        tasks = _cross_product_tasks(models, attempts, attempt_users, inv_stds, chunk_pairs)
+    else:
+        tasks = _sampled_tasks(models, attempts, attempt_users, inv_stds, chunk_pairs,
+                               impostors_per_attempt, np.random.default_rng(seed))
+
+    gen_acc = np.zeros(len(multipliers), dtype=np.int64)
+    imp_acc = np.zeros(len(multipliers), dtype=np.int64)
+    n_gen = n_imp = 0
+
+    def run(task):
+        distances, model_idx, genuine = task()
+        k = required_multipliers(distances, models.score_means[model_idx],
+                                 models.score_stds[model_idx], models.n_features)
+        return _accept_counts(k.ravel(), genuine.ravel(), multipliers) + (int(genuine.sum()), genuine.size)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for gen, imp, n_g, n in _bounded_map(pool, run, tasks, 2 * workers):
+            gen_acc += gen
+            imp_acc += imp
+            n_gen += n_g
+            n_imp += n - n_g
+
+    return EvaluationReport(multipliers, gen_acc, imp_acc, n_gen, n_imp, n_invalid)
+
+
+def _bounded_map(pool, fn, tasks, ahead):
+    """pool.map that keeps at most `ahead` tasks in flight (bounded memory)."""
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.submit(fn, task))
+        if len(pending) >= ahead:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _cross_product_tasks(models, attempts, attempt_users, inv_stds, chunk_pairs):
+    """Blocks of (attempts x models); each task returns its distances."""
+    block_models = max(1, min(models.n_users, int(np.sqrt(chunk_pairs))))
+    block_attempts = max(1, chunk_pairs // block_models)
+
+    for m0 in range(0, models.n_users, block_models):
+        model_idx = np.arange(m0, min(m0 + block_models, models.n_users))
+        for a0 in range(0, len(attempts), block_attempts):
+            def task(a0=a0, model_idx=model_idx):
+                X = attempts[a0:a0 + block_attempts]
+                out = np.empty((len(X), len(model_idx)))
+                work = np.empty_like(out)
+                _block_distances(X, models.means[model_idx], inv_stds[model_idx], out, work)
+                genuine = attempt_users[a0:a0 + block_attempts, None] == model_idx[None, :]
+                return out, model_idx[None, :], genuine
+            yield task
+
+
+def _sampled_tasks(models, attempts, attempt_users, inv_stds, chunk_pairs, n_impostors, rng):
+    """Each attempt against its own model and n_impostors random other ones."""
+    per_attempt = 1 + n_impostors
+    block = max(1, chunk_pairs // per_attempt)
+
+    for a0 in range(0, len(attempts), block):
+        users = attempt_users[a0:a0 + block]
+        # Random other users: shift by 1..n_users-1 so no draw hits the owner
+        shift = rng.integers(1, max(models.n_users, 2), size=(len(users), n_impostors))
+        model_idx = np.concatenate([users[:, None], (users[:, None] + shift) % models.n_users], axis=1)
+
+        def task(a0=a0, model_idx=model_idx):
+            X = attempts[a0:a0 + block]
+            diff = np.abs(X[:, None, :] - models.means[model_idx])
+            diff *= inv_stds[model_idx]
+            genuine = np.zeros(model_idx.shape, dtype=bool)
+            genuine[:, 0] = True
+            return diff.sum(axis=2), model_idx, genuine
+        yield task
+
+
+def main(argv=None):
+    """Evaluates a synthetic population and suggests threshold multipliers."""
+    from biometrics import BiometricsEngine
+    from population import TypistPopulation
+
+    parser = argparse.ArgumentParser(description="FAR/FRR/EER of the authentication threshold")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--enroll", type=int, default=10, help="enrollment samples per user")
+    parser.add_argument("--attempts", type=int, default=20, help="login attempts per user")
+    parser.add_argument("--impostors", type=int, default=None,
+                        help="impostor models per attempt (default: every other user)")
+    parser.add_argument("--target-far", type=float, default=0.001)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    bio = BiometricsEngine()
+    users = np.arange(args.users)
+    clean = TypistPopulation(args.users, seed=args.seed, pause_rate=0, backspace_rate=0)
+    enroll, _ = clean.features(np.repeat(users, args.enroll), rng=np.random.default_rng([args.seed, 10]))
+    models = ModelSet.enroll(bio, enroll.reshape(args.users, args.enroll, -1))
+
+    pop = TypistPopulation(args.users, seed=args.seed)
+    attempts, _ = pop.features(np.repeat(users, args.attempts), rng=np.random.default_rng([args.seed, 11]))
+    report = evaluate(models, attempts, np.repeat(users, args.attempts),
+                      impostors_per_attempt=args.impostors, workers=args.workers, seed=args.seed)
+
+    summary = report.summary()
+    summary["multiplier_for_target_far"] = report.multiplier_for_far(args.target_far)
+    print(json.dumps(summary, indent=2))
+    return summary
+
+
+if __name__ == "__main__":
+    main()
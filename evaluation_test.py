@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from biometrics import BiometricsEngine
+from evaluation import EvaluationReport, ModelSet, evaluate
+from population import TypistPopulation
+
+
+def make_run(n_users=40, n_enroll=10, n_attempts=6, seed=0):
+    bio = BiometricsEngine()
+    users = np.arange(n_users)
+    clean = TypistPopulation(n_users, seed=seed, pause_rate=0, backspace_rate=0)
+    enroll, _ = clean.features(np.repeat(users, n_enroll), rng=np.random.default_rng(1))
+    enroll = enroll.reshape(n_users, n_enroll, -1)
+
+    attempts, _ = TypistPopulation(n_users, seed=seed, pause_rate=0.1).features(
+        np.repeat(users, n_attempts), rng=np.random.default_rng(2))
+    return bio, enroll, attempts, np.repeat(users, n_attempts)
+
+
+def test_matches_authenticate_at_every_pair():
+    bio, enroll, attempts, attempt_users = make_run()
+    models = ModelSet.enroll(bio, enroll)
+    report = evaluate(models, attempts, attempt_users, chunk_pairs=500, workers=3)
+
+    genuine, impostor = [], []
+    for u, samples in enumerate(enroll):
+        std, mean, threshold = bio.train_model(samples)
+        assert np.isclose(models.thresholds()[u], threshold)
+        for x, owner in zip(attempts, attempt_users):
+            if np.isnan(x).any():
+                continue
+            accepted = bio.authenticate(x, mean, std, threshold)[0]
+            (genuine if owner == u else impostor).append(accepted)
+
+    assert report.n_invalid == np.isnan(attempts).any(axis=1).sum() > 0
+    assert report.n_genuine == len(genuine) and report.n_impostor == len(impostor)
+    far, frr = report.at(6.0)
+    assert far == np.mean(impostor)
+    assert frr == 1 - np.mean(genuine)
+
+
+def test_chunking_threads_and_sampling_agree():
+    bio, enroll, attempts, attempt_users = make_run(n_users=30)
+    models = ModelSet.enroll(bio, enroll)
+
+    full = evaluate(models, attempts, attempt_users, workers=1)
+    chunked = evaluate(models, attempts, attempt_users, chunk_pairs=64, workers=4)
+    assert np.array_equal(full.far, chunked.far) and np.array_equal(full.frr, chunked.frr)
+
+    # Sampling impostors leaves the genuine pairs as they were
+    sampled = evaluate(models, attempts, attempt_users, impostors_per_attempt=5, chunk_pairs=50)
+    assert sampled.n_impostor == 5 * sampled.n_genuine
+    assert np.array_equal(sampled.frr, full.frr)
+
+    # A lone user has no impostors to sample (only their own model)
+    alone = ModelSet.enroll(bio, enroll[:1])
+    with pytest.raises(ValueError, match="two enrolled users"):
+        evaluate(alone, attempts[:6], attempt_users[:6], impostors_per_attempt=5)
+    assert evaluate(alone, attempts[:6], attempt_users[:6]).n_impostor == 0
+
+
+def test_rates_curves_and_tuning():
+    multipliers = np.array([0.0, 1.0, 2.0, 3.0])
+    report = EvaluationReport(multipliers, genuine_accepted=np.array([2, 5, 8, 10]),
+                              impostor_accepted=np.array([0, 1, 4, 9]),
+                              n_genuine=10, n_impostor=10)
+    assert np.allclose(report.frr, [0.8, 0.5, 0.2, 0.0])
+    assert np.allclose(report.far, [0.0, 0.1, 0.4, 0.9])
+
+    eer, k = report.eer()
+    assert 1.0 < k < 2.0 and 0.1 < eer < 0.5
+    assert report.multiplier_for_far(0.1) == 1.0
+    assert report.multiplier_for_far(-1) is None
+    far, tar = report.roc()
+    assert np.all(np.diff(far) >= 0) and np.all(np.diff(tar) >= 0)
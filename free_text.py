@@ -0,0 +1,237 @@
+"""
+Continuous authentication on free text: any typing, not just the passphrase.
+
+    profile = FreeTextProfile.from_model(model, PASSPHRASE)
+    session = ContinuousAuthenticator(profile, timestamp_scale=TIMESTAMP_SCALE)
+    session.push_code(code, EVENT_DOWN, clock())   # from the key handlers
+    session.confidence                             # 0-100, None until enough keys
+
+Timing is kept per key (dwell) and per digraph (flight), not per
+position in a phrase, so any text that shares keys and digraphs with what
+the profile has seen can be scored.
+"""
+import math
+
+import numpy as np
+
+from biometrics import BACKSPACE_CODE, EVENT_DOWN, EVENT_UP, MAX_PAUSE, encode_char
+
+# Printable ASCII gets a key slot each; everything else shares the last one
+FIRST_CODE = 32
+N_KEYS = 127 - FIRST_CODE + 1
+OTHER_KEY = N_KEYS - 1
+# Slot layout: N_KEYS dwell slots, then N_KEYS * N_KEYS flight slots
+N_SLOTS = N_KEYS + N_KEYS * N_KEYS
+
+# Per-slot decay: each observation of a key (or digraph) weighs this much
+# less than the next, so the statistics follow ~1 / (1 - DECAY) recent ones
+DECAY = 0.98
+# Observations (weight) a slot needs before it is scored
+MIN_COUNT = 3.0
+# Floor on a slot's std (seconds), so a few very even samples don't make it brittle
+MIN_STD = 0.008
+# Per-keystroke deviations (in stds) are capped here, so one slip can't sink the window
+Z_CAP = 4.0
+
+# Rolling window of scored keystroke timings
+WINDOW = 64
+MIN_EVENTS = 16
+# Window mean deviation at which confidence is 100 and 0 (see confidence)
+Z_GENUINE = 1.0
+Z_IMPOSTOR = 2.2
+# Learn from typing (update the profile) only while at least this confident
+LEARN_CONFIDENCE = 70
+
+
+def key_slot(code):
+    """Key slot of an encoded char (see encode_char)."""
+    if FIRST_CODE <= code < FIRST_CODE + OTHER_KEY:
+        return code - FIRST_CODE
+    return OTHER_KEY
+
+
+def digraph_slot(first, second):
+    """Flight slot of two key slots."""
+    return N_KEYS + first * N_KEYS + second
+
+
+class FreeTextProfile:
+    """
+    A user's typing rhythm as per-key dwell and per-digraph flight
+    statistics: decayed weight, mean and M2 (for the variance) per slot.
+
+    Fixed size whatever is typed: three float64 arrays of N_SLOTS
+    (~220 KB). observe() is O(1); writes go through memoryviews, which
+    take a Python float in a fraction of a NumPy item assignment.
+    """
+
+    def __init__(self, decay=DECAY):
+        self.decay = decay
+        self.weights = np.zeros(N_SLOTS)
+        self.means = np.zeros(N_SLOTS)
+        self.m2s = np.zeros(N_SLOTS)
+        self._weights = memoryview(self.weights)
+        self._means = memoryview(self.means)
+        self._m2s = memoryview(self.m2s)
+
+    @classmethod
+    def from_model(cls, model, phrase, count=10):
+        """
+        A profile seeded from a passphrase model (scaled Manhattan: per
+        position mean and std vectors), as if each position had been
+        observed count times. Other scorers' models start it empty.
+        """
+        profile = cls()
+        std_vector = np.asarray(model["transform_matrix"])
+        if std_vector.ndim == 1:
+            profile.seed(model["mean_vector"], std_vector, phrase, count)
+        return profile
+
+    @property
+    def nbytes(self):
+        return self.weights.nbytes + self.means.nbytes + self.m2s.nbytes
+
+    def seed(self, mean_vector, std_vector, phrase, count):
+        """Merges per-position statistics of phrase ([dwells..., flights...]) into the slots."""
+        keys = [key_slot(encode_char(c)) for c in phrase]
+        slots = keys + [digraph_slot(a, b) for a, b in zip(keys, keys[1:])]
+        for slot, mean, std in zip(slots, mean_vector, std_vector):
+            # Chan et al.: combine two (weight, mean, M2) summaries
+            w = self._weights[slot]
+            total = w + count
+            delta = float(mean) - self._means[slot]
+            self._means[slot] += delta * count / total
+            self._m2s[slot] += count * float(std) ** 2 + delta * delta * w * count / total
+            self._weights[slot] = total
+
+    def observe(self, slot, x):
+        """One timing (seconds) into slot: decayed, weighted Welford update."""
+        w = self._weights[slot] * self.decay + 1.0
+        mean = self._means[slot]
+        delta = x - mean
+        mean += delta / w
+        self._means[slot] = mean
+        self._m2s[slot] = self._m2s[slot] * self.decay + delta * (x - mean)
+        self._weights[slot] = w
+
+    def deviation(self, slot, x):
+        """|x - mean| in stds for slot (capped at Z_CAP), or None if too little is known."""
+        w = self._weights[slot]
+        if w < MIN_COUNT:
+            return None
+        std = max(math.sqrt(max(self._m2s[slot], 0.0) / w), MIN_STD)
+        return min(abs(x - self._means[slot]) / std, Z_CAP)
+
+
+class ContinuousAuthenticator:
+    """
+    Scores a live key event stream against a FreeTextProfile.
+
+    Every dwell and flight, as soon as both of its timestamps are in,
+    is scored as its deviation from the profile. The last `window`
+    deviations are kept in a ring with a running sum, so the rolling
+    confidence costs O(1) per keystroke, like everything else here.
+    While confident, the session also teaches the profile its timings
+    (learn=True).
+    """
+
+    def __init__(self, profile, timestamp_scale=1.0, window=WINDOW, learn=True):
+        self.profile = profile
+        self.timestamp_scale = timestamp_scale
+        self.learn = learn
+        self.window = [0.0] * window
+        self.reset()
+
+    def reset(self):
+        """Forgets the stream and the window (the profile keeps what it learned)."""
+        self.down_at = [None] * N_KEYS
+        self.prev = None       # key slot of the last keystroke
+        self.prev_up = None    # its release time, once known
+        self.pending = None    # (prev, key, down time): flight waiting on prev's release
+        self.n = 0
+        self.next = 0
+        self.total = 0.0
+
+    def push(self, char, event_type, timestamp):
+        self.push_code(encode_char(char), EVENT_DOWN if event_type == 'down' else EVENT_UP, timestamp)
+
+    def push_code(self, code, event_type, timestamp):
+        """Adds one event (see encode_char, EVENT_DOWN/EVENT_UP)."""
+        if code < 0:
+            if code == BACKSPACE_CODE:
+                # A correction: the keys either side of it aren't a digraph
+                self.prev = self.pending = None
+            return
+        key = key_slot(code)
+
+        if event_type == EVENT_DOWN:
+            down = self.down_at[key]
+            if down is not None:
+                if float(timestamp - down) * self.timestamp_scale <= MAX_PAUSE:
+                    return  # auto-repeat
+                # Held longer than a pause: its Up was lost (Shift let go first
+                # so it came up as another char, or focus moved). Replaced, and
+                # a rollover flight waiting on that Up is dropped
+                if self.pending is not None and self.pending[0] == key:
+                    self.pending = None
+            self.down_at[key] = timestamp
+            if self.prev is not None:
+                if self.prev_up is not None:
+                    self._timing(digraph_slot(self.prev, key), timestamp - self.prev_up)
+                else:
+                    # Rollover: the flight (negative) is known at prev's release
+                    self.pending = (self.prev, key, timestamp)
+            self.prev = key
+            self.prev_up = None
+            return
+
+        down = self.down_at[key]
+        if down is None:
+            return  # no matching Down
+        self.down_at[key] = None
+        self._timing(key, timestamp - down)
+        if self.pending is not None and self.pending[0] == key:
+            _, second, second_down = self.pending
+            self.pending = None
+            self._timing(digraph_slot(key, second), second_down - timestamp)
+        if self.prev == key:
+            self.prev_up = timestamp
+
+    def _timing(self, slot, interval):
+        x = float(interval) * self.timestamp_scale
+        if x > MAX_PAUSE:
+            return  # a pause, not a rhythm
+        z = self.profile.deviation(slot, x)
+        if z is not None:
+            i = self.next
+            if self.n == len(self.window):
+                self.total -= self.window[i]
+            else:
+                self.n += 1
+            self.window[i] = z
+            self.total += z
+            self.next = (i + 1) % len(self.window)
+        if self.learn:
+            confidence = self.confidence
+            if confidence is not None and confidence >= LEARN_CONFIDENCE:
+                self.profile.observe(slot, x)
+
+    @property
+    def mean_deviation(self):
+        """Mean deviation over the window (in stds), or None before MIN_EVENTS."""
+        if self.n < MIN_EVENTS:
+            return None
+        return self.total / self.n
+
+    @property
+    def confidence(self):
+        """
+        Rolling confidence (0-100) that the profile's owner is typing:
+        100 up to a mean deviation of Z_GENUINE, falling linearly to 0 at
+        Z_IMPOSTOR. None until MIN_EVENTS timings have been scored.
+        """
+        z = self.mean_deviation
+        if z is None:
+            return None
+        ratio = (z - Z_GENUINE) / (Z_IMPOSTOR - Z_GENUINE)
+        return 100.0 * min(max(1.0 - ratio, 0.0), 1.0)
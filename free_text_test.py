@@ -0,0 +1,111 @@
+import numpy as np
+
+from biometrics import EVENT_DOWN, EVENT_UP, encode_char
+from free_text import (DECAY, LEARN_CONFIDENCE, N_SLOTS, WINDOW, ContinuousAuthenticator,
+                       FreeTextProfile, digraph_slot, key_slot)
+from population import TypistPopulation
+
+TEXT = ("the quick brown fox jumps over the lazy dog while she sells sea shells by the sea shore "
+        "and a journey of a thousand miles begins with a single step")
+
+
+def enrolled_profiles(pop, rng, n_sessions=5):
+    profiles = []
+    X, _ = pop.features(np.repeat(np.arange(pop.n_users), n_sessions), rng)
+    for u in range(pop.n_users):
+        samples = X[u * n_sessions:(u + 1) * n_sessions]
+        samples = samples[~np.isnan(samples).any(axis=1)]
+        profile = FreeTextProfile()
+        profile.seed(samples.mean(axis=0), samples.std(axis=0), pop.phrase, len(samples))
+        profiles.append(profile)
+    return profiles
+
+
+def feed(session, codes, types, timestamps):
+    for code, event_type, timestamp in zip(codes.tolist(), types.tolist(), timestamps.tolist()):
+        session.push_code(code, event_type, timestamp)
+
+
+def test_confidence_separates_owner_from_impostor():
+    pop = TypistPopulation(20, phrase=TEXT, seed=3)
+    rng = np.random.default_rng(0)
+    profiles = enrolled_profiles(pop, rng)
+    codes, types, timestamps, offsets = pop.packed(np.arange(20), rng)
+
+    genuine, impostor = [], []
+    for u in range(20):
+        events = slice(offsets[u], offsets[u + 1])
+        for owner, scores in ((u, genuine), ((u + 1) % 20, impostor)):
+            session = ContinuousAuthenticator(profiles[owner], learn=False)
+            feed(session, codes[events], types[events], timestamps[events])
+            scores.append(session.confidence)
+    assert np.median(genuine) >= LEARN_CONFIDENCE and np.median(impostor) < 40
+    assert np.mean(np.array(genuine) > np.array(impostor)) >= 0.95
+
+    # Someone else takes over the keyboard mid-stream: the window follows within WINDOW timings
+    session = ContinuousAuthenticator(profiles[0], learn=False)
+    feed(session, codes[offsets[0]:offsets[1]], types[offsets[0]:offsets[1]], timestamps[offsets[0]:offsets[1]])
+    before = session.confidence
+    later = timestamps[offsets[1]:offsets[2]] - timestamps[offsets[1]] + timestamps[offsets[1] - 1] + 5
+    feed(session, codes[offsets[1]:offsets[2]], types[offsets[1]:offsets[2]], later)
+    assert before >= LEARN_CONFIDENCE and session.confidence < before - 30
+
+
+def test_streams_dwell_and_flight_per_key_and_digraph():
+    timings = []
+
+    class Recording(ContinuousAuthenticator):
+        def _timing(self, slot, interval):
+            timings.append((slot, round(interval, 6)))
+
+    session = Recording(FreeTextProfile())
+    a, b, c = (key_slot(encode_char(ch)) for ch in "abc")
+    for char, event_type, t in [("a", "down", 0.0), ("b", "down", 0.05), ("a", "up", 0.08),
+                                ("b", "down", 0.10),  # auto-repeat while held: ignored
+                                ("b", "up", 0.15), ("c", "down", 0.30), ("Key.backspace", "down", 0.35),
+                                ("c", "up", 0.40), ("a", "down", 0.5), ("a", "up", 0.6)]:
+        session.push(char, event_type, t)
+    # Rollover gives a negative flight; a backspace breaks the digraph after it
+    assert timings == [(a, 0.08), (digraph_slot(a, b), -0.03), (b, 0.1),
+                       (digraph_slot(b, c), 0.15), (c, 0.1), (a, 0.1)]
+
+
+def test_a_down_that_lost_its_up_goes_stale():
+    timings = []
+
+    class Recording(ContinuousAuthenticator):
+        def _timing(self, slot, interval):
+            timings.append((slot, round(interval, 6)))
+
+    session = Recording(FreeTextProfile())
+    A, b = key_slot(encode_char("A")), key_slot(encode_char("b"))
+    # Shift let go first: Down 'A' comes up as 'a', leaving 'A' held
+    for char, event_type, t in [("A", "down", 0.0), ("a", "up", 0.1),
+                                ("b", "down", 3.0), ("b", "up", 3.1),
+                                ("A", "down", 3.2), ("A", "up", 3.3)]:
+        session.push(char, event_type, t)
+    # The next 'A' is a new key press, not auto-repeat: its digraph and own dwell count
+    assert timings == [(b, 0.1), (digraph_slot(b, A), 0.1), (A, 0.1)]
+
+
+def test_memory_is_bounded_and_statistics_decay():
+    profile = FreeTextProfile()
+    session = ContinuousAuthenticator(profile)
+    size = profile.nbytes
+    rng = np.random.default_rng(1)
+    t = 0.0
+    # Lots of random text, every printable key and more
+    for code in rng.integers(0, 300, size=20000):
+        session.push_code(int(code), EVENT_DOWN, t)
+        session.push_code(int(code), EVENT_UP, t + 0.1)
+        t += 0.25
+    assert profile.nbytes == size and profile.weights.shape == (N_SLOTS,)
+    assert session.n <= WINDOW and len(session.window) == WINDOW
+
+    # A key's statistics follow its recent timings and forget old ones
+    slot = key_slot(encode_char("e"))
+    for x in [0.08] * 300 + [0.12] * 300:
+        profile.observe(slot, x)
+    assert profile.weights[slot] <= 1 / (1 - DECAY) + 1e-9
+    assert abs(profile.means[slot] - 0.12) < 1e-3
+    assert profile.deviation(slot, 0.12) < 0.1 < profile.deviation(slot, 0.08)
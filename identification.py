@@ -0,0 +1,185 @@
+"""
+1:N typist identification over every enrolled model.
+
+    index = IdentificationIndex.from_db(db)
+    db.add_model_listener(index.update)
+    index.query(features, k=5)  # [(user_id, distance), ...] best first
+"""
+import threading
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+import scorers
+
+
+class IdentificationIndex:
+    """
+    The enrolled users closest to a typed sample, under each user's own
+    scaled Manhattan distance sum(|x - mean| / std) (as authenticate).
+
+    Candidates come from a KD-tree over the mean vectors, whitened by the
+    median std of each feature and projected onto their top n_components
+    principal axes. The nearest `candidates` tree points are then
+    re-ranked exactly, so the distances returned are always exact; only
+    a user whose projected mean falls outside the candidate set can be
+    missed. exact=True scans every model instead.
+
+    Users added or changed since the tree was built are kept in a delta
+    set that every query scans exactly. Once it grows past
+    rebuild_fraction of the index, the next write rebuilds the tree.
+    """
+
+    def __init__(self, n_components=20, candidates=1024, rebuild_fraction=0.05, min_rebuild=256):
+        self.n_components = n_components
+        self.candidates = candidates
+        self.rebuild_fraction = rebuild_fraction
+        self.min_rebuild = min_rebuild
+        self.lock = threading.RLock()
+
+        self.user_ids = []  # row -> user_id
+        self.rows = {}      # user_id -> row
+        self.means = None   # (capacity, n_features)
+        self.stds = None
+        self.live = np.zeros(0, dtype=bool)
+        self.in_tree = np.zeros(0, dtype=bool)  # row unchanged since the tree was built
+        self.delta = set()
+
+        self.tree = None
+        self.tree_rows = None
+        self.scale = None
+        self.center = None
+        self.components = None
+
+    @classmethod
+    def from_db(cls, db, page_size=1000, **kwargs):
+        """Builds an index over every model in db (DBManager.iter_models)."""
+        index = cls(**kwargs)
+        with index.lock:
+            for user_id, model in db.iter_models(page_size):
+                index._put(user_id, model.get("mean_vector"), model.get("transform_matrix"))
+            index.build()
+        return index
+
+    def __len__(self):
+        return len(self.rows)
+
+    # --- Writes ---
+    def update(self, user_id, model):
+        """
+        Inserts or updates a user from a model dict (mean_vector and
+        transform_matrix, i.e. the std vector). A dict with only one of
+        them updates that part. Fits DBManager.add_model_listener.
+        """
+        with self.lock:
+            self._put(user_id, model.get("mean_vector"), model.get("transform_matrix"))
+            if self.tree is not None or len(self.rows) > self.candidates:
+                if len(self.delta) > max(self.min_rebuild, self.rebuild_fraction * len(self.rows)):
+                    self.build()
+
+    def remove(self, user_id):
+        with self.lock:
+            row = self.rows.pop(user_id, None)
+            if row is not None:
+                self.live[row] = False
+                self.in_tree[row] = False
+                self.delta.discard(row)
+
+    def _put(self, user_id, mean_vector, std_vector):
+        row = self.rows.get(user_id)
+        if row is None:
+            if mean_vector is None or std_vector is None:
+                return  # a partial update of a user the index never saw
+            row = self._new_row(user_id, len(mean_vector))
+        if mean_vector is not None:
+            self.means[row] = mean_vector
+        if std_vector is not None:
+            # Mahalanobis models store a whitening matrix; use its per-feature std
+            self.stds[row] = scorers.std_vector(std_vector)
+        self.in_tree[row] = False
+        self.delta.add(row)
+
+    def _new_row(self, user_id, n_features):
+        if self.means is None:
+            self.means = np.zeros((64, n_features))
+            self.stds = np.ones((64, n_features))
+            self.live = np.zeros(64, dtype=bool)
+            self.in_tree = np.zeros(64, dtype=bool)
+        elif n_features != self.means.shape[1]:
+            raise ValueError(f"Model has {n_features} features, index has {self.means.shape[1]}")
+
+        row = len(self.user_ids)
+        if row == len(self.means):
+            # Double the capacity
+            self.means = np.concatenate([self.means, np.zeros_like(self.means)])
+            self.stds = np.concatenate([self.stds, np.ones_like(self.stds)])
+            self.live = np.concatenate([self.live, np.zeros_like(self.live)])
+            self.in_tree = np.concatenate([self.in_tree, np.zeros_like(self.in_tree)])
+        self.user_ids.append(user_id)
+        self.rows[user_id] = row
+        self.live[row] = True
+        return row
+
+    # --- Tree ---
+    def build(self):
+        """Compacts out removed users and rebuilds the tree over everyone."""
+        with self.lock:
+            rows = np.flatnonzero(self.live[:len(self.user_ids)])
+            if len(rows) < len(self.user_ids):
+                self.means = self.means[rows]
+                self.stds = self.stds[rows]
+                self.live = np.ones(len(rows), dtype=bool)
+                self.in_tree = np.zeros(len(rows), dtype=bool)
+                self.user_ids = [self.user_ids[r] for r in rows]
+                self.rows = {user_id: r for r, user_id in enumerate(self.user_ids)}
+            n = len(self.user_ids)
+            self.delta = set()
+
+            # A small index is scanned whole; a tree only pays off beyond the candidate count
+            if n <= self.candidates:
+                self.tree = None
+                return
+
+            means, stds = self.means[:n], self.stds[:n]
+            self.scale = np.median(stds, axis=0)
+            whitened = means / self.scale
+            self.center = whitened.mean(axis=0)
+            # Principal axes from a sample of at most 20k users
+            step = max(1, n // 20000)
+            _, _, vt = np.linalg.svd(whitened[::step] - self.center, full_matrices=False)
+            self.components = vt[:min(self.n_components, len(vt))].T
+
+            self.tree = cKDTree((whitened - self.center) @ self.components)
+            self.tree_rows = np.arange(n)
+            self.in_tree[:n] = True
+
+    def _project(self, x):
+        return (x / self.scale - self.center) @ self.components
+
+    # --- Queries ---
+    def query(self, x, k=5, candidates=None, exact=False):
+        """
+        The k users with the smallest scaled Manhattan distance to the
+        feature vector x, as [(user_id, distance), ...] best first.
+        """
+        x = np.asarray(x, dtype=float)
+        with self.lock:
+            n = len(self.user_ids)
+            if exact or self.tree is None:
+                rows = np.flatnonzero(self.live[:n])
+            else:
+                c = min(candidates or self.candidates, self.tree.n)
+                _, idx = self.tree.query(self._project(x), k=c)
+                rows = self.tree_rows[np.atleast_1d(idx)]
+                # Changed users are scanned from the delta set instead
+                rows = rows[self.in_tree[rows]]
+                if self.delta:
+                    rows = np.concatenate([rows, np.fromiter(self.delta, dtype=np.int64)])
+            if len(rows) == 0:
+                return []
+
+            distances = np.sum(np.abs(x - self.means[rows]) / self.stds[rows], axis=1)
+            k = min(k, len(rows))
+            best = np.argpartition(distances, k - 1)[:k]
+            best = best[np.argsort(distances[best], kind='stable')]
+            return [(self.user_ids[rows[i]], float(distances[i])) for i in best]
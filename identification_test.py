@@ -0,0 +1,77 @@
+import numpy as np
+
+from biometrics import BiometricsEngine
+from db_manager import DBManager
+from identification import IdentificationIndex
+from population import TypistPopulation
+from storage import SQLiteBackend
+
+
+def enroll(n_users, n_samples=8, seed=0):
+    bio = BiometricsEngine()
+    pop = TypistPopulation(n_users, seed=seed, pause_rate=0, backspace_rate=0)
+    X, _ = pop.features(np.repeat(np.arange(n_users), n_samples))
+    stds, means, _ = bio.train_models_batch(X.reshape(n_users, n_samples, -1))
+    attempts, _ = pop.features(np.arange(n_users), rng=np.random.default_rng(1))
+    return bio, means, stds, attempts
+
+
+def test_tree_queries_rerank_exactly():
+    bio, means, stds, attempts = enroll(3000)
+    index = IdentificationIndex(candidates=256)
+    for u in range(3000):
+        index.update(u, {"mean_vector": means[u], "transform_matrix": stds[u]})
+    index.build()
+    assert index.tree is not None and not index.delta
+
+    agree = found = 0
+    for u in range(0, 3000, 30):
+        result = index.query(attempts[u], k=5)
+        exact = index.query(attempts[u], k=5, exact=True)
+        # Distances are authenticate's, whichever way the user was found
+        for user, distance in result:
+            assert np.isclose(distance, bio.authenticate(attempts[u], means[user], stds[user], 1.0)[1])
+        assert [d for _, d in result] == sorted(d for _, d in result)
+        agree += result[0] == exact[0]
+        found += u in [user for user, _ in result]
+    assert agree >= 80 and found >= 70
+
+
+def test_updates_are_visible_before_the_rebuild():
+    _, means, stds, attempts = enroll(1500, seed=2)
+    index = IdentificationIndex(candidates=64, min_rebuild=50, rebuild_fraction=0.0)
+    for u in range(1400):
+        index.update(u, {"mean_vector": means[u], "transform_matrix": stds[u]})
+    index.build()
+
+    # A new user and a moved user are found from the delta set
+    index.update("new", {"mean_vector": means[1450], "transform_matrix": stds[1450]})
+    index.update(7, {"mean_vector": means[1460]})
+    assert index.query(means[1450], k=1) == [("new", 0.0)]
+    assert index.query(means[1460], k=1)[0][0] == 7
+    assert index.tree is not None and len(index.delta) == 2
+
+    index.remove("new")
+    assert index.query(means[1450], k=1)[0][0] != "new"
+
+    # Past min_rebuild changes the tree is rebuilt and the delta emptied
+    for u in range(1400, 1450):
+        index.update(u, {"mean_vector": means[u], "transform_matrix": stds[u]})
+    assert not index.delta and len(index) == 1450
+    assert index.query(means[1460], k=1)[0][0] == 7
+
+
+def test_follows_model_writes():
+    _, means, stds, _ = enroll(20, seed=3)
+    db = DBManager(backend=SQLiteBackend(":memory:"))
+    users = [db.register_user(f"user{u}")["id"] for u in range(20)]
+    for u in range(10):
+        db.save_model(users[u], stds[u], means[u], 85.0)
+
+    index = IdentificationIndex.from_db(db, page_size=3)
+    db.add_model_listener(index.update)
+    assert len(index) == 10
+    db.save_model(users[15], stds[15], means[15], 85.0)
+    db.update_mean_vector(users[2], means[16])
+    assert index.query(means[15], k=1)[0][0] == users[15]
+    assert index.query(means[16], k=1)[0][0] == users[2]
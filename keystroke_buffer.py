@@ -0,0 +1,71 @@
+import time
+
+import numpy as np
+
+from biometrics import EVENT_DOWN, decode_char
+
+# Timestamps are perf_counter_ns: monotonic, so NTP adjustments of the
+# wall clock can't stretch or shrink a dwell or flight time
+TIMESTAMP_SCALE = 1e-9
+clock = time.perf_counter_ns
+
+
+class KeystrokeBuffer:
+    """
+    Fixed-capacity ring buffer of captured key events.
+
+    Three preallocated arrays (char code, event type, int64 nanosecond
+    timestamp) are written in place, so push() allocates nothing. Once
+    more than capacity events arrive the oldest are overwritten and
+    overflowed is set. view() and packed() hand out zero-copy
+    slices of the arrays unless the buffer has wrapped.
+    """
+
+    def __init__(self, capacity=512):
+        self.capacity = capacity
+        self.char_codes = np.zeros(capacity, dtype=np.int32)
+        self.event_types = np.zeros(capacity, dtype=np.int8)
+        self.timestamps = np.zeros(capacity, dtype=np.int64)
+        # Writes go through memoryviews of the same memory, which take a
+        # Python int in about half the time of a NumPy item assignment
+        self._codes = memoryview(self.char_codes)
+        self._types = memoryview(self.event_types)
+        self._stamps = memoryview(self.timestamps)
+        self.count = 0  # events pushed since clear()
+
+    def push(self, code, event_type, timestamp_ns):
+        i = self.count % self.capacity
+        self._codes[i] = code
+        self._types[i] = event_type
+        self._stamps[i] = timestamp_ns
+        self.count += 1
+
+    def clear(self):
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    @property
+    def overflowed(self):
+        return self.count > self.capacity
+
+    def view(self):
+        """(char_codes, event_types, timestamps_ns) of the buffered events, oldest first."""
+        if not self.overflowed:
+            n = self.count
+            return self.char_codes[:n], self.event_types[:n], self.timestamps[:n]
+        # Wrapped: the oldest event sits at the write position
+        start = self.count % self.capacity
+        return tuple(np.roll(a, -start) for a in (self.char_codes, self.event_types, self.timestamps))
+
+    def packed(self):
+        """view() as a single-session pack_key_events batch."""
+        codes, types, stamps = self.view()
+        return codes, types, stamps, np.array([0, len(codes)], dtype=np.int64)
+
+    def events(self):
+        """The buffered events as [(char, 'down'/'up', seconds), ...]."""
+        codes, types, stamps = self.view()
+        return [(decode_char(c), 'down' if e == EVENT_DOWN else 'up', t * TIMESTAMP_SCALE)
+                for c, e, t in zip(codes.tolist(), types.tolist(), stamps.tolist())]
@@ -0,0 +1,62 @@
+import numpy as np
+
+from benchmarks import make_sessions
+from biometrics import EVENT_DOWN, EVENT_UP, BiometricsEngine, encode_char
+from keystroke_buffer import TIMESTAMP_SCALE, KeystrokeBuffer
+
+PHRASE = "the quick brown fox"
+
+
+def capture(buffer, stream, events, start_ns=10**15):
+    """Feeds [(char, 'down'/'up', seconds), ...] the way the Tk handlers do."""
+    buffer.clear()
+    stream.reset()
+    for char, event_type, t in events:
+        code = encode_char(char)
+        event_type = EVENT_DOWN if event_type == 'down' else EVENT_UP
+        timestamp = start_ns + round(t * 1e9)
+        buffer.push(code, event_type, timestamp)
+        stream.push_code(code, event_type, timestamp)
+
+
+def test_stream_and_buffer_agree_with_batch_extraction():
+    bio = BiometricsEngine()
+    buffer = KeystrokeBuffer()
+    stream = bio.new_stream(len(PHRASE), TIMESTAMP_SCALE)
+    for events in make_sessions(PHRASE, 20, np.random.default_rng(0)):
+        capture(buffer, stream, events)
+        codes, _, stamps = buffer.view()
+        assert np.shares_memory(stamps, buffer.timestamps)
+
+        X, valid = bio.extract_features_batch(*buffer.packed(), timestamp_scale=TIMESTAMP_SCALE)
+        assert valid[0] and stream.is_complete
+        assert np.array_equal(stream.features(), X[0])
+        # Same as the float-seconds path to well below a microsecond
+        assert np.allclose(X[0], bio.extract_features(buffer.events()), atol=1e-12)
+        assert np.allclose(X[0], bio.extract_features(events), atol=1e-9)
+
+
+def test_pauses_and_backspace_are_rejected():
+    bio = BiometricsEngine()
+    buffer = KeystrokeBuffer()
+    stream = bio.new_stream(3, TIMESTAMP_SCALE)
+    capture(buffer, stream, [("a", 'down', 0.0), ("a", 'up', 0.1), ("b", 'down', 2.2),
+                             ("b", 'up', 2.3), ("c", 'down', 2.4), ("c", 'up', 2.5)])
+    assert not stream.is_complete and stream.rejected
+
+    capture(buffer, stream, [("a", 'down', 0.0), ("Key.backspace", 'down', 0.1), ("a", 'up', 0.2)])
+    assert stream.rejected
+    assert buffer.events()[1][0] == "Key.backspace"
+
+
+def test_wrapped_buffer_keeps_the_newest_events():
+    buffer = KeystrokeBuffer(capacity=4)
+    for n in range(10):
+        buffer.push(97 + n, n % 2, n)
+    assert buffer.overflowed and len(buffer) == 4
+    codes, types, stamps = buffer.view()
+    assert stamps.tolist() == [6, 7, 8, 9]
+    assert codes.tolist() == [103, 104, 105, 106] and types.tolist() == [0, 1, 0, 1]
+
+    buffer.clear()
+    assert len(buffer) == 0 and not buffer.overflowed
@@ -0,0 +1,126 @@
+"""
+Load generator for the verification daemon (auth_daemon.py).
+
+    python load_generator.py --workers 1 2 4 --clients 8 --requests 500
+
+For each worker count, starts a daemon on a temporary SQLite file with
+synthetic users enrolled, then has `clients` processes, each on its own
+persistent connection, send verify requests back to back. Reports
+throughput and latency percentiles per worker count. Clients are
+separate processes so the generator itself is not what saturates.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from auth_client import AuthClient
+from auth_daemon import AuthDaemon, DaemonConfig
+
+N_ENROLL = 10
+
+
+def enroll_population(address, n_users, seed=0):
+    """Registers and enrolls n_users synthetic typists; returns [(user_id, attempts)]."""
+    from population import TypistPopulation
+
+    pop = TypistPopulation(n_users, seed=seed, pause_rate=0, backspace_rate=0)
+    rng = np.random.default_rng(seed)
+    users = []
+    with AuthClient(address) as client:
+        for u in range(n_users):
+            user_id = client.register_user(f"load-{u}")["id"]
+            X, _ = pop.features(np.full(N_ENROLL, u), rng)
+            client.enroll(user_id, X)
+            attempts, _ = pop.features(np.full(4, u), rng)
+            users.append((user_id, attempts.tolist()))
+    return users
+
+
+def _client(address, users, n_requests, seed, ready, go, results):
+    """Client process: n_requests verifies over one connection; puts its latencies (ns)."""
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(users), size=n_requests)
+    latencies = np.empty(n_requests, dtype=np.int64)
+    with AuthClient(address) as client:
+        client.ping()  # connect before the clock starts
+        ready.put(os.getpid())
+        go.wait()
+        start = time.perf_counter()
+        for i, u in enumerate(picks):
+            user_id, attempts = users[u]
+            t0 = time.perf_counter_ns()
+            client.verify(user_id, attempts[i % len(attempts)])
+            latencies[i] = time.perf_counter_ns() - t0
+        end = time.perf_counter()
+    results.put((start, end, latencies.tolist()))
+
+
+def run_load(address, users, n_clients, n_requests, seed=0):
+    """Drives the daemon at address; returns throughput and latency percentiles."""
+    import multiprocessing
+
+    context = multiprocessing.get_context("spawn")
+    ready, results, go = context.Queue(), context.Queue(), context.Event()
+    clients = [context.Process(target=_client, args=(address, users, n_requests, seed + c, ready, go, results))
+               for c in range(n_clients)]
+    for process in clients:
+        process.start()
+    for _ in clients:
+        ready.get(timeout=60)
+    go.set()
+    runs = [results.get(timeout=600) for _ in clients]
+    for process in clients:
+        process.join()
+
+    # Wall time from the first client starting to the last one finishing
+    elapsed = max(r[1] for r in runs) - min(r[0] for r in runs)
+    latencies = np.concatenate([r[2] for r in runs]) / 1e3
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "requests": len(latencies),
+        "throughput": len(latencies) / elapsed,
+        "p50_us": p50,
+        "p95_us": p95,
+        "p99_us": p99,
+        "max_us": latencies.max(),
+    }
+
+
+def run(worker_counts=(1, 2, 4), n_clients=8, n_requests=500, n_users=100, seed=0, verbose=True):
+    """One daemon per worker count over the same enrolled users; {workers: run_load result}."""
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        address = os.path.join(tmp, "bioauth.sock")
+        config = DaemonConfig(sqlite_path=os.path.join(tmp, "bioauth.db"))
+        with AuthDaemon(address, workers=1, config=config):
+            users = enroll_population(address, n_users, seed)
+        for workers in worker_counts:
+            with AuthDaemon(address, workers=workers, config=config):
+                result = run_load(address, users, n_clients, n_requests, seed)
+            report[workers] = result
+            if verbose:
+                print(f"workers={workers:2d}: {result['throughput']:8.0f} req/s  "
+                      f"p50 {result['p50_us']:7.0f} us  p95 {result['p95_us']:7.0f} us  "
+                      f"p99 {result['p99_us']:7.0f} us  max {result['max_us']:7.0f} us")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=8, help="concurrent client processes")
+    parser.add_argument("--requests", type=int, default=500, help="verify requests per client")
+    parser.add_argument("--users", type=int, default=100, help="enrolled users")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    print(f"[DEBUG] {os.cpu_count()} CPUs, {args.clients} clients x {args.requests} requests")
+    run(args.workers, args.clients, args.requests, args.users, args.seed)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,25 +6,104 @@ load_dotenv()
 
 from ui import AuthUI
 from db_manager import DBManager
+from async_db import AsyncDBManager, ThreadedDBManager
+from auth_client import ThreadedAuthClient
+from model_cache import ModelCache
 from biometrics import BiometricsEngine
+from storage import create_backend
+from session_archive import ArchiveWriter, SessionArchive
+from scorers import get_scorer
+from metrics import METRICS
 
 # Constants (Loaded from environment variables)
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+MODEL_CACHE_SIZE = int(os.getenv("MODEL_CACHE_SIZE", "1024"))
+MODEL_CACHE_TTL = float(os.getenv("MODEL_CACHE_TTL", "300"))
+# Run Supabase calls on a background loop so the window never blocks
+DB_ASYNC = os.getenv("DB_ASYNC", "1") == "1"
+# "supabase", "sqlite" (local only) or "local-first" (SQLite, synced to Supabase)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "bioauth.db")
+SYNC_INTERVAL = float(os.getenv("SYNC_INTERVAL", "5"))
+# Seconds adaptive model updates are coalesced before being written ("0" writes each one inline)
+WRITE_BEHIND = float(os.getenv("WRITE_BEHIND", "2")) or None
+# Scorer for new enrollments: "manhattan" (default, adaptive) or "mahalanobis"
+SCORER = os.getenv("SCORER", "manhattan")
+# Directory for the raw keystroke session archive ("" turns it off)
+SESSION_ARCHIVE = os.getenv("SESSION_ARCHIVE", "session_archive")
+# With METRICS=1: serve /metrics on this local port, and/or rewrite this JSON file
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+# Address of a running auth_daemon.py ("unix:/path" or "host:port"); "" scores in-process
+AUTH_DAEMON = os.getenv("AUTH_DAEMON", "")
 
-def main():
-    print("[DEBUG] Starting Main...")
+def build_app():
+    """The window and what it runs on; nothing here waits on the network."""
     # Initialize Core Systems
     print("[DEBUG] Init DB Manager...")
-    db = DBManager(SUPABASE_URL, SUPABASE_KEY)
+    cache = ModelCache(MODEL_CACHE_SIZE, MODEL_CACHE_TTL)
+    if AUTH_DAEMON:
+        # Storage settings are the daemon's; the client answers the db calls
+        # too, on a worker thread so the window never waits on the socket
+        db = ThreadedAuthClient(AUTH_DAEMON)
+    elif STORAGE_BACKEND == "supabase" and DB_ASYNC:
+        # The client is created on the db loop while the window comes up
+        db = AsyncDBManager(SUPABASE_URL, SUPABASE_KEY, cache=cache, write_behind=WRITE_BEHIND)
+    else:
+        # Local SQLite answers in well under a millisecond, so calls stay inline
+        backend = create_backend(STORAGE_BACKEND, SUPABASE_URL, SUPABASE_KEY,
+                                 sqlite_path=SQLITE_PATH, sync_interval=SYNC_INTERVAL)
+        # ...except a local-first model miss, which reads through to Supabase
+        manager = ThreadedDBManager if STORAGE_BACKEND == "local-first" else DBManager
+        db = manager(cache=cache, backend=backend, write_behind=WRITE_BEHIND)
     print("[DEBUG] Init Biometrics...")
-    bio = BiometricsEngine()
+    bio = BiometricsEngine(get_scorer(SCORER))
+    archive = ArchiveWriter(SessionArchive(SESSION_ARCHIVE)) if SESSION_ARCHIVE else None
     
     # Initialize UI
     print("[DEBUG] Init UI...")
-    app = AuthUI(db, bio)
+    app = AuthUI(db, bio, archive=archive, daemon=db if AUTH_DAEMON else None)
+    return app, db, archive
+
+def export_metrics(db, archive):
+    """Counters kept elsewhere, read at export time, and the exporters."""
+    if not METRICS.enabled:
+        return None
+    # With AUTH_DAEMON, the cache and write queue live in the daemon
+    if not AUTH_DAEMON:
+        for name in ("hits", "misses", "evictions", "expirations"):
+            METRICS.gauge(f"model_cache.{name}", lambda name=name: getattr(db.cache, name))
+        if db.writes is not None:
+            METRICS.gauge("write_behind.pending", lambda: len(db.writes))
+            METRICS.gauge("write_behind.rows_written", lambda: db.writes.written)
+    if archive is not None:
+        METRICS.gauge("archive.dropped", lambda: archive.dropped)
+    if METRICS_PORT:
+        METRICS.serve(METRICS_PORT)
+        print(f"[DEBUG] Metrics on http://127.0.0.1:{METRICS_PORT}/metrics")
+    if METRICS_FILE:
+        return METRICS.export_json(METRICS_FILE)
+    return None
+
+def shutdown(db, archive):
+    if archive is not None:
+        archive.close()
+    # Flushes queued model updates
+    db.close()
+
+def main():
+    print("[DEBUG] Starting Main...")
+    app, db, archive = build_app()
+    export_stop = export_metrics(db, archive)
     print("[DEBUG] Starting Mainloop...")
-    app.mainloop()
+    try:
+        app.mainloop()
+    finally:
+        shutdown(db, archive)
+        if export_stop is not None:
+            export_stop.set()
+            METRICS.write_json(METRICS_FILE)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,278 @@
+"""
+Latency histograms and counters for the hot paths.
+
+    from metrics import METRICS
+
+    @METRICS.timed("biometrics.authenticate")
+    def authenticate(...): ...
+
+    with METRICS.timer("ui.render"):
+        ...
+    METRICS.count("verify.accepted")
+
+Set METRICS=1 to collect. Otherwise METRICS is disabled: timed() hands
+back the undecorated function, so instrumented code runs exactly as
+before, and timer()/count() return after one attribute check. The flag
+is read when this module is imported, before anything is decorated.
+
+Export with METRICS.serve(port) (Prometheus text on /metrics, JSON on
+/metrics.json) or METRICS.write_json(path).
+"""
+import inspect
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+QUANTILES = (0.5, 0.95, 0.99)
+# Bucket upper bounds in ns: 10 per decade from 100 ns to 100 s (~26% wide)
+BOUNDS_NS = [round(100 * 10 ** (i / 10)) for i in range(91)]
+PROMETHEUS_PREFIX = "bioauth_"
+
+
+class Histogram:
+    """
+    Latency counts in fixed log-spaced buckets; quantiles are read off the
+    buckets. observe_ns takes no lock: a thread switch inside it can at
+    worst lose one observation, which quantiles shrug off, and a lock
+    would more than double its cost.
+    """
+
+    __slots__ = ("counts", "count", "total_ns", "max_ns")
+
+    def __init__(self):
+        self.counts = [0] * (len(BOUNDS_NS) + 1)  # the last bucket is +Inf
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def observe_ns(self, ns):
+        self.counts[bisect_left(BOUNDS_NS, ns)] += 1
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def observe(self, seconds):
+        self.observe_ns(int(seconds * 1e9))
+
+    def quantile(self, q):
+        """q-quantile in seconds, interpolated log-linearly within its bucket."""
+        counts, max_ns = list(self.counts), self.max_ns
+        count = sum(counts)
+        if count == 0 or max_ns == 0:
+            # Nothing observed, or only 0 ns deltas (coarse perf_counter_ns clocks)
+            return 0.0
+        rank = q * count
+        seen = 0
+        for i, n in enumerate(counts):
+            if n and seen + n >= rank:
+                lower = BOUNDS_NS[i - 1] if i > 0 else 1
+                upper = BOUNDS_NS[i] if i < len(BOUNDS_NS) else max_ns
+                upper = min(upper, max_ns)
+                lower = min(lower, upper)
+                fraction = (rank - seen) / n
+                return lower * (upper / lower) ** fraction * 1e-9
+            seen += n
+        return max_ns * 1e-9
+
+    def summary(self):
+        summary = {"count": self.count, "sum": self.total_ns * 1e-9, "max": self.max_ns * 1e-9}
+        for q in QUANTILES:
+            summary[f"p{round(q * 100)}"] = self.quantile(q)
+        return summary
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe_ns(time.perf_counter_ns() - self.start)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    """A registry of named histograms, counters and gauges (see the module docstring)."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}  # name -> callable returning a number
+        self.lock = threading.Lock()
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        return histogram
+
+    # --- Instrumentation ---
+    def timed(self, name):
+        """Decorator timing every call of a function (or coroutine function) under name."""
+        def decorate(fn):
+            if not self.enabled:
+                return fn
+            histogram = self.histogram(name)
+            clock = time.perf_counter_ns
+
+            if inspect.iscoroutinefunction(fn):
+                @wraps(fn)
+                async def timed_coroutine(*args, **kwargs):
+                    start = clock()
+                    try:
+                        return await fn(*args, **kwargs)
+                    finally:
+                        histogram.observe_ns(clock() - start)
+                return timed_coroutine
+
+            @wraps(fn)
+            def timed_call(*args, **kwargs):
+                start = clock()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    histogram.observe_ns(clock() - start)
+            return timed_call
+        return decorate
+
+    def timer(self, name):
+        """Context manager timing its block under name."""
+        if not self.enabled:
+            return NULL_TIMER
+        return _Timer(self.histogram(name))
+
+    def count(self, name, n=1):
+        # Unlocked, like Histogram.observe_ns
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, read):
+        """Reports read() under name at export time (e.g. cache hit counts kept elsewhere)."""
+        with self.lock:
+            self.gauges[name] = read
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+
+    # --- Export ---
+    def snapshot(self):
+        """{"histograms": {name: {count, sum, max, p50, p95, p99}}, "counters": ..., "gauges": ...}, in seconds."""
+        with self.lock:
+            histograms = dict(self.histograms)
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+        gauge_values = {}
+        for name, read in gauges.items():
+            try:
+                gauge_values[name] = float(read())
+            except Exception:
+                gauge_values[name] = math.nan
+        return {
+            "time": time.time(),
+            "histograms": {name: h.summary() for name, h in sorted(histograms.items())},
+            "counters": dict(sorted(counters.items())),
+            "gauges": dict(sorted(gauge_values.items())),
+        }
+
+    def prometheus(self):
+        """The snapshot in Prometheus text format; histograms become summaries."""
+        snapshot = self.snapshot()
+        lines = []
+        for name, h in snapshot["histograms"].items():
+            metric = _prometheus_name(name) + "_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for q in QUANTILES:
+                lines.append(f'{metric}{{quantile="{q}"}} {h[f"p{round(q * 100)}"]:.9g}')
+            lines.append(f"{metric}_sum {h['sum']:.9g}")
+            lines.append(f"{metric}_count {h['count']}")
+        for name, value in snapshot["counters"].items():
+            metric = _prometheus_name(name) + "_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        for name, value in snapshot["gauges"].items():
+            metric = _prometheus_name(name)
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value:.9g}")
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path):
+        """Writes the snapshot to path atomically (readers never see half a file)."""
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp, path)
+
+    def export_json(self, path, interval=10.0):
+        """Rewrites path every interval seconds on a daemon thread; returns a stop Event."""
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                self.write_json(path)
+
+        threading.Thread(target=loop, name="metrics-export", daemon=True).start()
+        return stop
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serves /metrics (Prometheus) and /metrics.json on a daemon thread; returns the server."""
+        # Only the exporting process pays for importing the HTTP server
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = metrics.prometheus(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = json.dumps(metrics.snapshot()), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass  # scrapes would flood the console
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        return server
+
+
+def _prometheus_name(name):
+    return PROMETHEUS_PREFIX + "".join(c if c.isalnum() else "_" for c in name)
+
+
+# Process-wide registry; see the module docstring for METRICS=1
+METRICS = Metrics(enabled=os.getenv("METRICS", "0") == "1")
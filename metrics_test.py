@@ -0,0 +1,118 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import urllib.request
+
+import numpy as np
+
+from metrics import Histogram, Metrics
+
+
+def test_histogram_quantiles_within_a_bucket():
+    rng = np.random.default_rng(0)
+    samples = rng.lognormal(np.log(50e-6), 0.5, size=20000)
+    histogram = Histogram()
+    for s in samples:
+        histogram.observe(s)
+
+    summary = histogram.summary()
+    assert summary["count"] == len(samples)
+    assert np.isclose(summary["sum"], samples.sum(), rtol=1e-4)  # whole ns
+    for q in (50, 95, 99):
+        # Buckets are 10 per decade, so within ~26%
+        assert abs(summary[f"p{q}"] / np.percentile(samples, q) - 1) < 0.26
+    assert summary["p99"] <= summary["max"]
+
+    # Calls too quick for a coarse clock time at 0 ns
+    histogram = Histogram()
+    histogram.observe_ns(0)
+    assert histogram.summary() == {"count": 1, "sum": 0.0, "max": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0}
+    histogram.observe_ns(150)
+    assert 0 < histogram.quantile(0.99) <= 150e-9
+
+
+def test_timed_counters_and_export(tmp_path):
+    metrics = Metrics()
+
+    @metrics.timed("work")
+    def work(x):
+        return x + 1
+
+    @metrics.timed("fetch")
+    async def fetch():
+        return "row"
+
+    assert work(1) == 2 and work.__name__ == "work"
+    assert asyncio.run(fetch()) == "row"
+    with metrics.timer("block"):
+        pass
+    metrics.count("verify.accepted")
+    metrics.count("verify.accepted", 2)
+    metrics.gauge("model_cache.hits", lambda: 7)
+
+    snapshot = metrics.snapshot()
+    assert snapshot["histograms"]["work"]["count"] == 1
+    assert snapshot["histograms"]["fetch"]["count"] == 1
+    assert snapshot["counters"] == {"verify.accepted": 3}
+    assert snapshot["gauges"] == {"model_cache.hits": 7.0}
+
+    text = metrics.prometheus()
+    assert 'bioauth_work_seconds{quantile="0.99"}' in text
+    assert "bioauth_verify_accepted_total 3" in text
+    assert "bioauth_model_cache_hits 7" in text
+
+    path = tmp_path / "metrics.json"
+    metrics.write_json(path)
+    assert json.loads(path.read_text())["counters"] == {"verify.accepted": 3}
+
+    server = metrics.serve(0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        assert "bioauth_block_seconds_count 1" in urllib.request.urlopen(f"{url}/metrics").read().decode()
+        assert json.load(urllib.request.urlopen(f"{url}/metrics.json"))["counters"]["verify.accepted"] == 3
+    finally:
+        server.shutdown()
+
+
+def test_disabled_metrics_leave_functions_untouched():
+    metrics = Metrics(enabled=False)
+
+    def work():
+        return 1
+
+    assert metrics.timed("work")(work) is work
+    with metrics.timer("block"):
+        metrics.count("n")
+    assert metrics.snapshot()["histograms"] == {} and metrics.snapshot()["counters"] == {}
+
+
+INSTRUMENTED = """
+import json
+import numpy as np
+from biometrics import BiometricsEngine
+from db_manager import DBManager
+from metrics import METRICS
+from storage import SQLiteBackend
+
+bio = BiometricsEngine()
+db = DBManager(backend=SQLiteBackend(":memory:"))
+user = db.register_user("dana")
+X = np.random.default_rng(0).uniform(0.1, 0.2, size=(10, 5))
+std, mean, threshold = bio.train_model(X)
+db.save_model(user["id"], std, mean, threshold)
+bio.authenticate(X[0], mean, std, threshold)
+db.get_model(user["id"])
+print(json.dumps(METRICS.snapshot()))
+"""
+
+
+def test_hot_paths_are_instrumented_with_metrics_on():
+    env = {**os.environ, "METRICS": "1"}
+    out = subprocess.run([sys.executable, "-c", INSTRUMENTED], env=env, capture_output=True,
+                         text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    histograms = json.loads(out.stdout)["histograms"]
+    for name in ("biometrics.train_model", "biometrics.authenticate", "db.register_user",
+                 "db.save_model", "db.get_model"):
+        assert histograms[name]["count"] == 1, name
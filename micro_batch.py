@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class _Batch:
+    """Requests scored together; one Event wakes every waiter in the batch."""
+    __slots__ = ("rows", "deadline", "done", "results", "error")
+
+    def __init__(self, deadline):
+        self.rows = []
+        self.deadline = deadline
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+
+class AuthTicket:
+    """Handle for a submitted request. result() blocks until its batch is scored."""
+    __slots__ = ("batch", "index")
+
+    def __init__(self, batch, index):
+        self.batch = batch
+        self.index = index
+
+    def done(self):
+        return self.batch.done.is_set()
+
+    def result(self, timeout=None):
+        if not self.batch.done.wait(timeout):
+            raise TimeoutError("authentication batch not scored in time")
+        if self.batch.error is not None:
+            raise self.batch.error
+        accepted, distances, scores = self.batch.results
+        i = self.index
+        return bool(accepted[i]), float(distances[i]), float(scores[i])
+
+
+class MicroBatchAuthenticator:
+    """
+    Collects concurrent authenticate requests and scores them together.
+
+    Requests wait until max_batch of them are pending or max_wait seconds
+    have passed since the first one arrived, then the whole batch goes
+    through BiometricsEngine.authenticate_batch in one pass.
+    submit() returns an AuthTicket whose result() is
+    (is_authenticated, distance, score), same as authenticate.
+    """
+
+    def __init__(self, engine, max_batch=256, max_wait=0.002):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = deque()
+        self.cond = threading.Condition()
+        self.closed = False
+        self.worker = threading.Thread(target=self._run, name="auth-batcher", daemon=True)
+        self.worker.start()
+
+    def submit(self, attempt_vector, mean_vector, std_vector, threshold):
+        with self.cond:
+            if self.closed:
+                raise RuntimeError("MicroBatchAuthenticator is closed")
+            if not self.batches or len(self.batches[-1].rows) >= self.max_batch:
+                self.batches.append(_Batch(time.monotonic() + self.max_wait))
+                self.cond.notify()
+            batch = self.batches[-1]
+            batch.rows.append((attempt_vector, mean_vector, std_vector, threshold))
+            if len(batch.rows) >= self.max_batch:
+                self.cond.notify()
+            return AuthTicket(batch, len(batch.rows) - 1)
+
+    def authenticate(self, attempt_vector, mean_vector, std_vector, threshold):
+        """Blocking drop-in for BiometricsEngine.authenticate."""
+        return self.submit(attempt_vector, mean_vector, std_vector, threshold).result()
+
+    def close(self):
+        """Flushes whatever is pending and stops the worker."""
+        with self.cond:
+            if self.closed:
+                return
+            self.closed = True
+            self.cond.notify()
+        self.worker.join()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.batches and not self.closed:
+                    self.cond.wait()
+                if not self.batches:
+                    return
+
+                batch = self.batches[0]
+                while len(batch.rows) < self.max_batch and not self.closed:
+                    remaining = batch.deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+                self.batches.popleft()
+
+            self._flush(batch)
+
+    def _flush(self, batch):
+        try:
+            rows = batch.rows
+            attempts, means, stds, thresholds = zip(*rows)
+            # Models of different users can differ in length and in kind (a std
+            # vector or a whitening matrix); each (length, kind) is scored apart
+            by_shape = {}
+            for i, (x, std) in enumerate(zip(attempts, stds)):
+                by_shape.setdefault((len(x), np.ndim(std)), []).append(i)
+            if len(by_shape) == 1:
+                batch.results = self.engine.authenticate_batch(
+                    np.array(attempts), np.array(means), np.array(stds), np.array(thresholds))
+            else:
+                n = len(rows)
+                accepted, distances, scores = np.zeros(n, dtype=bool), np.zeros(n), np.zeros(n)
+                for idx in by_shape.values():
+                    accepted[idx], distances[idx], scores[idx] = self.engine.authenticate_batch(
+                        np.array([attempts[i] for i in idx]), np.array([means[i] for i in idx]),
+                        np.array([stds[i] for i in idx]), np.array([thresholds[i] for i in idx]))
+                batch.results = accepted, distances, scores
+        except Exception as e:
+            batch.error = e
+        batch.done.set()
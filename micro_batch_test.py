@@ -0,0 +1,72 @@
+import threading
+
+import numpy as np
+
+from biometrics import BiometricsEngine
+from micro_batch import MicroBatchAuthenticator
+from scorers import MahalanobisScorer
+
+
+def test_batch_matches_scalar_authenticate():
+    bio = BiometricsEngine()
+    rng = np.random.default_rng(3)
+    means = rng.uniform(0.05, 0.25, size=(200, 85))
+    stds = means * 0.2
+    attempts = means + rng.normal(0, 2, size=means.shape) * stds
+    thresholds = rng.uniform(60, 200, size=200)
+
+    accepted, distances, scores = bio.authenticate_batch(attempts, means, stds, thresholds)
+    for i in range(200):
+        ok, dist, score = bio.authenticate(attempts[i], means[i], stds[i], thresholds[i])
+        assert ok == accepted[i] and dist == distances[i] and score == scores[i]
+    assert accepted.any() and not accepted.all()
+
+
+def test_queue_resolves_concurrent_requests():
+    bio = BiometricsEngine()
+    rng = np.random.default_rng(4)
+    batcher = MicroBatchAuthenticator(bio, max_batch=16, max_wait=0.01)
+
+    # Two model sizes in flight at once (e.g. different passphrases)
+    requests = []
+    for i in range(100):
+        d = 85 if i % 3 else 9
+        mean = rng.uniform(0.05, 0.25, size=d)
+        requests.append((mean + 0.01, mean, mean * 0.2, float(d)))
+
+    results = [None] * len(requests)
+
+    def client(rows):
+        for i in rows:
+            results[i] = batcher.authenticate(*requests[i])
+
+    threads = [threading.Thread(target=client, args=(range(c, 100, 4),)) for c in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    pending = batcher.submit(*requests[0])
+    batcher.close()
+    assert pending.result(timeout=1) == results[0]
+
+    for request, result in zip(requests, results):
+        ok, dist, score = bio.authenticate(*request)
+        assert result == (ok, dist, score)
+
+
+def test_mixed_scorer_batch():
+    bio = BiometricsEngine()
+    rng = np.random.default_rng(5)
+    samples = rng.uniform(0.05, 0.25, size=9) * (1 + 0.2 * rng.normal(size=(2, 10, 9)))
+    models = [MahalanobisScorer().fit(samples[0]), bio.train_model(samples[1])]
+    batcher = MicroBatchAuthenticator(bio, max_batch=4, max_wait=1.0)
+
+    # A whitening-matrix model and std-vector models in one batch
+    requests = [(samples[u % 2][0] + 0.01, models[u % 2][1], models[u % 2][0], models[u % 2][2])
+                for u in range(4)]
+    tickets = [batcher.submit(*request) for request in requests]
+    batcher.close()
+    for ticket, request in zip(tickets, requests):
+        ok, dist, score = bio.authenticate(*request)
+        assert ticket.result(timeout=1) == (ok, dist, score)
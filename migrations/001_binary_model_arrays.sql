@@ -0,0 +1,6 @@
+-- Store model arrays in the compact binary encoding from model_codec.py
+-- (base64 text) instead of JSON float lists.
+-- Existing rows keep their JSON list text and still decode.
+alter table biometrics
+  alter column transform_matrix type text using (transform_matrix #>> '{}'),
+  alter column mean_vector type text using (mean_vector #>> '{}');
@@ -0,0 +1,4 @@
+-- Running statistics behind online model updates (online_model.py).
+-- Null for models saved before; they are seeded from the stored model.
+alter table biometrics
+  add column online_state text;
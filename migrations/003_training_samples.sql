@@ -0,0 +1,4 @@
+-- Enrollment vectors kept for fleet-wide retraining (retrain.py).
+-- Null for users enrolled before; they are skipped until they enroll again.
+alter table biometrics
+  add column training_samples text;
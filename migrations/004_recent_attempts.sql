@@ -0,0 +1,4 @@
+-- Recent accepted feature vectors per user, for replay detection (replay_guard.py).
+-- Written after accepted verifications; null until the first one.
+alter table biometrics
+  add column recent_attempts text;
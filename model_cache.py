@@ -0,0 +1,77 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ModelCache:
+    """
+    Bounded in-process cache of decoded models, keyed by user_id.
+
+    Entries are evicted least-recently-used once max_size is reached, and
+    expire ttl seconds after they were stored. get() hands back a shallow
+    copy of the model dict, so callers can rebind its keys freely; the
+    arrays inside are shared and should be treated as read-only.
+    """
+
+    def __init__(self, max_size=1024, ttl=300.0, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()  # user_id -> (expires_at, model)
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, model = entry
+            if self.clock() >= expires_at:
+                del self.entries[user_id]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(user_id)
+            self.hits += 1
+            return dict(model)
+
+    def put(self, user_id, model):
+        with self.lock:
+            self.entries[user_id] = (self.clock() + self.ttl, dict(model))
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def update(self, user_id, **fields):
+        """Write-through for partial updates. Only touches a live entry."""
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None:
+                entry[1].update(fields)
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,97 @@
+"""
+Compact binary encoding for model arrays (mean/std vectors, transforms).
+
+Layout, all little-endian:
+    magic   3s   b"KBM"
+    version u1   FORMAT_VERSION
+    dtype   u1   1 = float32, 2 = float64
+    ndim    u1
+    pad     2x
+    shape   u4 * ndim
+    crc32   u4   of the payload
+    (zero padding up to a multiple of 8 bytes)
+    payload      raw array data, C order
+
+Blobs are stored in text columns as base64. Rows written before this format
+hold JSON float lists, which decode_array_text still reads.
+"""
+import base64
+import json
+import struct
+import zlib
+
+import numpy as np
+
+MAGIC = b"KBM"
+FORMAT_VERSION = 1
+
+DTYPE_CODES = {np.dtype("<f4"): 1, np.dtype("<f8"): 2}
+CODE_DTYPES = {code: dtype for dtype, code in DTYPE_CODES.items()}
+
+HEADER = struct.Struct("<3sBBB2x")
+
+
+def encode_array(arr, dtype=None):
+    """Encodes a float array as a versioned, checksummed binary blob."""
+    arr = np.asarray(arr)
+    if dtype is None:
+        dtype = np.float32 if arr.dtype == np.float32 else np.float64
+    dtype = np.dtype(dtype).newbyteorder("<")
+    if dtype not in DTYPE_CODES:
+        raise ValueError(f"Unsupported model dtype: {dtype}")
+
+    payload = np.ascontiguousarray(arr, dtype=dtype).tobytes()
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, DTYPE_CODES[dtype], arr.ndim)
+    header += struct.pack(f"<{arr.ndim}I", *arr.shape)
+    header += struct.pack("<I", zlib.crc32(payload))
+    header += b"\0" * (-len(header) % 8)  # keep the payload 8-byte aligned
+    return header + payload
+
+
+def decode_array(blob):
+    """
+    Decodes a blob from encode_array. The result is a read-only view on
+    the blob's memory (np.frombuffer), not a copy.
+    """
+    view = memoryview(blob)
+    if len(view) < HEADER.size:
+        raise ValueError("Model blob is truncated")
+
+    magic, version, dtype_code, ndim = HEADER.unpack_from(view, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a model blob")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported model blob version: {version}")
+    if dtype_code not in CODE_DTYPES:
+        raise ValueError(f"Unknown model blob dtype: {dtype_code}")
+
+    if len(view) < HEADER.size + 4 * ndim + 4:
+        raise ValueError("Model blob is truncated")
+    shape = struct.unpack_from(f"<{ndim}I", view, HEADER.size)
+    (crc,) = struct.unpack_from("<I", view, HEADER.size + 4 * ndim)
+    offset = HEADER.size + 4 * ndim + 4
+    offset += -offset % 8
+
+    dtype = CODE_DTYPES[dtype_code]
+    count = int(np.prod(shape))
+    payload = view[offset:offset + count * dtype.itemsize]
+    if len(payload) != count * dtype.itemsize:
+        raise ValueError("Model blob is truncated")
+    if zlib.crc32(payload) != crc:
+        raise ValueError("Model blob checksum mismatch")
+
+    return np.frombuffer(payload, dtype=dtype, count=count).reshape(shape)
+
+
+def encode_array_text(arr, dtype=None):
+    """encode_array, as base64 text for the text model columns."""
+    return base64.b64encode(encode_array(arr, dtype)).decode("ascii")
+
+
+def decode_array_text(value):
+    """Decodes a model column: base64 binary, or a legacy JSON float list."""
+    if isinstance(value, list):
+        return np.array(value)
+    if value[:1] == "[":
+        return np.array(json.loads(value))
+    return decode_array(base64.b64decode(value))
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from model_codec import decode_array, decode_array_text, encode_array, encode_array_text
+
+
+def test_round_trip_is_exact_and_zero_copy():
+    rng = np.random.default_rng(0)
+    for arr in (rng.normal(size=85), rng.normal(size=(85, 85)), rng.normal(size=7).astype(np.float32)):
+        blob = encode_array(arr)
+        out = decode_array(blob)
+        assert out.dtype == arr.dtype and np.array_equal(out, arr)
+        assert not out.flags.owndata and not out.flags.writeable
+        assert np.array_equal(decode_array_text(encode_array_text(arr)), arr)
+
+    # Narrowing on request
+    out = decode_array(encode_array(np.array([0.1, 0.2]), np.float32))
+    assert out.dtype == np.float32
+
+
+def test_corrupt_blobs_are_rejected():
+    blob = bytearray(encode_array(np.arange(10.0)))
+    blob[-1] ^= 0xFF
+    with pytest.raises(ValueError, match="checksum"):
+        decode_array(bytes(blob))
+    with pytest.raises(ValueError, match="truncated"):
+        decode_array(encode_array(np.arange(10.0))[:-8])
+    # Cut inside the shape and checksum fields
+    for end in range(8, 17):
+        with pytest.raises(ValueError, match="truncated"):
+            decode_array(encode_array(np.ones((3, 4)))[:end])
+    with pytest.raises(ValueError, match="Not a model blob"):
+        decode_array(b"\0" * 32)
@@ -0,0 +1,311 @@
+"""
+Every enrolled (scaled Manhattan) model in a few contiguous arrays.
+
+    store = ModelStore.from_db(db)
+    db.add_model_listener(store.update)  # save_model / adaptive updates land in place
+    std, mean, threshold = store.get(user_id)
+
+    store.save("models.snapshot")
+    shared = ModelStore.load("models.snapshot")  # mmap; workers share one copy
+
+A dict of float64 arrays per user costs ~2 KB of objects on top of the
+data; here a user is one row of two float32 matrices and a threshold,
+~690 bytes at 85 features, plus 36 bytes of id and 8 of hash table.
+"""
+import json
+import os
+import shutil
+import threading
+import zlib
+
+import numpy as np
+
+FORMAT_VERSION = 1
+DTYPE = np.dtype("<f4")
+ID_DTYPE = np.dtype("S36")
+EMPTY = -1
+# Files of a snapshot directory, besides meta.json
+ARRAYS = ("means", "stds", "thresholds", "user_ids", "slots")
+
+
+def _key(user_id):
+    key = str(user_id).encode("ascii")
+    if len(key) > ID_DTYPE.itemsize:
+        raise ValueError(f"user_id longer than {ID_DTYPE.itemsize} bytes: {user_id!r}")
+    return key
+
+
+def _slot(key, mask):
+    return zlib.crc32(key) & mask
+
+
+class ModelStore:
+    """
+    Struct-of-arrays model store: row i of means/stds/thresholds is the
+    model of user_ids[i]. user_id -> row is an open-addressing hash table
+    (slots, linear probing on crc32, kept at most half full), so lookups
+    are O(1) and the table itself is an array that maps from a snapshot
+    like the rest; loading never rebuilds anything.
+
+    Rows are updated in place. A store loaded with mode="r+" writes
+    those updates through to the snapshot, where every process mapping
+    it sees them; a new user there, or once capacity runs out, moves the
+    store into (doubled) process memory first. One loaded with mode="r"
+    moves into process memory on its first write of any kind, so it can
+    be a model listener too. Whitening-matrix models
+    (Mahalanobis) don't fit a row and are left out; see update().
+
+    Writes take a lock; lookups don't, and only ever see whole arrays.
+    """
+
+    def __init__(self, n_features, capacity=1024):
+        self.n_features = n_features
+        self.n = 0
+        self.path = None
+        self.lock = threading.Lock()
+        self.means = np.zeros((capacity, n_features), dtype=DTYPE)
+        self.stds = np.ones((capacity, n_features), dtype=DTYPE)
+        self.thresholds = np.zeros(capacity, dtype=DTYPE)
+        self.user_ids = np.zeros(capacity, dtype=ID_DTYPE)
+        self.slots = np.full(_table_size(capacity), EMPTY, dtype=np.int32)
+
+    @classmethod
+    def from_arrays(cls, user_ids, std_vectors, mean_vectors, thresholds):
+        """A store over many models at once (rows in the order given)."""
+        keys = [_key(u) for u in user_ids]
+        if len(set(keys)) != len(keys):
+            raise ValueError("duplicate user_id")
+        mean_vectors = np.asarray(mean_vectors)
+        store = cls(mean_vectors.shape[1], capacity=max(len(keys), 1))
+        n = len(keys)
+        store.means[:n] = mean_vectors
+        store.stds[:n] = std_vectors
+        store.thresholds[:n] = thresholds
+        store.user_ids[:n] = keys
+        store.n = n
+        store._rehash(len(store.slots))
+        return store
+
+    @classmethod
+    def from_db(cls, db, page_size=1000):
+        """A store over every scaled Manhattan model in db (DBManager.iter_models)."""
+        store = None
+        for user_id, model in db.iter_models(page_size):
+            std_vector = np.asarray(model["transform_matrix"])
+            if std_vector.ndim != 1:
+                continue
+            if store is None:
+                store = cls(len(std_vector))
+            store.put(user_id, std_vector, model["mean_vector"], model["threshold"])
+        return store
+
+    def __len__(self):
+        return self.n
+
+    def __contains__(self, user_id):
+        return self.row(user_id) is not None
+
+    @property
+    def capacity(self):
+        return len(self.thresholds)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ARRAYS)
+
+    # --- Lookups ---
+    def row(self, user_id):
+        """The row of user_id, or None."""
+        key = _key(user_id)
+        slots, user_ids = self.slots, self.user_ids
+        mask = len(slots) - 1
+        i = _slot(key, mask)
+        while True:
+            row = slots[i]
+            if row == EMPTY:
+                return None
+            if user_ids[row] == key:
+                return int(row)
+            i = (i + 1) & mask
+
+    def rows(self, user_ids):
+        """Rows of many users as an int array (-1 where unknown), for gathers like means[rows]."""
+        return np.array([EMPTY if (r := self.row(u)) is None else r for u in user_ids], dtype=np.int64)
+
+    def get(self, user_id):
+        """(std_vector, mean_vector, threshold) as float32 views into the store, or None."""
+        row = self.row(user_id)
+        if row is None:
+            return None
+        return self.stds[row], self.means[row], float(self.thresholds[row])
+
+    def get_model(self, user_id):
+        """get() as the model dict DBManager.get_model returns (without online_state)."""
+        model = self.get(user_id)
+        if model is None:
+            return None
+        std_vector, mean_vector, threshold = model
+        return {"transform_matrix": std_vector, "mean_vector": mean_vector,
+                "threshold": threshold, "online_state": None}
+
+    # --- Writes ---
+    def put(self, user_id, std_vector, mean_vector, threshold):
+        """Inserts a user, or overwrites their row in place."""
+        with self.lock:
+            row = self.row(user_id)
+            if row is None:
+                row = self._insert(_key(user_id))
+            else:
+                self._writable()
+            self.stds[row] = std_vector
+            self.means[row] = mean_vector
+            self.thresholds[row] = threshold
+            return row
+
+    def update(self, user_id, model):
+        """
+        DBManager.add_model_listener hook: writes a model dict (or just its
+        mean_vector, for a mean-only update) into the user's row. A user who
+        switches to a whitening-matrix model is dropped from the store.
+        """
+        transform_matrix = model.get("transform_matrix")
+        if transform_matrix is not None and np.ndim(transform_matrix) != 1:
+            self.remove(user_id)
+            return
+        if transform_matrix is not None:
+            self.put(user_id, transform_matrix, model["mean_vector"], model["threshold"])
+            return
+        with self.lock:
+            row = self.row(user_id)
+            if row is not None and model.get("mean_vector") is not None:
+                self._writable()
+                self.means[row] = model["mean_vector"]
+
+    def remove(self, user_id):
+        """Drops a user. The last row moves into the gap and the table is rebuilt (O(n))."""
+        with self.lock:
+            row = self.row(user_id)
+            if row is None:
+                return
+            self._own()
+            last = self.n - 1
+            if row != last:
+                for name in ("means", "stds", "thresholds", "user_ids"):
+                    array = getattr(self, name)
+                    array[row] = array[last]
+            self.user_ids[last] = b""
+            self.n = last
+            self._rehash(len(self.slots))
+
+    def _insert(self, key):
+        if self.n == self.capacity or self.path is not None:
+            self._own(grow=self.n == self.capacity)
+        row = self.n
+        self.user_ids[row] = key
+        self.n += 1
+        if self.n * 2 > len(self.slots):
+            self._rehash(len(self.slots) * 2)
+        else:
+            self._place(key, row)
+        return row
+
+    def _place(self, key, row):
+        slots = self.slots
+        mask = len(slots) - 1
+        i = _slot(key, mask)
+        while slots[i] != EMPTY:
+            i = (i + 1) & mask
+        slots[i] = row
+
+    def _rehash(self, size):
+        """Rebuilds the hash table at size slots, vectorized over all rows."""
+        mask = size - 1
+        slots = np.full(size, EMPTY, dtype=np.int32)
+        keys = self.user_ids[:self.n].tolist()
+        pos = np.fromiter((zlib.crc32(k) for k in keys), dtype=np.int64, count=len(keys)) & mask
+        rows = np.arange(self.n)
+        # Each round, every free slot goes to the first row probing it and
+        # the rest move one slot on. A row only passes a slot once it is
+        # taken, so lookups (which stop at an empty slot) still find it.
+        while len(rows):
+            free = np.flatnonzero(slots[pos] == EMPTY)
+            taken, first = np.unique(pos[free], return_index=True)
+            slots[taken] = rows[free[first]]
+            waiting = np.ones(len(rows), dtype=bool)
+            waiting[free[first]] = False
+            rows, pos = rows[waiting], (pos[waiting] + 1) & mask
+        self.slots = slots
+
+    def _writable(self):
+        """Before an in-place write: a read-only mapping moves into process memory."""
+        if not self.means.flags.writeable:
+            self._own()
+
+    def _own(self, grow=False):
+        """Moves a mapped store into process memory (doubling capacity if grow)."""
+        if self.path is None and not grow:
+            return
+        capacity = self.capacity * 2 if grow else self.capacity
+        for name in ("means", "stds", "thresholds", "user_ids"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            if name == "stds":
+                new[:] = 1
+            new[:self.n] = old[:self.n]
+            setattr(self, name, new)
+        self.slots = np.array(self.slots)
+        self.path = None
+
+    # --- Snapshots ---
+    def save(self, path):
+        """
+        Writes the store to the directory path: meta.json and one .npy per
+        array, trimmed to the live rows. Written beside it and swapped in,
+        so a reader never maps a half-written snapshot.
+        """
+        tmp = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        n = self.n
+        # The hash table refers to rows only, so it is valid for the trimmed arrays
+        np.save(os.path.join(tmp, "means.npy"), self.means[:n])
+        np.save(os.path.join(tmp, "stds.npy"), self.stds[:n])
+        np.save(os.path.join(tmp, "thresholds.npy"), self.thresholds[:n])
+        np.save(os.path.join(tmp, "user_ids.npy"), self.user_ids[:n])
+        np.save(os.path.join(tmp, "slots.npy"), self.slots)
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump({"version": FORMAT_VERSION, "n_users": n, "n_features": self.n_features}, f)
+
+        old = f"{path}.old-{os.getpid()}"
+        if os.path.exists(path):
+            os.rename(path, old)
+        os.rename(tmp, path)
+        shutil.rmtree(old, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path, mode="r"):
+        """
+        Maps a snapshot. mode "r": read-only, pages shared by every process
+        mapping the file; "r+": in-place row updates write through to it;
+        "c": updates stay private to this process.
+        """
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta["version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported model store version {meta['version']}")
+
+        store = cls.__new__(cls)
+        store.n_features = meta["n_features"]
+        store.n = meta["n_users"]
+        store.path = path
+        store.lock = threading.Lock()
+        for name in ARRAYS:
+            setattr(store, name, np.load(os.path.join(path, name + ".npy"), mmap_mode=mode))
+        if len(store.user_ids) != store.n:
+            raise ValueError(f"Snapshot {path} is inconsistent")
+        return store
+
+
+def _table_size(capacity):
+    # Power of two, at least twice the capacity (load factor <= 0.5)
+    return 1 << max(4, (2 * capacity - 1).bit_length())
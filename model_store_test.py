@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from db_manager import DBManager
+from model_store import ModelStore
+from storage import SQLiteBackend
+
+
+def test_hash_index_matches_a_dict_through_inserts_and_removes():
+    rng = np.random.default_rng(0)
+    store = ModelStore(3, capacity=2)
+    expected = {}
+    for step in range(3000):
+        user = f"user{rng.integers(0, 800)}"
+        if rng.random() < 0.2:
+            store.remove(user)
+            expected.pop(user, None)
+        else:
+            store.put(user, np.full(3, 0.01), np.full(3, float(step)), 3.0)
+            expected[user] = float(step)
+    assert len(store) == len(expected)
+    for user, step in expected.items():
+        assert store.get(user)[1][0] == np.float32(step)
+    assert "nobody" not in store
+    assert store.rows(["nobody", user]).tolist() == [-1, store.row(user)]
+
+    with pytest.raises(ValueError):
+        ModelStore.from_arrays(["a", "a"], np.ones((2, 3)), np.ones((2, 3)), [1.0, 1.0])
+
+
+def test_follows_model_writes_in_place():
+    db = DBManager(backend=SQLiteBackend(":memory:"))
+    users = [db.register_user(f"user{u}")["id"] for u in range(4)]
+    for u, user_id in enumerate(users[:3]):
+        db.save_model(user_id, np.full(5, 0.02), np.full(5, 0.1 * u), 5.0)
+    # Whitening-matrix models don't fit a row
+    db.save_model(users[3], np.eye(5), np.zeros(5), 5.0)
+
+    store = ModelStore.from_db(db, page_size=2)
+    db.add_model_listener(store.update)
+    assert len(store) == 3 and users[3] not in store
+
+    row = store.row(users[1])
+    db.update_mean_vector(users[1], np.full(5, 0.5))
+    db.save_model(users[2], np.full(5, 0.03), np.full(5, 0.2), 6.0)
+    assert store.row(users[1]) == row
+    assert np.array_equal(store.get(users[1])[1], np.full(5, 0.5, dtype=np.float32))
+    std, mean, threshold = store.get(users[2])
+    assert np.allclose(std, 0.03) and threshold == 6.0
+    assert store.get_model(users[0])["mean_vector"].dtype == np.float32
+
+    db.save_model(users[0], np.eye(5), np.zeros(5), 5.0)
+    assert users[0] not in store and len(store) == 2
+
+
+def test_snapshot_is_shared_through_the_mapping(tmp_path):
+    rng = np.random.default_rng(1)
+    ids = [f"user{u}" for u in range(1000)]
+    store = ModelStore.from_arrays(ids, rng.random((1000, 4)) + 0.1, rng.random((1000, 4)), 4.0)
+    path = str(tmp_path / "models.snapshot")
+    store.save(path)
+    store.save(path)  # replaces the old snapshot
+
+    writer = ModelStore.load(path, mode="r+")
+    reader = ModelStore.load(path)
+    assert isinstance(reader.means, np.memmap) and len(reader) == 1000
+    assert np.array_equal(reader.get("user7")[1], store.get("user7")[1])
+
+    # In-place updates write through to every mapping
+    writer.put("user7", np.ones(4), np.zeros(4), 9.0)
+    writer.means.flush()
+    assert reader.get("user7")[2] == 9.0 and not reader.get("user7")[1].any()
+    # A read-only mapping moves into memory on its first write
+    reader.put("user8", np.ones(4), np.zeros(4), 9.0)
+    assert reader.path is None and reader.get("user8")[2] == 9.0
+    assert ModelStore.load(path).get("user8")[2] == 4.0
+
+    # A new user moves the store into memory; the snapshot is left as it was
+    writer.put("newcomer", np.ones(4), np.ones(4), 1.0)
+    assert writer.path is None and "newcomer" in writer and len(writer) == 1001
+    assert "newcomer" not in ModelStore.load(path)
+
+
+def test_read_only_snapshot_follows_model_writes(tmp_path):
+    db = DBManager(backend=SQLiteBackend(":memory:"))
+    users = [db.register_user(f"user{u}")["id"] for u in range(3)]
+    for user_id in users[:2]:
+        db.save_model(user_id, np.full(5, 0.02), np.full(5, 0.1), 5.0)
+    path = str(tmp_path / "models.snapshot")
+    ModelStore.from_db(db).save(path)
+
+    store = ModelStore.load(path)
+    db.add_model_listener(store.update)
+    db.update_mean_vector(users[0], np.full(5, 0.5))
+    db.save_model(users[1], np.full(5, 0.03), np.full(5, 0.2), 6.0)
+    db.save_model(users[2], np.full(5, 0.04), np.full(5, 0.3), 7.0)
+    assert np.allclose(store.get(users[0])[1], 0.5)
+    assert store.get(users[1])[2] == 6.0 and store.get(users[2])[2] == 7.0
+    assert ModelStore.load(path).get(users[1])[2] == 5.0
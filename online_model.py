@@ -0,0 +1,145 @@
+import numpy as np
+
+from model_codec import encode_array_text, decode_array_text
+
+# Minimum std as a fraction of the mean (same floor as train_model)
+MIN_STD_RATIO = 0.10
+# Threshold = mean self-distance + THRESHOLD_SIGMAS * its std (as train_model)
+THRESHOLD_SIGMAS = 6.0
+# After this many samples the running averages become exponentially
+# weighted with window MAX_COUNT, so the model follows slow drift in typing
+MAX_COUNT = 200
+
+# Header of the packed form: count, max_count, score_count, score_mean, score_m2
+_HEADER = 5
+
+
+def _running_update(count, mean, m2, x, max_count):
+    """
+    One Welford step for (mean, M2) over the last min(count, max_count) samples.
+
+    With weight w = 1/n this is exact Welford; once n is capped at
+    max_count the same update is an exponentially weighted mean/variance.
+    Works on scalars and arrays alike. Returns (mean, m2).
+    """
+    n_old = min(count, max_count)
+    n = min(count + 1, max_count)
+    w = 1.0 / n
+    delta = x - mean
+    mean = mean + w * delta
+    var = m2 / n_old if n_old else 0.0 * m2
+    var = (1.0 - w) * (var + w * delta * delta)
+    return mean, var * n
+
+
+class OnlineModelState:
+    """
+    Running statistics of a user's accepted attempts.
+
+    Holds count, mean and M2 per feature (Welford) plus the same for the
+    model's own distance scores, which drive the threshold. update() is
+    O(D) with constant memory, so the model keeps improving over any number
+    of logins without keeping samples or retraining.
+    """
+
+    def __init__(self, mean, m2, count, score_mean=0.0, score_m2=0.0, score_count=0,
+                 max_count=MAX_COUNT):
+        self.mean = np.array(mean, dtype=float)
+        self.m2 = np.array(m2, dtype=float)
+        self.count = int(count)
+        self.score_mean = float(score_mean)
+        self.score_m2 = float(score_m2)
+        self.score_count = int(score_count)
+        self.max_count = int(max_count)
+
+    @classmethod
+    def from_samples(cls, clean_X, max_count=MAX_COUNT):
+        """State equal to what train_model computes from the same clean samples."""
+        X = np.asarray(clean_X, dtype=float)
+        mean = X.mean(axis=0)
+        m2 = ((X - mean) ** 2).sum(axis=0)
+        state = cls(mean, m2, len(X), max_count=max_count)
+
+        # Self-distances of the enrollment samples
+        scores = np.sum(np.abs(X - mean) / state.std(), axis=1)
+        state.score_count = len(scores)
+        state.score_mean = float(scores.mean())
+        state.score_m2 = float(((scores - state.score_mean) ** 2).sum())
+        return state
+
+    @classmethod
+    def from_samples_batch(cls, clean_X, max_count=MAX_COUNT):
+        """from_samples for a (G, n, F) block of users with n samples each."""
+        X = np.asarray(clean_X, dtype=float)
+        n = X.shape[1]
+        means = X.mean(axis=1)
+        m2s = ((X - means[:, None, :]) ** 2).sum(axis=1)
+        stds = np.maximum(np.sqrt(m2s / min(n, max_count)), means * MIN_STD_RATIO)
+
+        scores = np.sum(np.abs(X - means[:, None, :]) / stds[:, None, :], axis=2)
+        score_means = scores.mean(axis=1)
+        score_m2s = ((scores - score_means[:, None]) ** 2).sum(axis=1)
+        return [cls(mean, m2, n, score_mean, score_m2, n, max_count)
+                for mean, m2, score_mean, score_m2 in zip(means, m2s, score_means, score_m2s)]
+
+    @classmethod
+    def from_model(cls, std_vector, mean_vector, threshold, count=10, max_count=MAX_COUNT):
+        """
+        Seeds a state for a model trained before online updates existed.
+        The score statistics are set so threshold() starts at the stored
+        value: the mean is what a genuine login scores (about 1 per feature)
+        and the spread makes up the rest, so the first updates move the
+        threshold only a little.
+        """
+        std = np.asarray(std_vector, dtype=float)
+        score_mean = min(float(len(std)), threshold)
+        score_std = (threshold - score_mean) / THRESHOLD_SIGMAS
+        return cls(mean_vector, std * std * count, count,
+                   score_mean=score_mean, score_m2=score_std * score_std * count,
+                   score_count=count, max_count=max_count)
+
+    def copy(self):
+        return OnlineModelState(self.mean, self.m2, self.count, self.score_mean,
+                                self.score_m2, self.score_count, self.max_count)
+
+    def std(self):
+        n = min(self.count, self.max_count)
+        std = np.sqrt(self.m2 / n) if n else np.zeros_like(self.mean)
+        return np.maximum(std, self.mean * MIN_STD_RATIO)
+
+    def threshold(self):
+        n = min(self.score_count, self.max_count)
+        score_std = np.sqrt(self.score_m2 / n) if n else 0.0
+        return max(self.score_mean + THRESHOLD_SIGMAS * score_std, len(self.mean))
+
+    def model(self):
+        """(std_vector, mean_vector, threshold), as train_model returns them."""
+        return self.std(), self.mean.copy(), self.threshold()
+
+    def update(self, x):
+        """Folds one accepted attempt into the state. O(D), in place."""
+        x = np.asarray(x, dtype=float)
+        # Scored against the model before the update, like a login would be
+        score = float(np.sum(np.abs(x - self.mean) / self.std()))
+
+        self.mean, self.m2 = _running_update(self.count, self.mean, self.m2, x, self.max_count)
+        self.count += 1
+        self.score_mean, self.score_m2 = _running_update(
+            self.score_count, self.score_mean, self.score_m2, score, self.max_count)
+        self.score_count += 1
+        return self
+
+    def encode(self):
+        """Text for the biometrics.online_state column."""
+        header = [self.count, self.max_count, self.score_count, self.score_mean, self.score_m2]
+        return encode_array_text(np.concatenate([header, self.mean, self.m2]))
+
+    @classmethod
+    def decode(cls, text):
+        packed = decode_array_text(text)
+        d = (len(packed) - _HEADER) // 2
+        if d < 1 or len(packed) != _HEADER + 2 * d:
+            raise ValueError(f"Bad online state of length {len(packed)}")
+        count, max_count, score_count, score_mean, score_m2 = packed[:_HEADER]
+        return cls(packed[_HEADER:_HEADER + d], packed[_HEADER + d:], count,
+                   score_mean, score_m2, score_count, max_count)
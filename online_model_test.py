@@ -0,0 +1,97 @@
+import numpy as np
+
+from biometrics import BiometricsEngine
+from db_manager import DBManager
+from db_manager_test import FakeSupabase
+from online_model import OnlineModelState
+from storage import SQLiteBackend
+
+
+def make_samples(n, d=85, seed=0):
+    rng = np.random.default_rng(seed)
+    center = rng.uniform(0.05, 0.3, size=d)
+    return center * (1 + 0.2 * rng.normal(size=(n, d)))
+
+
+def test_enrollment_state_matches_train_model():
+    bio = BiometricsEngine()
+    X = make_samples(10)
+
+    state = bio.train_online_model(X)
+    for ours, theirs in zip(state.model(), bio.train_model(X)):
+        assert np.allclose(ours, theirs, rtol=1e-12)
+
+
+def test_updates_are_welford_then_exponential():
+    X = make_samples(300, d=6, seed=1)
+    state = OnlineModelState.from_samples(X[:5], max_count=50)
+    for x in X[5:50]:
+        state.update(x)
+
+    # Exact running mean/std over every sample so far
+    assert state.count == 50
+    assert np.allclose(state.mean, X[:50].mean(axis=0))
+    assert np.allclose(state.std(), np.maximum(X[:50].std(axis=0), state.mean * 0.1))
+
+    # Past max_count it forgets: the mean follows a shift in typing speed
+    for x in X[50:] * 1.5:
+        state.update(x)
+    assert state.count == 300
+    assert np.allclose(state.mean, 1.5 * X.mean(axis=0), rtol=0.1)
+    assert state.threshold() >= 6
+
+
+def test_online_state_round_trips_through_storage():
+    bio = BiometricsEngine()
+    X = make_samples(12, seed=2)
+    for db in (DBManager(client=FakeSupabase()), DBManager(backend=SQLiteBackend(":memory:"))):
+        user = db.register_user("dana")
+        state = bio.train_online_model(X[:10])
+        db.save_model(user["id"], *state.model(), state)
+
+        db.cache.clear()
+        model = db.get_model(user["id"])
+        new_state = bio.adapt_online_model(model, X[10])
+        # The loaded model is untouched until the update is stored
+        assert model["online_state"].count == 8
+        db.update_online_model(user["id"], new_state)
+
+        db.cache.clear()
+        model = db.get_model(user["id"])
+        assert model["online_state"].count == 9
+        for ours, theirs in zip(new_state.model(), (model["transform_matrix"],
+                                                    model["mean_vector"], model["threshold"])):
+            assert np.array_equal(ours, theirs)
+
+
+def test_models_without_state_are_seeded():
+    bio = BiometricsEngine()
+    X = make_samples(11, seed=3)
+    std, mean, threshold = bio.train_model(X[:10])
+
+    state = bio.adapt_online_model(
+        {"transform_matrix": std, "mean_vector": mean, "threshold": threshold}, X[10])
+    assert state.count == 11
+    assert np.all(state.std() >= 0.1 * state.mean)
+    assert state.threshold() >= len(mean)
+    # Seeded to reproduce the stored threshold, which an accepted login barely moves
+    assert np.isclose(OnlineModelState.from_model(std, mean, threshold).threshold(), threshold)
+    X = make_samples(40, seed=0)
+    std, mean, threshold = bio.train_model(X[:10])
+    changes = [abs(OnlineModelState.from_model(std, mean, threshold).update(x).threshold() / threshold - 1)
+               for x in X[10:] if bio.authenticate(x, mean, std, threshold)[0]]
+    assert len(changes) >= 20 and np.median(changes) <= 0.05
+
+
+def test_batch_states_match_per_user_states():
+    bio = BiometricsEngine()
+    X = np.stack([make_samples(10, seed=s) for s in range(6)])
+    counts = np.array([10, 9, 10, 7, 0, 10])
+
+    states = bio.train_online_models_batch(X, counts)
+    assert states[4] is None
+    for u in (0, 1, 3, 5):
+        expected = bio.train_online_model(X[u, :counts[u]])
+        assert np.array_equal(states[u].mean, expected.mean)
+        assert np.array_equal(states[u].m2, expected.m2)
+        assert states[u].threshold() == expected.threshold()
@@ -0,0 +1,213 @@
+import numpy as np
+
+from biometrics import BACKSPACE_CODE, EVENT_DOWN, EVENT_UP, MAX_PAUSE, encode_char
+
+PASSPHRASE = "The quick brown fox jumps over the lazy dog"
+
+
+class TypistPopulation:
+    """
+    Synthetic users typing a phrase, generated a whole population at a time.
+
+    Every user gets a profile: base dwell and flight speed, per-key dwell
+    and per-digraph flight effects (shared population effects plus the
+    user's own), a consistency level and rollover habits on some digraphs. Sessions add
+    per-session speed and per-keystroke noise on top, and some are spoiled
+    by a long pause or a backspace, which extract_features rejects.
+
+    Sessions come out either as packed event arrays (pack_key_events
+    layout) or as feature matrices ([dwells..., flights...] with NaN rows
+    for rejected sessions, like extract_features_batch). Everything is
+    seeded: the same seed gives the same profiles, and iter_chunks gives
+    the same sessions for the same chunk_size.
+    """
+
+    def __init__(self, n_users, phrase=PASSPHRASE, seed=0,
+                 dwell_mean=0.10, flight_mean=0.15, speed_spread=0.25,
+                 key_spread=0.15, digraph_spread=0.25, user_effect_spread=0.10,
+                 noise_range=(0.04, 0.15), rollover_rate=0.10,
+                 pause_rate=0.01, backspace_rate=0.02):
+        self.n_users = n_users
+        self.phrase = phrase
+        self.n_keys = len(phrase)
+        self.n_features = 2 * self.n_keys - 1
+        self.seed = seed
+        self.pause_rate = pause_rate
+        self.backspace_rate = backspace_rate
+        self.char_codes = np.array([encode_char(c) for c in phrase], dtype=np.int32)
+
+        rng = np.random.default_rng([seed, 0])
+        L = self.n_keys
+
+        # Per-key and per-digraph effects are tied to the character, not
+        # the position, so a repeated key or digraph behaves the same
+        keys, key_index = np.unique(list(phrase), return_inverse=True)
+        digraphs, digraph_index = np.unique(
+            [phrase[i:i + 2] for i in range(L - 1)], return_inverse=True)
+        key_effect = rng.normal(0, key_spread, size=len(keys))
+        digraph_effect = rng.normal(0, digraph_spread, size=len(digraphs))
+        user_key = rng.normal(0, user_effect_spread, size=(n_users, len(keys)))
+        user_digraph = rng.normal(0, user_effect_spread, size=(n_users, len(digraphs)))
+
+        # Log-space means of each keystroke's dwell and flight, per user
+        base_dwell = np.log(dwell_mean) + rng.normal(0, speed_spread, size=(n_users, 1))
+        base_flight = np.log(flight_mean) + rng.normal(0, speed_spread, size=(n_users, 1))
+        self.log_dwell = base_dwell + key_effect[key_index] + user_key[:, key_index]
+        self.log_flight = base_flight + digraph_effect[digraph_index] + user_digraph[:, digraph_index]
+
+        self.noise = rng.uniform(*noise_range, size=n_users)
+        # Rollover is a habit on particular digraphs: a user rolls over
+        # a habitual digraph most of the time and others only rarely
+        habitual = rng.random((n_users, len(digraphs))) < rollover_rate
+        self.rollover = np.where(habitual, 0.85, 0.02 * (rollover_rate > 0))[:, digraph_index]
+
+        # A key cannot roll over into a second press of itself
+        self.rollover_allowed = self.char_codes[:-1] != self.char_codes[1:]
+
+    # --- Sessions ---
+    def _timings(self, users, rng):
+        """
+        Down/Up times (n, L) for one session per entry of users, plus the
+        keystroke after which a backspace was typed (-1 for none).
+        """
+        n, L = len(users), self.n_keys
+        noise = self.noise[users, None]
+        speed = rng.normal(0, 0.05, size=(n, 1))
+
+        dwell = noise * rng.standard_normal((n, L))
+        dwell += self.log_dwell[users] + speed
+        np.exp(dwell, out=dwell)
+        flight = noise * rng.standard_normal((n, L - 1))
+        flight += self.log_flight[users] + speed
+        np.exp(flight, out=flight)
+
+        # Rollover: the next key goes down before this one comes up
+        # Only one key overlaps at a time (no rollover straight after a
+        # rollover, overlap shorter than both dwells), so each Up still
+        # pairs with its own Down
+        rolled = (rng.random((n, L - 1)) < self.rollover[users]) & self.rollover_allowed
+        rolled[:, 1:] &= ~rolled[:, :-1]
+        r, k = np.nonzero(rolled)
+        flight[r, k] = -rng.uniform(0.1, 0.7, size=len(r)) * np.minimum(dwell[r, k], dwell[r, k + 1])
+
+        # Long pauses somewhere in the phrase
+        paused = np.flatnonzero(rng.random(n) < self.pause_rate)
+        if len(paused):
+            where = rng.integers(0, L - 1, size=len(paused))
+            flight[paused, where] += rng.uniform(MAX_PAUSE + 0.5, 6.0, size=len(paused))
+
+        downs = np.zeros((n, L))
+        np.cumsum(dwell[:, :-1] + flight, axis=1, out=downs[:, 1:])
+        ups = downs + dwell
+
+        backspace = np.full(n, -1)
+        corrected = np.flatnonzero(rng.random(n) < self.backspace_rate)
+        backspace[corrected] = rng.integers(0, L, size=len(corrected))
+        return downs, ups, backspace
+
+    def _users(self, users):
+        return np.asarray(users, dtype=np.int64)
+
+    def features(self, users, rng=None):
+        """
+        Feature matrix (n, 2L-1) and valid mask for one session per entry
+        of users (user indices; repeat an index for several sessions).
+        Equal to extract_features_batch on the packed() form of the same
+        sessions.
+        """
+        users = self._users(users)
+        rng = rng if rng is not None else np.random.default_rng([self.seed, 1])
+        downs, ups, backspace = self._timings(users, rng)
+        return self._features_from(downs, ups, backspace)
+
+    def _features_from(self, downs, ups, backspace):
+        L = self.n_keys
+        X = np.empty((len(downs), self.n_features))
+        np.subtract(ups, downs, out=X[:, :L])
+        np.subtract(downs[:, 1:], ups[:, :-1], out=X[:, L:])
+
+        valid = (backspace < 0) & ~np.any(X[:, L:] > MAX_PAUSE, axis=1)
+        X[~valid] = np.nan
+        return X, valid
+
+    def packed(self, users, rng=None):
+        """
+        Packed event arrays (char_codes, event_types, timestamps, offsets)
+        for one session per entry of users, events in time order.
+        """
+        users = self._users(users)
+        rng = rng if rng is not None else np.random.default_rng([self.seed, 1])
+        downs, ups, backspace = self._timings(users, rng)
+        return self._packed_from(downs, ups, backspace)
+
+    def _packed_from(self, downs, ups, backspace):
+        n, L = downs.shape
+        width = 2 * L + 2  # every keystroke's Down and Up, plus a backspace slot
+
+        times = np.empty((n, width))
+        times[:, 0:2 * L:2] = downs
+        times[:, 1:2 * L:2] = ups
+        codes = np.empty((n, width), dtype=np.int32)
+        codes[:, 0:2 * L:2] = self.char_codes
+        codes[:, 1:2 * L:2] = self.char_codes
+        codes[:, 2 * L:] = BACKSPACE_CODE
+        types = np.tile(np.array([EVENT_DOWN, EVENT_UP], dtype=np.int8), L + 1)
+
+        # Backspace tapped right after the corrected keystroke's release
+        has_bs = backspace >= 0
+        after = ups[np.arange(n), np.maximum(backspace, 0)]
+        times[:, 2 * L] = np.where(has_bs, after + 0.001, np.inf)
+        times[:, 2 * L + 1] = np.where(has_bs, after + 0.002, np.inf)
+
+        # Time order within each session; unused slots (inf) sort last
+        order = np.argsort(times, axis=1, kind="stable")
+        rows = np.arange(n)[:, None]
+        times, codes = times[rows, order], codes[rows, order]
+        types = types[order]
+
+        lengths = np.where(has_bs, width, 2 * L)
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        keep = np.arange(width) < lengths[:, None]
+        return codes[keep], types[keep], times[keep], offsets
+
+    def iter_chunks(self, sessions_per_user, chunk_size=65536, output="features", users=None):
+        """
+        Streams sessions_per_user sessions for every user (or the given
+        user indices) in chunks of about chunk_size sessions, so memory
+        stays bounded however large the population.
+
+        Yields (session_users, X, valid) for output="features" or
+        (session_users, char_codes, event_types, timestamps, offsets) for
+        output="packed". session_users[i] is the user who typed session i.
+        """
+        if output not in ("features", "packed"):
+            raise ValueError(f"output must be 'features' or 'packed', not {output!r}")
+        users = np.arange(self.n_users) if users is None else self._users(users)
+        per_chunk = max(1, chunk_size // sessions_per_user)
+
+        for chunk, start in enumerate(range(0, len(users), per_chunk)):
+            session_users = np.repeat(users[start:start + per_chunk], sessions_per_user)
+            rng = np.random.default_rng([self.seed, 2, chunk])
+            timings = self._timings(session_users, rng)
+            if output == "features":
+                yield (session_users, *self._features_from(*timings))
+            else:
+                yield (session_users, *self._packed_from(*timings))
+
+
+def unpack_sessions(char_codes, event_types, timestamps, offsets, phrase=PASSPHRASE):
+    """
+    Packed arrays back to extract_features input [(char, 'down'/'up', t), ...].
+    Characters are recovered from phrase; slow, meant for spot checks.
+    """
+    chars = {encode_char(c): c for c in phrase}
+    chars[BACKSPACE_CODE] = "Key.backspace"
+    sessions = []
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        sessions.append([
+            (chars[c], 'down' if e == EVENT_DOWN else 'up', t)
+            for c, e, t in zip(char_codes[start:end].tolist(), event_types[start:end].tolist(),
+                               timestamps[start:end].tolist())
+        ])
+    return sessions
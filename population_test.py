@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from biometrics import BiometricsEngine
+from population import TypistPopulation, unpack_sessions
+
+
+def test_features_match_the_extractors():
+    bio = BiometricsEngine()
+    pop = TypistPopulation(50, seed=1, rollover_rate=0.3, pause_rate=0.05, backspace_rate=0.05)
+    users = np.repeat(np.arange(50), 20)
+
+    X, valid = pop.features(users)
+    packed = pop.packed(users)
+    assert 0.8 < valid.mean() < 0.95
+    assert np.any(X[valid][:, pop.n_keys:] < 0)  # rollover happened
+
+    X_batch, valid_batch = bio.extract_features_batch(*packed, n_keys=pop.n_keys)
+    assert np.array_equal(valid, valid_batch)
+    assert np.array_equal(X, X_batch, equal_nan=True)
+
+    sessions = unpack_sessions(*packed)
+    for i in range(0, len(sessions), 37):
+        feats = bio.extract_features(sessions[i])
+        if valid[i]:
+            assert np.array_equal(feats, X[i])
+        else:
+            assert feats is None
+
+
+def test_seeded_and_chunked():
+    pop = TypistPopulation(30, seed=7)
+    chunks = list(pop.iter_chunks(4, chunk_size=40))
+    assert [len(c[0]) for c in chunks] == [40, 40, 40]
+    again = list(TypistPopulation(30, seed=7).iter_chunks(4, chunk_size=40))
+    for a, b in zip(chunks, again):
+        assert np.array_equal(a[1], b[1], equal_nan=True)
+
+    users = np.concatenate([c[0] for c in chunks])
+    assert np.array_equal(users, np.repeat(np.arange(30), 4))
+
+    packed = list(pop.iter_chunks(4, chunk_size=40, output="packed"))
+    assert packed[0][4][-1] == len(packed[0][1])
+
+    with pytest.raises(ValueError):
+        next(pop.iter_chunks(4, output="lists"))
+
+
+def test_users_are_distinguishable():
+    bio = BiometricsEngine()
+    pop = TypistPopulation(20, seed=3, pause_rate=0, backspace_rate=0)
+    X, _ = pop.features(np.repeat(np.arange(20), 11))
+    X = X.reshape(20, 11, -1)
+
+    genuine, impostor = [], []
+    for u in range(20):
+        std, mean, threshold = bio.train_model(X[u, :10])
+        genuine.append(bio.authenticate(X[u, 10], mean, std, threshold)[0])
+        impostor.append(bio.authenticate(X[(u + 1) % 20, 10], mean, std, threshold)[0])
+    assert np.mean(genuine) > 0.6 and np.mean(impostor) < 0.2
@@ -0,0 +1,171 @@
+"""
+Replay detection: flags a verification attempt that nearly repeats one of
+the user's recent accepted attempts.
+
+    guard = ReplayGuard()
+    guard.load(user_id, db.get_recent_attempts(user_id))
+    if accepted and guard.is_replay(user_id, x):
+        accepted = False                      # don't accept it, don't learn from it
+    elif accepted:
+        guard.record(user_id, x)
+        db.save_recent_attempts(user_id, guard.history(user_id))
+
+No two genuine attempts are that close: each flight and dwell time
+varies by 10-30 ms between attempts, so a new attempt within a few
+milliseconds of an old one on every feature is a captured event stream
+played back (replay tools add only timer jitter).
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Accepted attempts remembered per user (oldest evicted first)
+HISTORY_SIZE = 32
+# A repeat is within this many seconds of an old attempt on every feature
+TOLERANCE = 0.005
+# LSH: N_TABLES tables, each keyed by N_HASHES quantized random projections
+N_TABLES = 8
+N_HASHES = 4
+BUCKET_WIDTH = 0.25
+
+
+class _History:
+    """One user's recent attempts in a ring buffer, each filed in every LSH table."""
+
+    def __init__(self, capacity, n_features):
+        # float32, as stored: a history read back compares equal to this one
+        self.vectors = np.empty((capacity, n_features), dtype=np.float32)
+        self.keys = [None] * capacity
+        self.tables = [{} for _ in range(N_TABLES)]
+        self.n = 0
+        self.next = 0
+
+    def add(self, x, keys):
+        slot = self.next
+        if self.keys[slot] is not None:
+            # Evict the oldest attempt from its buckets
+            for table, key in zip(self.tables, self.keys[slot]):
+                bucket = table[key]
+                bucket.discard(slot)
+                if not bucket:
+                    del table[key]
+        self.vectors[slot] = x
+        self.keys[slot] = keys
+        for table, key in zip(self.tables, keys):
+            table.setdefault(key, set()).add(slot)
+        self.next = (slot + 1) % len(self.keys)
+        self.n = min(self.n + 1, len(self.keys))
+
+    def candidates(self, keys):
+        """Slots sharing a bucket with keys in any table."""
+        found = set()
+        for table, key in zip(self.tables, keys):
+            found.update(table.get(key, ()))
+        return found
+
+    def ordered(self):
+        """The stored attempts, oldest first."""
+        if self.n < len(self.keys):
+            return self.vectors[:self.n].copy()
+        return np.concatenate([self.vectors[self.next:], self.vectors[:self.next]])
+
+
+class ReplayGuard:
+    """
+    Per-user index of recent accepted feature vectors.
+
+    Each vector is hashed into N_TABLES buckets by E2LSH: N_HASHES
+    projections onto random directions, offset and quantized to
+    BUCKET_WIDTH. Vectors a few milliseconds apart land in the same
+    bucket of some table with probability ~0.999, so a lookup only
+    compares the new attempt with the few attempts in its buckets,
+    never with the whole history. A candidate counts as a repeat
+    when it is within TOLERANCE on every feature.
+
+    Histories are bounded to capacity attempts per user and max_users
+    users (least recently used evicted). They are plain matrices for
+    the data layer (DBManager.get/save_recent_attempts), and hashing is
+    seeded, so any process rebuilds the same index from them.
+    """
+
+    def __init__(self, capacity=HISTORY_SIZE, tolerance=TOLERANCE, max_users=4096, seed=0):
+        self.capacity = capacity
+        self.tolerance = tolerance
+        self.max_users = max_users
+        self.seed = seed
+        self.users = OrderedDict()
+        self.projections = {}  # n_features -> (directions, offsets)
+        self.lock = threading.Lock()
+
+    def __contains__(self, user_id):
+        return user_id in self.users
+
+    def _keys(self, X):
+        """LSH keys (one per table) of each row of X, or of a single vector X."""
+        n_features = X.shape[-1]
+        if n_features not in self.projections:
+            rng = np.random.default_rng([self.seed, n_features])
+            self.projections[n_features] = (
+                rng.standard_normal((N_TABLES * N_HASHES, n_features)),
+                rng.uniform(0, BUCKET_WIDTH, size=N_TABLES * N_HASHES),
+            )
+        directions, offsets = self.projections[n_features]
+        q = np.floor((X @ directions.T + offsets) / BUCKET_WIDTH).astype(np.int64)
+        if q.ndim == 1:
+            return [row.tobytes() for row in q.reshape(N_TABLES, N_HASHES)]
+        return [[row.tobytes() for row in r.reshape(N_TABLES, N_HASHES)] for r in q]
+
+    def _history(self, user_id, n_features):
+        history = self.users.get(user_id)
+        if history is None or history.vectors.shape[1] != n_features:
+            history = _History(self.capacity, n_features)
+            self.users[user_id] = history
+            if len(self.users) > self.max_users:
+                self.users.popitem(last=False)
+        self.users.move_to_end(user_id)
+        return history
+
+    def load(self, user_id, vectors):
+        """
+        Replaces user_id's history with vectors (oldest first, as history()
+        returns them); None or empty clears it. Loading the history already
+        held is a no-op.
+        """
+        with self.lock:
+            if vectors is None or len(vectors) == 0:
+                self.users.pop(user_id, None)
+                return
+            vectors = np.asarray(vectors, dtype=np.float32)[-self.capacity:]
+            current = self.users.get(user_id)
+            if current is not None and np.array_equal(current.ordered(), vectors):
+                return
+            self.users.pop(user_id, None)
+            history = self._history(user_id, vectors.shape[1])
+            for x, keys in zip(vectors, self._keys(vectors.astype(float))):
+                history.add(x, keys)
+
+    def is_replay(self, user_id, x):
+        """True if x is within tolerance of one of user_id's recorded attempts."""
+        x = np.asarray(x, dtype=float)
+        with self.lock:
+            history = self.users.get(user_id)
+            if history is None or history.vectors.shape[1] != len(x):
+                return False
+            slots = history.candidates(self._keys(x))
+            if not slots:
+                return False
+            candidates = history.vectors[list(slots)]
+        return bool(np.any(np.max(np.abs(candidates - x), axis=1) <= self.tolerance))
+
+    def record(self, user_id, x):
+        """Adds an accepted attempt to user_id's history (evicting the oldest when full)."""
+        x = np.asarray(x, dtype=np.float32)
+        with self.lock:
+            self._history(user_id, len(x)).add(x, self._keys(x.astype(float)))
+
+    def history(self, user_id):
+        """user_id's recorded attempts as an (n, n_features) matrix, oldest first, or None."""
+        with self.lock:
+            history = self.users.get(user_id)
+            return history.ordered() if history is not None else None
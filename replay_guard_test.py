@@ -0,0 +1,65 @@
+import numpy as np
+
+from db_manager import DBManager
+from population import TypistPopulation
+from replay_guard import ReplayGuard
+from storage import SQLiteBackend
+
+
+def test_flags_replays_but_not_fresh_attempts():
+    pop = TypistPopulation(50, seed=1, pause_rate=0, backspace_rate=0)
+    rng = np.random.default_rng(0)
+    guard = ReplayGuard(capacity=16)
+    recorded, _ = pop.features(np.repeat(np.arange(50), 16), rng)
+    for i, x in enumerate(recorded):
+        guard.record(i // 16, x)
+
+    fresh, _ = pop.features(np.repeat(np.arange(50), 10), rng)
+    assert not any(guard.is_replay(i // 10, x) for i, x in enumerate(fresh))
+    # Played back with up to 2 ms of timer jitter on every event
+    jitter = rng.uniform(-0.004, 0.004, size=recorded.shape)
+    assert all(guard.is_replay(i // 16, x) for i, x in enumerate(recorded + jitter))
+    # Only against the same user's history
+    assert not guard.is_replay(1, recorded[0])
+
+
+def test_history_is_bounded_and_evicts_oldest():
+    rng = np.random.default_rng(2)
+    X = rng.uniform(0.05, 0.3, size=(12, 9))
+    guard = ReplayGuard(capacity=8, max_users=2)
+    for x in X:
+        guard.record("alice", x)
+    assert np.allclose(guard.history("alice"), X[4:])
+    assert not guard.is_replay("alice", X[3]) and guard.is_replay("alice", X[4])
+    table_sizes = [sum(len(bucket) for bucket in table.values()) for table in guard.users["alice"].tables]
+    assert table_sizes == [8] * len(table_sizes)
+
+    guard.record("bob", X[0])
+    guard.record("carol", X[0])
+    assert "alice" not in guard and guard.history("alice") is None
+
+
+def test_history_persists_through_the_data_layer():
+    rng = np.random.default_rng(3)
+    X = rng.uniform(0.05, 0.3, size=(5, 9))
+    for write_behind in (None, 60):
+        db = DBManager(backend=SQLiteBackend(":memory:"), write_behind=write_behind)
+        user_id = db.register_user("dana")["id"]
+        db.save_model(user_id, np.full(9, 0.02), X.mean(axis=0), 5.0)
+        assert db.get_recent_attempts(user_id) is None
+
+        guard = ReplayGuard()
+        for x in X:
+            guard.record(user_id, x)
+        db.save_recent_attempts(user_id, guard.history(user_id))
+        # Re-enrolling keeps the history
+        db.save_model(user_id, np.full(9, 0.02), X.mean(axis=0), 5.0)
+        db.flush()
+
+        # Another process rebuilds the same index from the stored rows
+        restarted = ReplayGuard()
+        restarted.load(user_id, db.get_recent_attempts(user_id))
+        assert np.array_equal(restarted.history(user_id), guard.history(user_id))
+        assert restarted.is_replay(user_id, X[2] + 0.001)
+        assert not restarted.is_replay(user_id, X[2] + 0.01)
+        db.close()
@@ -0,0 +1,157 @@
+"""
+Headless fleet-wide retraining.
+
+Pages every user's stored enrollment vectors out of the biometrics table,
+retrains them with the current BiometricsEngine in a process pool and
+writes the models back in bulk upserts. A checkpoint file records the
+last user written, so an interrupted run resumes where it stopped. Users
+whose model changed after their page was read (an adaptive update from a
+login) keep it; the next run retrains them.
+
+    STORAGE_BACKEND=sqlite SQLITE_PATH=bioauth.db python retrain.py --checkpoint retrain.json
+"""
+import argparse
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import numpy as np
+
+from biometrics import BiometricsEngine
+from db_manager import DBManager, model_to_row
+from model_codec import decode_array_text
+
+
+def retrain_page(rows):
+    """
+    Retrains one page of {user_id, training_samples} rows.
+    Runs in a worker process; returns model rows for bulk upsert.
+    """
+    bio = BiometricsEngine()
+    samples = [decode_array_text(r["training_samples"]) for r in rows]
+
+    # One padded (users, samples, features) block per feature width
+    results = []
+    by_width = {}
+    for row, X in zip(rows, samples):
+        by_width.setdefault(X.shape[1], []).append((row["user_id"], X))
+    for width, users in by_width.items():
+        counts = np.array([len(X) for _, X in users])
+        block = np.zeros((len(users), counts.max(), width))
+        for i, (_, X) in enumerate(users):
+            block[i, :len(X)] = X
+
+        states = bio.train_online_models_batch(block, counts)
+        for (user_id, _), state in zip(users, states):
+            std_vector, mean_vector, threshold = state.model()
+            results.append(model_to_row(user_id, std_vector, mean_vector, threshold, state))
+    return results
+
+
+def load_checkpoint(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {"after": None, "done": 0}
+
+
+def save_checkpoint(path, checkpoint):
+    # Write-then-rename, so a crash never leaves a torn checkpoint
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)
+
+
+def print_progress(done, elapsed):
+    print(f"[INFO] Retrained {done:,} users ({done / max(elapsed, 1e-9):,.0f}/s)")
+
+
+def retrain_all(db: DBManager, page_size=1000, workers=None, checkpoint_path=None,
+                progress=print_progress, max_pages=None):
+    """
+    Retrains every user with stored training samples. Returns the number
+    of users retrained (in total, including earlier runs resumed from
+    the checkpoint).
+
+    At most 2*workers pages are in flight, so memory stays bounded by
+    the page size however many users there are. Pages are written back
+    in the order they were read, and the checkpoint only advances past
+    a page once it is stored. workers=0 retrains in this process.
+    """
+    checkpoint = load_checkpoint(checkpoint_path)
+    done = checkpoint["done"]
+    start = time.perf_counter()
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    pool = ProcessPoolExecutor(workers) if workers > 0 else None
+    ahead = 2 * max(workers, 1)
+
+    def submit(page):
+        if pool is not None:
+            return pool.submit(retrain_page, page)
+        result = Future()
+        result.set_result(retrain_page(page))
+        return result
+
+    def finish(page, result):
+        nonlocal done
+        # A model updated since the read is newer than its retrained one
+        changed = db.changed_since(page)
+        if changed:
+            print(f"[INFO] Skipped {len(changed):,} users updated during the retrain")
+        db.save_models_bulk([r for r in result.result() if r["user_id"] not in changed])
+        done += len(page)
+        if checkpoint_path:
+            save_checkpoint(checkpoint_path, {"after": page[-1]["user_id"], "done": done})
+        if progress:
+            progress(done, time.perf_counter() - start)
+
+    in_flight = deque()
+    complete = True
+    try:
+        pages = db.iter_training_pages(page_size, after=checkpoint["after"])
+        for n, page in enumerate(pages):
+            if max_pages is not None and n >= max_pages:
+                complete = False
+                break
+            in_flight.append((page, submit(page)))
+            if len(in_flight) >= ahead:
+                finish(*in_flight.popleft())
+        while in_flight:
+            finish(*in_flight.popleft())
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    # A finished run starts over next time
+    if complete and checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return done
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+    from storage import create_backend
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: CPU count)")
+    parser.add_argument("--checkpoint", default="retrain_checkpoint.json")
+    args = parser.parse_args(argv)
+
+    backend = create_backend(
+        os.getenv("STORAGE_BACKEND", "supabase"), os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"),
+        sqlite_path=os.getenv("SQLITE_PATH", "bioauth.db"), sync_interval=None)
+    db = DBManager(backend=backend)
+    try:
+        total = retrain_all(db, args.page_size, args.workers, args.checkpoint)
+    finally:
+        db.close()
+    print(f"[INFO] Done: {total:,} users retrained")
+
+
+if __name__ == "__main__":
+    main()
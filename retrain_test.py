@@ -0,0 +1,96 @@
+import numpy as np
+
+from biometrics import BiometricsEngine
+from db_manager import DBManager
+from db_manager_test import FakeSupabase
+from population import TypistPopulation
+from retrain import load_checkpoint, retrain_all
+from storage import SQLiteBackend
+
+
+def enroll_users(db, n_users, n_samples=8):
+    """Users enrolled with a model that retraining should replace."""
+    pop = TypistPopulation(n_users, pause_rate=0, backspace_rate=0)
+    X, _ = pop.features(np.repeat(np.arange(n_users), n_samples))
+    X = X.reshape(n_users, n_samples, -1)
+    user_ids = []
+    for u in range(n_users):
+        user = db.register_user(f"user{u}")
+        db.save_model(user["id"], np.ones(X.shape[2]), np.zeros(X.shape[2]), 1.0,
+                      training_samples=X[u, :n_samples - u % 3])
+        user_ids.append(user["id"])
+    # A user from before training samples were stored is skipped
+    legacy = db.register_user("legacy")
+    db.save_model(legacy["id"], np.ones(X.shape[2]), np.zeros(X.shape[2]), 1.0)
+    return user_ids, X, legacy["id"]
+
+
+def check_retrained(db, user_ids, X, n_samples=8):
+    bio = BiometricsEngine()
+    db.cache.clear()
+    for u, user_id in enumerate(user_ids):
+        std, mean, threshold = bio.train_model(X[u, :n_samples - u % 3])
+        model = db.get_model(user_id)
+        assert np.allclose(model["transform_matrix"], std, rtol=1e-12)
+        assert np.allclose(model["mean_vector"], mean, rtol=1e-12)
+        assert np.isclose(model["threshold"], threshold, rtol=1e-12)
+        assert np.array_equal(model["online_state"].mean, model["mean_vector"])
+
+
+def test_retrain_resumes_from_checkpoint(tmp_path):
+    db = DBManager(backend=SQLiteBackend(str(tmp_path / "bio.db")))
+    user_ids, X, legacy = enroll_users(db, 25)
+    checkpoint = str(tmp_path / "retrain.json")
+    seen = []
+
+    # Interrupted after two pages of 4
+    done = retrain_all(db, page_size=4, workers=0, checkpoint_path=checkpoint,
+                       progress=lambda n, _: seen.append(n), max_pages=2)
+    assert done == 8 and seen == [4, 8]
+    assert load_checkpoint(checkpoint)["done"] == 8
+
+    # The next run continues after the last stored page, then resets
+    done = retrain_all(db, page_size=4, workers=0, checkpoint_path=checkpoint,
+                       progress=lambda n, _: seen.append(n))
+    assert done == 25 and seen[2:] == [12, 16, 20, 24, 25]
+    assert load_checkpoint(checkpoint) == {"after": None, "done": 0}
+
+    check_retrained(db, user_ids, X)
+    assert db.get_model(legacy)["threshold"] == 1.0
+    # Models changed, training samples kept
+    assert db.backend.fetch_row(user_ids[0])["training_samples"] is not None
+
+
+def test_retrain_in_process_pool_with_bulk_upserts():
+    client = FakeSupabase()
+    db = DBManager(client=client)
+    user_ids, X, _ = enroll_users(db, 12)
+
+    trips = client.round_trips
+    assert retrain_all(db, page_size=5, workers=2, progress=None) == 12
+    # Three pages read, checked for updates since and written in bulk
+    assert client.round_trips - trips == 9
+    check_retrained(db, user_ids, X)
+
+
+def test_retrain_keeps_models_updated_after_the_read():
+    db = DBManager(backend=SQLiteBackend(":memory:"))
+    user_ids, X, _ = enroll_users(db, 12)
+    state = BiometricsEngine().train_online_model(X[0])
+    pages = db.iter_training_pages
+
+    def racing_pages(page_size, after=None):
+        # A login adapts user 0's model once its page has been read
+        for page in pages(page_size, after):
+            yield page
+            if any(r["user_id"] == user_ids[0] for r in page):
+                db.update_online_model(user_ids[0], state.update(X[0, 0]))
+
+    db.iter_training_pages = racing_pages
+    assert retrain_all(db, page_size=4, workers=0, progress=None) == 12
+    db.cache.clear()
+    model = db.get_model(user_ids[0])
+    assert np.array_equal(model["mean_vector"], state.mean) and model["online_state"].count == state.count
+    bio = BiometricsEngine()
+    for u in range(1, 12):
+        assert np.isclose(db.get_model(user_ids[u])["threshold"], bio.train_model(X[u, :8 - u % 3])[2])
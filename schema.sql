@@ -9,9 +9,12 @@ create table users (
 create table biometrics (
   id uuid default gen_random_uuid() primary key,
   user_id uuid references users(id) not null,
-  transform_matrix json not null,
-  mean_vector json not null,
+  transform_matrix text not null, -- model_codec blob (base64), or legacy JSON list
+  mean_vector text not null,      -- model_codec blob (base64), or legacy JSON list
   threshold float not null,
+  online_state text,              -- OnlineModelState (model_codec blob), null for older models
+  training_samples text,          -- enrollment vectors (model_codec blob) for retrain.py
+  recent_attempts text,           -- recent accepted vectors (model_codec blob) for replay_guard.py
   created_at timestamp with time zone default timezone('utc'::text, now()) not null,
   unique(user_id)
 );
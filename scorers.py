@@ -0,0 +1,135 @@
+"""
+Distance scorers behind BiometricsEngine.authenticate.
+
+A scorer fits (transform_matrix, mean_vector, threshold) from cleaned
+enrollment vectors and measures attempts against them. Stored models
+need no extra column to say which scorer made them: a std vector (1-D
+transform_matrix) is scaled Manhattan, a whitening matrix (2-D) is
+Mahalanobis. See scorer_for().
+"""
+import numpy as np
+
+from online_model import MIN_STD_RATIO, THRESHOLD_SIGMAS
+
+
+class ScaledManhattanScorer:
+    """sum(|x - mean| / std): the default, and what the online models use."""
+
+    name = "manhattan"
+
+    def fit(self, clean_X):
+        std_vectors, mean_vectors, thresholds = self.fit_batch(np.asarray(clean_X, dtype=float)[None])
+        return std_vectors[0], mean_vectors[0], float(thresholds[0])
+
+    def fit_batch(self, clean_X):
+        """fit for a (G, n, F) block of users with n clean samples each."""
+        mean_vectors = np.mean(clean_X, axis=1)
+        # Human variance is at least MIN_STD_RATIO of the duration; a smaller
+        # std would make the distance explode on tiny deviations
+        std_vectors = np.maximum(np.std(clean_X, axis=1), mean_vectors * MIN_STD_RATIO)
+
+        # Threshold from the self-distances: mean + THRESHOLD_SIGMAS * std
+        # (evaluation.py tunes it), but never below the feature count, the
+        # expected distance of an attempt from its own model
+        scores = np.sum(np.abs(clean_X - mean_vectors[:, None, :]) / std_vectors[:, None, :], axis=2)
+        thresholds = np.mean(scores, axis=1) + THRESHOLD_SIGMAS * np.std(scores, axis=1)
+        return std_vectors, mean_vectors, np.maximum(thresholds, clean_X.shape[2])
+
+    def distance(self, x, mean_vector, std_vector):
+        # Vectorized operation: |x - u| / sigma
+        diff = np.abs(x - mean_vector)
+        scaled_diff = diff / std_vector
+        return np.sum(scaled_diff)
+
+    def distance_batch(self, X, mean_vectors, std_vectors):
+        return np.sum(np.abs(X - mean_vectors) / std_vectors, axis=1)
+
+
+class MahalanobisScorer:
+    """
+    ||W (x - mean)|| with W = cov^(-1/2), precomputed at enrollment.
+
+    Ten enrollment samples can't pin down an 85x85 covariance, so the
+    correlation matrix is shrunk towards the identity:
+    R = (1 - shrinkage) * R_sample + shrinkage * I, with the same std
+    floor as the Manhattan model on the diagonal. Self-distances of the
+    training samples are far too optimistic for a full covariance, so
+    the threshold is threshold_ratio times the mean leave-one-out
+    distance.
+    """
+
+    name = "mahalanobis"
+
+    def __init__(self, shrinkage=0.9, threshold_ratio=1.2):
+        self.shrinkage = shrinkage
+        self.threshold_ratio = threshold_ratio
+
+    def covariance(self, clean_X):
+        """(mean, shrunk covariance) of the samples."""
+        mean_vector = np.mean(clean_X, axis=0)
+        std_vector = np.maximum(np.std(clean_X, axis=0), mean_vector * MIN_STD_RATIO)
+        Z = (clean_X - mean_vector) / std_vector
+        corr = Z.T @ Z / len(clean_X)
+        np.fill_diagonal(corr, 1.0)
+        corr *= 1.0 - self.shrinkage
+        corr[np.diag_indices_from(corr)] += self.shrinkage
+        return mean_vector, corr * std_vector[:, None] * std_vector[None, :]
+
+    def fit(self, clean_X):
+        clean_X = np.asarray(clean_X, dtype=float)
+        mean_vector, cov = self.covariance(clean_X)
+        whitening = inverse_sqrt(cov)
+
+        # Leave-one-out distances stand in for unseen genuine attempts
+        loo = []
+        for i in range(len(clean_X)):
+            mean_i, cov_i = self.covariance(np.delete(clean_X, i, axis=0))
+            loo.append(self.distance(clean_X[i], mean_i, inverse_sqrt(cov_i)))
+        threshold = self.threshold_ratio * float(np.mean(loo))
+        return whitening, mean_vector, threshold
+
+    def distance(self, x, mean_vector, whitening):
+        # One mat-vec and a norm
+        return np.linalg.norm(whitening @ (x - mean_vector))
+
+    def distance_batch(self, X, mean_vectors, whitenings):
+        return np.linalg.norm(np.einsum('nij,nj->ni', whitenings, X - mean_vectors), axis=1)
+
+
+def inverse_sqrt(cov):
+    """
+    cov^(-1/2) of a symmetric positive definite matrix. Same result as
+    scipy.linalg.fractional_matrix_power(cov, -0.5) (to ~1e-14), but real
+    by construction and several times faster.
+    """
+    eigenvalues, eigenvectors = np.linalg.eigh(cov)
+    return (eigenvectors / np.sqrt(eigenvalues)) @ eigenvectors.T
+
+
+SCORERS = {
+    ScaledManhattanScorer.name: ScaledManhattanScorer,
+    MahalanobisScorer.name: MahalanobisScorer,
+}
+MANHATTAN = ScaledManhattanScorer()
+MAHALANOBIS = MahalanobisScorer()
+
+
+def get_scorer(name):
+    """A scorer by name ("manhattan" or "mahalanobis")."""
+    if name not in SCORERS:
+        raise ValueError(f"Unknown scorer {name!r} (choose from {', '.join(SCORERS)})")
+    return SCORERS[name]()
+
+
+def scorer_for(transform_matrix, batch=False):
+    """The scorer that reads transform_matrix (one model, or a stack of them if batch)."""
+    return MAHALANOBIS if np.ndim(transform_matrix) - batch == 2 else MANHATTAN
+
+
+def std_vector(transform_matrix):
+    """Per-feature std of either kind of model."""
+    transform_matrix = np.asarray(transform_matrix)
+    if transform_matrix.ndim == 1:
+        return transform_matrix
+    # W = cov^(-1/2) is symmetric, so cov = (W W)^-1
+    return np.sqrt(np.diag(np.linalg.inv(transform_matrix @ transform_matrix)))
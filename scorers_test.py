@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from scipy.linalg import fractional_matrix_power
+
+from biometrics import BiometricsEngine
+from db_manager import DBManager
+from population import TypistPopulation
+from scorers import MahalanobisScorer, get_scorer, std_vector
+from storage import SQLiteBackend
+
+
+def enroll_samples(n_users=4, n_samples=10, seed=0):
+    pop = TypistPopulation(n_users, seed=seed, pause_rate=0, backspace_rate=0)
+    X, _ = pop.features(np.repeat(np.arange(n_users), n_samples + 1))
+    X = X.reshape(n_users, n_samples + 1, -1)
+    return X[:, :n_samples], X[:, n_samples]
+
+
+def test_whitening_matrix_is_inverse_square_root_of_shrunk_covariance():
+    bio = BiometricsEngine(MahalanobisScorer(shrinkage=0.5))
+    samples, attempts = enroll_samples()
+    W, mean, threshold = bio.fit_model(samples[0])
+
+    _, cov = bio.scorer.covariance(bio.clean_samples(samples[0]))
+    assert np.allclose(W, np.real(fractional_matrix_power(cov, -0.5)), atol=1e-8)
+    assert np.allclose(W @ cov @ W, np.eye(len(mean)), atol=1e-8)
+    assert np.allclose(std_vector(W), np.sqrt(np.diag(cov)))
+
+    # Mahalanobis distance, read by authenticate from the matrix alone
+    diff = attempts[0] - mean
+    _, distance, _ = bio.authenticate(attempts[0], mean, W, threshold)
+    assert np.isclose(distance, np.sqrt(diff @ np.linalg.solve(cov, diff)))
+    assert threshold > 0
+
+
+def test_batch_scoring_and_storage_of_matrix_models():
+    bio = BiometricsEngine(get_scorer("mahalanobis"))
+    samples, attempts = enroll_samples(seed=1)
+    models = [bio.fit_model(s) for s in samples]
+    W = np.stack([m[0] for m in models])
+    means = np.stack([m[1] for m in models])
+    thresholds = np.array([m[2] for m in models])
+
+    accepted, distances, scores = bio.authenticate_batch(attempts, means, W, thresholds)
+    for u in range(len(attempts)):
+        expected = bio.authenticate(attempts[u], means[u], W[u], thresholds[u])
+        assert accepted[u] == expected[0]
+        assert np.isclose(distances[u], expected[1]) and np.isclose(scores[u], expected[2])
+
+    db = DBManager(backend=SQLiteBackend(":memory:"))
+    user = db.register_user("erin")
+    db.save_model(user["id"], W[0], means[0], thresholds[0])
+    db.cache.clear()
+    assert np.array_equal(db.get_model(user["id"])["transform_matrix"], W[0])
+
+
+def test_default_scorer_is_scaled_manhattan():
+    bio = BiometricsEngine()
+    samples, _ = enroll_samples(n_users=1, seed=2)
+    for ours, theirs in zip(bio.fit_model(samples[0]), bio.train_model(samples[0])):
+        assert np.array_equal(ours, theirs)
+    with pytest.raises(ValueError):
+        get_scorer("euclid")
+
+
+def test_enrollment_by_name_keeps_the_online_state():
+    samples, _ = enroll_samples(n_users=1, seed=3)
+    db = DBManager(backend=SQLiteBackend(":memory:"))
+    for name, online in (("manhattan", True), ("mahalanobis", False)):
+        user = db.register_user(name)
+        *model, state = BiometricsEngine(get_scorer(name)).enroll(samples[0])
+        db.save_model(user["id"], *model, state)
+        db.cache.clear()
+        assert (db.get_model(user["id"])["online_state"] is not None) == online
@@ -0,0 +1,282 @@
+import json
+import os
+import queue
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from biometrics import EVENT_DOWN, EVENT_UP, decode_char, encode_char
+
+FORMAT_VERSION = 1
+
+# What a session was typed for
+KIND_ENROLL = 0
+KIND_VERIFY = 1
+
+# How it was judged at the time
+OUTCOME_UNUSABLE = -1  # rejected before scoring (backspace, pause, wrong length)
+OUTCOME_REJECTED = 0
+OUTCOME_ACCEPTED = 1
+
+# One fixed-size record per session; offset/length locate its events
+INDEX_DTYPE = np.dtype([
+    ("user_id", "S36"),
+    ("phrase_id", "<u4"),
+    ("kind", "i1"),
+    ("outcome", "i1"),
+    ("recorded_ns", "<i8"),  # wall clock when archived
+    ("offset", "<i8"),
+    ("length", "<i4"),
+])
+
+# Event columns: file name -> dtype
+COLUMNS = {
+    "char_codes": np.dtype("<i4"),
+    "event_types": np.dtype("i1"),
+    "timestamps": np.dtype("<i8"),  # nanoseconds
+}
+
+
+def phrase_id(phrase):
+    """Stable 32-bit id of a phrase text."""
+    return zlib.crc32(phrase.encode("utf-8"))
+
+
+class SessionArchive:
+    """
+    Append-only columnar archive of raw keystroke sessions.
+
+    A directory of flat files: one per event column (char codes, event
+    types, int64 nanosecond timestamps) plus index.bin with one record per
+    session (INDEX_DTYPE). Appends write the event columns first and the
+    index record last, so a crash mid-append leaves at most some unindexed
+    event bytes that readers never look at.
+
+    Reading memory-maps the files; sessions, packed() and features() hand
+    out views into the mapping without copying.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            with open(meta_path, "w") as f:
+                json.dump({"version": FORMAT_VERSION,
+                           "index": INDEX_DTYPE.descr,
+                           "columns": {k: v.str for k, v in COLUMNS.items()}}, f)
+        else:
+            with open(meta_path) as f:
+                version = json.load(f)["version"]
+            if version != FORMAT_VERSION:
+                raise ValueError(f"Unsupported session archive version {version}")
+        self.lock = threading.Lock()
+        self._files = None
+        self._maps = None
+        self._mapped_sessions = -1
+
+    def _file(self, name):
+        return os.path.join(self.path, name + ".bin")
+
+    # --- Writing ---
+    def append(self, user_id, phrase, char_codes, event_types, timestamps_ns,
+               kind=KIND_VERIFY, outcome=OUTCOME_ACCEPTED, recorded_ns=None):
+        """Appends one session. Returns its index."""
+        columns = {
+            "char_codes": np.asarray(char_codes, dtype=COLUMNS["char_codes"]),
+            "event_types": np.asarray(event_types, dtype=COLUMNS["event_types"]),
+            "timestamps": np.asarray(timestamps_ns, dtype=COLUMNS["timestamps"]),
+        }
+        length = len(columns["char_codes"])
+        if any(len(c) != length for c in columns.values()):
+            raise ValueError("event columns differ in length")
+
+        with self.lock:
+            if self._files is None:
+                self._files = {name: open(self._file(name), "ab") for name in (*COLUMNS, "index")}
+            # Offset = events already indexed; torn leftovers of a crashed append are cut first
+            n_sessions, offset = self._indexed_extent()
+            for name, values in columns.items():
+                f = self._files[name]
+                f.truncate(offset * COLUMNS[name].itemsize)
+                f.seek(0, os.SEEK_END)
+                f.write(values.tobytes())
+                f.flush()
+
+            record = np.zeros(1, dtype=INDEX_DTYPE)
+            record["user_id"] = str(user_id or "").encode("ascii")[:36]
+            record["phrase_id"] = phrase_id(phrase) if isinstance(phrase, str) else phrase
+            record["kind"] = kind
+            record["outcome"] = outcome
+            record["recorded_ns"] = time.time_ns() if recorded_ns is None else recorded_ns
+            record["offset"] = offset
+            record["length"] = length
+            f = self._files["index"]
+            f.truncate(n_sessions * INDEX_DTYPE.itemsize)
+            f.seek(0, os.SEEK_END)
+            f.write(record.tobytes())
+            f.flush()
+            return n_sessions
+
+    def append_events(self, user_id, phrase, events, **kwargs):
+        """append() for [(char, 'down'/'up', seconds), ...] as captured by the UI."""
+        codes = [encode_char(char) for char, _, _ in events]
+        types = [EVENT_DOWN if event == 'down' else EVENT_UP for _, event, _ in events]
+        stamps = [round(ts * 1e9) for _, _, ts in events]
+        return self.append(user_id, phrase, codes, types, stamps, **kwargs)
+
+    def _indexed_extent(self):
+        """(sessions, events) covered by complete index records."""
+        size = os.path.getsize(self._file("index")) if os.path.exists(self._file("index")) else 0
+        n = size // INDEX_DTYPE.itemsize
+        if n == 0:
+            return 0, 0
+        with open(self._file("index"), "rb") as f:
+            f.seek((n - 1) * INDEX_DTYPE.itemsize)
+            last = np.frombuffer(f.read(INDEX_DTYPE.itemsize), dtype=INDEX_DTYPE)[0]
+        return n, int(last["offset"] + last["length"])
+
+    def close(self):
+        with self.lock:
+            if self._files is not None:
+                for f in self._files.values():
+                    f.close()
+                self._files = None
+            self._maps = None
+
+    # --- Reading ---
+    def _mapped(self):
+        """Memory maps of the index and columns, refreshed after appends."""
+        n, n_events = self._indexed_extent()
+        if self._maps is None or self._mapped_sessions != n:
+            maps = {"index": self._map("index", INDEX_DTYPE, n)}
+            for name, dtype in COLUMNS.items():
+                maps[name] = self._map(name, dtype, n_events)
+            self._maps, self._mapped_sessions = maps, n
+        return self._maps
+
+    def _map(self, name, dtype, count):
+        if count == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._file(name), dtype=dtype, mode="r", shape=(count,))
+
+    def __len__(self):
+        return self._indexed_extent()[0]
+
+    @property
+    def index(self):
+        """The session records (read-only memmap of INDEX_DTYPE)."""
+        return self._mapped()["index"]
+
+    def session(self, i):
+        """(record, char_codes, event_types, timestamps_ns) views of session i."""
+        maps = self._mapped()
+        record = maps["index"][i]
+        start, end = int(record["offset"]), int(record["offset"] + record["length"])
+        return (record, maps["char_codes"][start:end], maps["event_types"][start:end],
+                maps["timestamps"][start:end])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.session(i)
+
+    def events(self, i):
+        """Session i as extract_features input [(char, 'down'/'up', seconds), ...]."""
+        _, codes, types, stamps = self.session(i)
+        return [(decode_char(c), 'down' if e == EVENT_DOWN else 'up', t * 1e-9)
+                for c, e, t in zip(codes.tolist(), types.tolist(), stamps.tolist())]
+
+    def select(self, user_id=None, phrase=None, kind=None, outcome=None):
+        """Indices of sessions matching every given field."""
+        index = self.index
+        mask = np.ones(len(index), dtype=bool)
+        if user_id is not None:
+            mask &= index["user_id"] == str(user_id).encode("ascii")
+        if phrase is not None:
+            mask &= index["phrase_id"] == (phrase_id(phrase) if isinstance(phrase, str) else phrase)
+        if kind is not None:
+            mask &= index["kind"] == kind
+        if outcome is not None:
+            mask &= index["outcome"] == outcome
+        return np.flatnonzero(mask)
+
+    def packed(self, indices=None):
+        """
+        (char_codes, event_types, timestamps_ns, offsets) in pack_key_events
+        layout. The whole archive is zero-copy views of the mapping; a
+        subset of indices is gathered into new arrays.
+        """
+        maps = self._mapped()
+        index = maps["index"]
+        if indices is None:
+            offsets = np.empty(len(index) + 1, dtype=np.int64)
+            offsets[:-1] = index["offset"]
+            offsets[-1] = offsets[-2] + index["length"][-1] if len(index) else 0
+            return maps["char_codes"], maps["event_types"], maps["timestamps"], offsets
+
+        records = index[np.asarray(indices, dtype=np.int64)]
+        lengths = records["length"].astype(np.int64)
+        offsets = np.zeros(len(records) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        # Event positions of every selected session, in order
+        positions = np.repeat(records["offset"] - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return (maps["char_codes"][positions], maps["event_types"][positions],
+                maps["timestamps"][positions], offsets)
+
+    def features(self, bio, indices=None, n_keys=None):
+        """Re-extracts (X, valid) with BiometricsEngine.extract_features_batch."""
+        codes, types, stamps, offsets = self.packed(indices)
+        return bio.extract_features_batch(codes, types, stamps, offsets,
+                                          n_keys=n_keys, timestamp_scale=1e-9)
+
+
+class ArchiveWriter:
+    """
+    Appends sessions to a SessionArchive from a background thread, so the
+    UI thread only pays for a queue put. close() drains the queue.
+    """
+
+    def __init__(self, archive: SessionArchive, max_queue=1024):
+        self.archive = archive
+        self.queue = queue.Queue(max_queue)
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._run, name="session-archive", daemon=True)
+        self.thread.start()
+
+    def record(self, user_id, phrase, char_codes, event_types, timestamps_ns,
+               kind=KIND_VERIFY, outcome=OUTCOME_ACCEPTED):
+        """
+        Queues a copy of a captured session (e.g. KeystrokeBuffer.view()).
+        Never blocks: when the writer falls far behind, the session is
+        dropped and counted instead.
+        """
+        item = (user_id, phrase, np.array(char_codes), np.array(event_types),
+                np.array(timestamps_ns), kind, outcome, time.time_ns())
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                user_id, phrase, codes, types, stamps, kind, outcome, recorded_ns = item
+                self.archive.append(user_id, phrase, codes, types, stamps, kind=kind,
+                                    outcome=outcome, recorded_ns=recorded_ns)
+            except Exception as e:
+                print(f"[ERROR] Session archive write failed: {e}")
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        self.queue.join()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        self.archive.close()
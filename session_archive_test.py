@@ -0,0 +1,89 @@
+import numpy as np
+
+from biometrics import BiometricsEngine
+from keystroke_buffer import KeystrokeBuffer
+from population import PASSPHRASE, TypistPopulation, unpack_sessions
+from session_archive import (INDEX_DTYPE, KIND_ENROLL, KIND_VERIFY, OUTCOME_REJECTED, ArchiveWriter,
+                             SessionArchive)
+
+
+def archive_population(path, n_users=5, sessions=4):
+    pop = TypistPopulation(n_users, seed=3)
+    users = np.repeat(np.arange(n_users), sessions)
+    codes, types, stamps, offsets = pop.packed(users)
+    events = unpack_sessions(codes, types, stamps, offsets)
+
+    archive = SessionArchive(path)
+    for i, (u, session) in enumerate(zip(users, events)):
+        archive.append_events(f"user-{u}", PASSPHRASE, session,
+                              kind=KIND_ENROLL if i % 2 else KIND_VERIFY, outcome=i % 2)
+    return pop, events, archive
+
+
+def test_features_match_the_captured_sessions(tmp_path):
+    bio = BiometricsEngine()
+    pop, events, archive = archive_population(str(tmp_path / "archive"))
+    assert len(archive) == len(events)
+
+    # Reopened from disk, read through the memory map
+    archive = SessionArchive(str(tmp_path / "archive"))
+    X, valid = archive.features(bio, n_keys=pop.n_keys)
+    for i, session in enumerate(events):
+        expected = bio.extract_features(session)
+        assert valid[i] == (expected is not None)
+        if expected is not None:
+            assert np.allclose(X[i], expected, atol=1e-9)
+        # The scalar path reads back the same events, to the nanosecond
+        assert [(c, e) for c, e, _ in archive.events(i)] == [(c, e) for c, e, _ in session]
+        assert np.allclose([t for *_, t in archive.events(i)], [t for *_, t in session], atol=1e-9)
+
+    # Whole-archive reads are views of the mapping; selections are gathers
+    codes, _, stamps, offsets = archive.packed()
+    assert isinstance(stamps, np.memmap) and stamps.dtype == np.int64
+    picked = archive.select(user_id="user-2", outcome=OUTCOME_REJECTED)
+    assert len(picked) == 2
+    sub = archive.packed(picked)
+    for j, i in enumerate(picked):
+        assert np.array_equal(sub[0][sub[3][j]:sub[3][j + 1]], codes[offsets[i]:offsets[i + 1]])
+
+
+def test_torn_append_is_ignored(tmp_path):
+    path = str(tmp_path / "archive")
+    _, events, archive = archive_population(path, n_users=2, sessions=2)
+    archive.close()
+
+    # A crash after the event columns but before the full index record
+    with open(f"{path}/char_codes.bin", "ab") as f:
+        f.write(np.arange(7, dtype=np.int32).tobytes())
+    with open(f"{path}/index.bin", "ab") as f:
+        f.write(b"\0" * (INDEX_DTYPE.itemsize // 2))
+
+    archive = SessionArchive(path)
+    assert len(archive) == 4
+    # The next append overwrites the torn tail
+    archive.append_events("late", PASSPHRASE, events[0])
+    assert len(archive) == 5
+    record, codes, _, _ = archive.session(4)
+    assert record["user_id"] == b"late" and record["offset"] == sum(map(len, events))
+    assert np.array_equal(codes, archive.session(0)[1])
+
+
+def test_writer_appends_off_thread(tmp_path):
+    archive = SessionArchive(str(tmp_path / "archive"))
+    writer = ArchiveWriter(archive)
+    buffer = KeystrokeBuffer(capacity=8)
+    for n in range(20):
+        buffer.clear()
+        for code, event_type, ts in [(97, 0, 1_000_000_000), (97, 1, 1_100_000_000),
+                                     (-1, 0, 1_250_000_000)]:
+            buffer.push(code, event_type, ts)
+        writer.record(f"user-{n % 3}", PASSPHRASE, *buffer.view())
+        buffer.push(98, 0, 0)  # reusing the buffer doesn't touch queued sessions
+    writer.flush()
+    assert len(archive) == 20 and writer.dropped == 0
+
+    record, codes, types, stamps = archive.session(19)
+    assert record["user_id"] == b"user-1"
+    assert codes.tolist() == [97, 97, -1] and types.tolist() == [0, 1, 0]
+    assert stamps.tolist() == [1_000_000_000, 1_100_000_000, 1_250_000_000]
+    writer.close()
@@ -1,6 +1,6 @@
 import time
 import numpy as np
-from biometrics import BiometricsEngine
+from biometrics import BiometricsEngine, pack_key_events
 
 def mock_keystroke_sequence(phrase, dwell_mean=0.1, flight_mean=0.15, noise=0.01):
     """Generates a list of (char, 'down'/'up', timestamp) for a phrase."""
@@ -86,5 +86,100 @@ def test_pipeline():
     
     print("--- Simulation Test Passed ---")
 
+def test_batch_extraction_matches_scalar():
+    bio = BiometricsEngine()
+    passphrase = "The quick brown fox jumps over the lazy dog"
+    rng = np.random.default_rng(7)
+
+    sessions = [mock_keystroke_sequence(passphrase) for _ in range(50)]
+
+    # Rollover: the next key goes down before the previous one is released
+    rollover = mock_keystroke_sequence(passphrase)
+    rollover = [(c, e, ts - 0.12 * (i // 2)) if e == 'down' else (c, e, ts - 0.12 * (i // 2) + 0.05)
+                for i, (c, e, ts) in enumerate(rollover)]
+    sessions.append(rollover)
+
+    # Backspace, a long pause, a dangling down, shuffled capture order, empty
+    with_backspace = list(sessions[0])
+    with_backspace.insert(5, ("Key.backspace", 'down', with_backspace[4][2]))
+    sessions.append(with_backspace)
+    sessions.append([(c, e, ts + (3.0 if i >= 10 else 0.0)) for i, (c, e, ts) in enumerate(sessions[1])])
+    sessions.append(sessions[2][:-1])
+    shuffled = list(sessions[3])
+    rng.shuffle(shuffled)
+    sessions.append(shuffled)
+    sessions.append([])
+
+    for n_keys in (None, len(passphrase)):
+        X, valid = bio.extract_features_batch(*pack_key_events(sessions), n_keys=n_keys)
+        for i, events in enumerate(sessions):
+            feats = bio.extract_features(events)
+            expected = feats is not None and len(feats) == X.shape[1]
+            assert valid[i] == expected, f"Validity mismatch on session {i}"
+            if expected:
+                assert np.array_equal(X[i], feats), f"Feature mismatch on session {i}"
+            else:
+                assert np.isnan(X[i]).all()
+
+    assert valid[:51].all() and not valid[51:54].any() and valid[54] and not valid[55]
+
+
+def test_streaming_extraction_matches_scalar():
+    bio = BiometricsEngine()
+    passphrase = "The quick brown fox jumps over the lazy dog"
+    stream = bio.new_stream(len(passphrase))
+
+    events = mock_keystroke_sequence(passphrase)
+    # Press the third key before the second is released (rollover)
+    events[4] = (events[4][0], 'down', events[3][2] - 0.02)
+
+    for i, (char, event_type, ts) in enumerate(sorted(events, key=lambda e: e[2])):
+        completed = stream.push(char, event_type, ts)
+        assert completed == (i == len(events) - 1)
+        if i == len(events) - 2:
+            assert stream.is_waiting
+
+    assert np.array_equal(stream.features(), bio.extract_features(events))
+
+    # Backspace rejects, an extra key makes the stream defer to extract_features
+    stream.reset()
+    stream.push("Key.backspace", 'down', 0.0)
+    assert stream.features() is None and not stream.is_waiting
+
+    stream.reset()
+    for char, event_type, ts in events + [("x", 'down', events[-1][2] + 0.1)]:
+        stream.push(char, event_type, ts)
+    assert not stream.is_complete
+
+
+def test_batch_training_matches_scalar():
+    bio = BiometricsEngine()
+    rng = np.random.default_rng(5)
+    n_users, n_samples = 60, 12
+    base = rng.uniform(0.05, 0.3, size=(n_users, 1, 85))
+    X = base * (1 + 0.2 * rng.normal(size=(n_users, n_samples, 85)))
+    X[::7, 3] *= 3  # a clumsy sample for the outlier cut
+
+    counts = rng.integers(5, n_samples + 1, size=n_users)
+    counts[0] = 0
+    stds, means, thresholds = bio.train_models_batch(X, counts)
+    assert np.isnan(thresholds[0])
+    for u in range(1, n_users):
+        std, mean, threshold = bio.train_model(X[u, :counts[u]])
+        assert np.array_equal(stds[u], std) and np.array_equal(means[u], mean)
+        assert thresholds[u] == threshold
+
+    # Mask form: any samples, not just a prefix
+    mask = rng.random((n_users, n_samples)) < 0.7
+    mask[:, :5] = True
+    stds, means, thresholds = bio.train_models_batch(X, mask)
+    for u in range(0, n_users, 5):
+        std, mean, threshold = bio.train_model(X[u][mask[u]])
+        assert np.array_equal(stds[u], std) and thresholds[u] == threshold
+
+
 if __name__ == "__main__":
     test_pipeline()
+    test_batch_extraction_matches_scalar()
+    test_streaming_extraction_matches_scalar()
+    test_batch_training_matches_scalar()
@@ -0,0 +1,148 @@
+"""
+Cold start budget: how long `import main` takes and how long until the
+login window's first frame is drawn, each in a fresh interpreter.
+
+    python startup_budget.py                  # measure, exit 1 over budget
+    python startup_budget.py --top 15         # also list the slowest imports
+    python startup_budget.py --import-budget 300 --frame-budget 1000
+
+Imports are timed with `python -X importtime`. The first frame is timed
+from spawning the interpreter to the end of the first app.update() after
+main.build_app(); without a display it is skipped. Importing main must
+also never pull in the modules in FORBIDDEN, whatever the timing says:
+those are loaded on first use, off the Tk thread.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+IMPORT_BUDGET_MS = 400
+FIRST_FRAME_BUDGET_MS = 1500
+# Heavy modules that must stay out of `import main`
+FORBIDDEN = ("supabase", "httpx", "pyiceberg", "scipy")
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+FIRST_FRAME_SCRIPT = """
+import main
+app, db, archive = main.build_app()
+app.update()
+print("FIRST_FRAME", flush=True)
+app.destroy()
+main.shutdown(db, archive)
+"""
+
+LOADED_SCRIPT = """
+import sys
+import main
+print(" ".join(sorted(sys.modules)))
+"""
+
+
+def parse_importtime(stderr):
+    """{module: (self_us, cumulative_us)} from -X importtime output."""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header line
+        times[fields[2].strip()] = (int(fields[0]), int(fields[1]))
+    return times
+
+
+def _run(args, env=None):
+    return subprocess.run([sys.executable] + args, cwd=HERE, capture_output=True, text=True,
+                          env=env, timeout=120)
+
+
+def _env():
+    # No archive files and no dotenv-loaded credentials needed to draw a frame
+    return {**os.environ, "SESSION_ARCHIVE": ""}
+
+
+def measure_imports(module="main", runs=3):
+    """Best-of-runs import time of module (ms), and the per-module timings of that run."""
+    best = None
+    for _ in range(runs):
+        proc = _run(["-X", "importtime", "-c", f"import {module}"], _env())
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr)
+        times = parse_importtime(proc.stderr)
+        if best is None or times[module][1] < best[module][1]:
+            best = times
+    return best[module][1] / 1e3, best
+
+
+def forbidden_imports(module="main"):
+    """The FORBIDDEN modules (top-level names) loaded by importing module."""
+    proc = _run(["-c", LOADED_SCRIPT.replace("import main", f"import {module}")], _env())
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr)
+    loaded = {name.split(".")[0] for name in proc.stdout.split()}
+    return sorted(loaded.intersection(FORBIDDEN))
+
+
+def measure_first_frame(runs=3):
+    """Best-of-runs ms from spawn to the first drawn frame, or None without a display."""
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, "-c", FIRST_FRAME_SCRIPT], cwd=HERE, env=_env(),
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        elapsed = None
+        for line in proc.stdout:
+            if line.startswith("FIRST_FRAME"):
+                elapsed = (time.perf_counter() - start) * 1e3
+                break
+        _, stderr = proc.communicate(timeout=120)
+        if elapsed is None:
+            if "TclError" in stderr and "display" in stderr:
+                return None
+            raise RuntimeError(stderr)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET_MS, help="ms")
+    parser.add_argument("--frame-budget", type=float, default=FIRST_FRAME_BUDGET_MS, help="ms")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=0, help="list the N slowest imports")
+    args = parser.parse_args(argv)
+
+    failures = []
+    import_ms, times = measure_imports(runs=args.runs)
+    print(f"import main:  {import_ms:8.1f} ms  (budget {args.import_budget:.0f} ms)")
+    if import_ms > args.import_budget:
+        failures.append("import time")
+    if args.top:
+        slowest = sorted(times.items(), key=lambda kv: kv[1][0], reverse=True)[:args.top]
+        for name, (self_us, cumulative_us) in slowest:
+            print(f"    {self_us / 1e3:7.1f} ms self  {cumulative_us / 1e3:7.1f} ms total  {name}")
+
+    forbidden = forbidden_imports()
+    if forbidden:
+        print(f"import main loads {', '.join(forbidden)} (should be lazy)")
+        failures.append("forbidden imports")
+
+    frame_ms = measure_first_frame(args.runs)
+    if frame_ms is None:
+        print("first frame:  skipped (no display)")
+    else:
+        print(f"first frame:  {frame_ms:8.1f} ms  (budget {args.frame_budget:.0f} ms)")
+        if frame_ms > args.frame_budget:
+            failures.append("first frame")
+
+    if failures:
+        print(f"OVER BUDGET: {', '.join(failures)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
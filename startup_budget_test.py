@@ -0,0 +1,18 @@
+import startup_budget
+
+
+def test_importing_main_leaves_heavy_modules_for_later():
+    assert startup_budget.forbidden_imports() == []
+    import_ms, times = startup_budget.measure_imports(runs=1)
+    assert "async_db" in times and "supabase" not in times
+    assert import_ms > 0
+
+
+def test_parse_importtime():
+    stderr = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       120 |        120 |   _io",
+        "import time:      2500 |      40210 | numpy",
+        "something else on stderr",
+    ])
+    assert startup_budget.parse_importtime(stderr) == {"_io": (120, 120), "numpy": (2500, 40210)}
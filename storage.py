@@ -0,0 +1,599 @@
+import queue
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+
+# Columns a partial model update may touch (anything else is a bug)
+MODEL_COLUMNS = ("transform_matrix", "mean_vector", "threshold", "online_state", "training_samples",
+                 "recent_attempts")
+# Columns a model row may lack; a sync leaves them out rather than clearing them remotely
+OPTIONAL_COLUMNS = ("training_samples", "recent_attempts")
+# What a model lookup reads: everything but the (large) training samples and attempt history
+MODEL_SELECT = "user_id,transform_matrix,mean_vector,threshold,online_state"
+
+SQLITE_SCHEMA = """
+create table if not exists users (
+  id text primary key,
+  username text unique not null,
+  created_at text default (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')) not null
+);
+
+create table if not exists biometrics (
+  id text primary key,
+  user_id text references users(id) not null unique,
+  transform_matrix text not null,
+  mean_vector text not null,
+  threshold real not null,
+  online_state text,
+  training_samples text,
+  recent_attempts text,
+  created_at text default (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')) not null
+);
+
+-- Local-first mode: rows written locally that the remote has not seen yet
+create table if not exists pending_sync (
+  user_id text primary key
+);
+
+-- Local-first mode: local user id -> id of the same username remotely
+create table if not exists remote_users (
+  user_id text primary key,
+  remote_id text not null
+);
+"""
+
+
+class StorageBackend:
+    """
+    Row storage behind DBManager.
+
+    Rows use the column layout of schema.sql (biometrics rows as built by
+    db_manager.model_to_row). Encoding, decoding and caching stay in
+    DBManager, so every backend only moves rows.
+    """
+
+    def upsert_user(self, username: str):
+        """Returns the users row for username, creating it if needed."""
+        raise NotImplementedError
+
+    def find_user(self, username: str):
+        """Returns the users row for username, or None (never creates one)."""
+        raise NotImplementedError
+
+    def upsert_model(self, row: dict):
+        """Inserts or replaces the biometrics row for row['user_id']."""
+        raise NotImplementedError
+
+    def update_model(self, user_id: str, fields: dict):
+        """Updates some columns of an existing biometrics row."""
+        raise NotImplementedError
+
+    def fetch_model(self, user_id: str):
+        """Returns the biometrics row for user_id (MODEL_SELECT columns), or None."""
+        raise NotImplementedError
+
+    def upsert_models(self, rows: list):
+        """upsert_model for many rows, in as few round trips as the backend allows."""
+        for row in rows:
+            self.upsert_model(row)
+
+    def update_models(self, updates: list):
+        """update_model for many (user_id, fields) pairs, in as few round trips as it can."""
+        for user_id, fields in updates:
+            self.update_model(user_id, fields)
+
+    def fetch_recent_attempts(self, user_id: str):
+        """Returns the recent_attempts column for user_id (None if unset or no model)."""
+        raise NotImplementedError
+
+    def fetch_training_page(self, after: str = None, limit: int = 1000):
+        """
+        Up to limit rows of {user_id, training_samples, online_state} with
+        stored samples and user_id > after, ordered by user_id (keyset
+        pagination).
+        """
+        raise NotImplementedError
+
+    def fetch_online_states(self, user_ids: list):
+        """{user_id: online_state column} for those of user_ids with a model."""
+        states = {}
+        for user_id in user_ids:
+            row = self.fetch_model(user_id)
+            if row is not None:
+                states[user_id] = row["online_state"]
+        return states
+
+    def fetch_model_page(self, after: str = None, limit: int = 1000):
+        """
+        Up to limit biometrics rows (MODEL_SELECT columns) with
+        user_id > after, ordered by user_id (keyset pagination).
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SupabaseBackend(StorageBackend):
+    """
+    The remote tables, one round trip per call.
+
+    Importing supabase (httpx, storage3, pyiceberg, ...) takes about a
+    second, so without a client passed in it is imported and the client
+    built on a background thread; the first call waits for it if needed.
+    """
+
+    def __init__(self, url: str = None, key: str = None, client=None):
+        self.url = url
+        self.key = key
+        self.client = client
+        self.client_lock = threading.Lock()
+        if client is None:
+            threading.Thread(target=self._connect, name="supabase-connect", daemon=True).start()
+
+    def _connect(self):
+        try:
+            self.supabase
+        except Exception as e:
+            # Raised again to the first caller
+            print(f"[DEBUG] Supabase client not created: {e}")
+
+    @property
+    def supabase(self):
+        """The client, created on first use."""
+        if self.client is None:
+            with self.client_lock:
+                if self.client is None:
+                    from supabase import create_client
+                    self.client = create_client(self.url, self.key)
+        return self.client
+
+    def upsert_user(self, username):
+        # Atomic upsert on the unique username; existing row or the new one
+        resp = self.supabase.table("users").upsert(
+            {"username": username}, on_conflict="username"
+        ).execute()
+        if resp.data:
+            return resp.data[0]
+        return None
+
+    def find_user(self, username):
+        resp = self.supabase.table("users").select("id,username,created_at").eq("username", username).execute()
+        if resp.data:
+            return resp.data[0]
+        return None
+
+    def upsert_model(self, row):
+        self.supabase.table("biometrics").upsert(row, on_conflict="user_id").execute()
+
+    def upsert_models(self, rows):
+        # One request for the whole batch
+        if rows:
+            self.supabase.table("biometrics").upsert(list(rows), on_conflict="user_id").execute()
+
+    def update_model(self, user_id, fields):
+        self.supabase.table("biometrics").update(fields).eq("user_id", user_id).execute()
+
+    def fetch_model(self, user_id):
+        resp = self.supabase.table("biometrics").select(MODEL_SELECT).eq("user_id", user_id).execute()
+        if resp.data:
+            return resp.data[0]
+        return None
+
+    def fetch_recent_attempts(self, user_id):
+        resp = self.supabase.table("biometrics").select("recent_attempts").eq("user_id", user_id).execute()
+        if resp.data:
+            return resp.data[0]["recent_attempts"]
+        return None
+
+    def fetch_training_page(self, after=None, limit=1000):
+        query = self.supabase.table("biometrics").select("user_id,training_samples,online_state")
+        if after is not None:
+            query = query.gt("user_id", after)
+        resp = query.not_.is_("training_samples", "null").order("user_id").limit(limit).execute()
+        return resp.data or []
+
+    def fetch_online_states(self, user_ids):
+        if not user_ids:
+            return {}
+        resp = self.supabase.table("biometrics").select("user_id,online_state").in_("user_id", list(user_ids)).execute()
+        return {r["user_id"]: r["online_state"] for r in resp.data or []}
+
+    def fetch_model_page(self, after=None, limit=1000):
+        query = self.supabase.table("biometrics").select(MODEL_SELECT)
+        if after is not None:
+            query = query.gt("user_id", after)
+        resp = query.order("user_id").limit(limit).execute()
+        return resp.data or []
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    The users/biometrics tables in a local SQLite file.
+
+    Connections run in WAL mode, so readers never wait on the writer, and
+    are kept in a small pool shared across threads. All SQL is constant
+    text with ? parameters, so each connection's statement cache prepares
+    every query once and reuses it.
+    """
+
+    def __init__(self, path: str, pool_size: int = 4):
+        if path == ":memory:":
+            # Every :memory: connection is its own database (and has no WAL),
+            # so the pool holds just one; used by tests and load generators
+            pool_size = 1
+        self.path = path
+        self.pool = queue.LifoQueue()
+        self.connections = []
+        for _ in range(max(1, pool_size)):
+            conn = self._connect()
+            self.connections.append(conn)
+            self.pool.put(conn)
+
+        with self._connection() as conn:
+            conn.executescript(SQLITE_SCHEMA)
+            self._migrate(conn)
+
+    def _migrate(self, conn):
+        """Adds columns introduced after a database file was created."""
+        columns = {r["name"] for r in conn.execute("pragma table_info(biometrics)")}
+        for column in ("online_state", "training_samples", "recent_attempts"):
+            if column not in columns:
+                conn.execute(f"alter table biometrics add column {column} text")
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            isolation_level=None,  # autocommit: each statement is its own transaction
+            cached_statements=64,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("pragma journal_mode=wal")
+        conn.execute("pragma synchronous=normal")
+        conn.execute("pragma foreign_keys=on")
+        conn.execute("pragma busy_timeout=5000")
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        conn = self.pool.get()
+        try:
+            yield conn
+        finally:
+            self.pool.put(conn)
+
+    def upsert_user(self, username):
+        with self._connection() as conn:
+            row = conn.execute(
+                "insert into users (id, username) values (?, ?) "
+                "on conflict(username) do update set username = excluded.username "
+                "returning id, username, created_at",
+                (str(uuid.uuid4()), username),
+            ).fetchone()
+        return dict(row)
+
+    def fetch_user(self, user_id):
+        with self._connection() as conn:
+            row = conn.execute(
+                "select id, username, created_at from users where id = ?", (user_id,)
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def find_user(self, username):
+        with self._connection() as conn:
+            row = conn.execute(
+                "select id, username, created_at from users where username = ?", (username,)
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    # Rows without training samples (or attempt history) keep the stored ones
+    UPSERT_MODEL_SQL = (
+        "insert into biometrics "
+        "(id, user_id, transform_matrix, mean_vector, threshold, online_state, training_samples, "
+        "recent_attempts) "
+        "values (?, ?, ?, ?, ?, ?, ?, ?) "
+        "on conflict(user_id) do update set "
+        "transform_matrix = excluded.transform_matrix, "
+        "mean_vector = excluded.mean_vector, "
+        "threshold = excluded.threshold, "
+        "online_state = excluded.online_state, "
+        "training_samples = coalesce(excluded.training_samples, biometrics.training_samples), "
+        "recent_attempts = coalesce(excluded.recent_attempts, biometrics.recent_attempts)"
+    )
+
+    def _model_params(self, row):
+        return (str(uuid.uuid4()), row["user_id"], row["transform_matrix"], row["mean_vector"],
+                float(row["threshold"]), row.get("online_state"), row.get("training_samples"),
+                row.get("recent_attempts"))
+
+    def upsert_model(self, row):
+        with self._connection() as conn:
+            conn.execute(self.UPSERT_MODEL_SQL, self._model_params(row))
+
+    def upsert_models(self, rows):
+        # One transaction (one WAL commit) for the whole batch
+        with self._connection() as conn:
+            conn.execute("begin")
+            try:
+                conn.executemany(self.UPSERT_MODEL_SQL, [self._model_params(r) for r in rows])
+            except BaseException:
+                conn.execute("rollback")
+                raise
+            conn.execute("commit")
+
+    def _update_sql(self, fields):
+        unknown = set(fields) - set(MODEL_COLUMNS)
+        if unknown:
+            raise ValueError(f"unknown biometrics columns: {sorted(unknown)}")
+        # Column order is fixed, so each field set maps to one cached statement
+        columns = [c for c in MODEL_COLUMNS if c in fields]
+        sql = "update biometrics set " + ", ".join(f"{c} = ?" for c in columns) + " where user_id = ?"
+        return sql, columns
+
+    def update_model(self, user_id, fields):
+        sql, columns = self._update_sql(fields)
+        with self._connection() as conn:
+            conn.execute(sql, [fields[c] for c in columns] + [user_id])
+
+    def update_models(self, updates):
+        # Grouped by column set, one executemany each, all in one transaction
+        groups = {}
+        for user_id, fields in updates:
+            sql, columns = self._update_sql(fields)
+            groups.setdefault(sql, []).append([fields[c] for c in columns] + [user_id])
+        with self._connection() as conn:
+            conn.execute("begin")
+            try:
+                for sql, params in groups.items():
+                    conn.executemany(sql, params)
+            except BaseException:
+                conn.execute("rollback")
+                raise
+            conn.execute("commit")
+
+    def fetch_model(self, user_id):
+        with self._connection() as conn:
+            row = conn.execute(
+                f"select {MODEL_SELECT} from biometrics where user_id = ?", (user_id,)
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def fetch_recent_attempts(self, user_id):
+        with self._connection() as conn:
+            row = conn.execute(
+                "select recent_attempts from biometrics where user_id = ?", (user_id,)
+            ).fetchone()
+        return row["recent_attempts"] if row is not None else None
+
+    def fetch_row(self, user_id):
+        """The whole biometrics row, training samples included."""
+        with self._connection() as conn:
+            row = conn.execute("select * from biometrics where user_id = ?", (user_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def fetch_training_page(self, after=None, limit=1000):
+        with self._connection() as conn:
+            rows = conn.execute(
+                "select user_id, training_samples, online_state from biometrics "
+                "where user_id > ? and training_samples is not null "
+                "order by user_id limit ?",
+                ("" if after is None else after, limit),
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def fetch_online_states(self, user_ids):
+        # In chunks, under SQLite's limit on ? parameters
+        states = {}
+        user_ids = list(user_ids)
+        with self._connection() as conn:
+            for i in range(0, len(user_ids), 500):
+                chunk = user_ids[i:i + 500]
+                rows = conn.execute(
+                    "select user_id, online_state from biometrics where user_id in "
+                    f"({','.join('?' * len(chunk))})", chunk,
+                ).fetchall()
+                states.update((r["user_id"], r["online_state"]) for r in rows)
+        return states
+
+    def fetch_model_page(self, after=None, limit=1000):
+        with self._connection() as conn:
+            rows = conn.execute(
+                f"select {MODEL_SELECT} from biometrics where user_id > ? order by user_id limit ?",
+                ("" if after is None else after, limit),
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def close(self):
+        for conn in self.connections:
+            conn.close()
+        self.connections = []
+
+
+class LocalFirstBackend(StorageBackend):
+    """
+    Serves everything from a SQLiteBackend and syncs it with a remote one.
+
+    Writes land locally and are queued in pending_sync; a background
+    thread pushes each changed user's full row to the remote every
+    sync_interval seconds, so repeated updates coalesce into one write and
+    an offline remote only delays the push. A model missing locally is read
+    through from the remote (users registered on another device); that
+    lookup only reads, and is a network call, so callers on the Tk thread
+    go through ThreadedDBManager.
+
+    Local and remote user ids differ; remote_users maps one to the other.
+    """
+
+    def __init__(self, local: SQLiteBackend, remote: StorageBackend, sync_interval: float = 5.0):
+        self.local = local
+        self.remote = remote
+        self.sync_interval = sync_interval
+        self.sync_lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.last_error = None
+        self.thread = None
+        if sync_interval is not None:
+            self.thread = threading.Thread(target=self._sync_loop, name="storage-sync", daemon=True)
+            self.thread.start()
+
+    def upsert_user(self, username):
+        return self.local.upsert_user(username)
+
+    def find_user(self, username):
+        return self.local.find_user(username)
+
+    def upsert_model(self, row):
+        self.local.upsert_model(row)
+        self._mark_pending(row["user_id"])
+
+    def update_model(self, user_id, fields):
+        self.local.update_model(user_id, fields)
+        self._mark_pending(user_id)
+
+    def update_models(self, updates):
+        self.local.update_models(updates)
+        with self.local._connection() as conn:
+            conn.executemany("insert or ignore into pending_sync (user_id) values (?)",
+                             [(user_id,) for user_id, _ in updates])
+
+    def upsert_models(self, rows):
+        self.local.upsert_models(rows)
+        with self.local._connection() as conn:
+            conn.executemany("insert or ignore into pending_sync (user_id) values (?)",
+                             [(r["user_id"],) for r in rows])
+
+    def fetch_recent_attempts(self, user_id):
+        return self.local.fetch_recent_attempts(user_id)
+
+    def fetch_training_page(self, after=None, limit=1000):
+        return self.local.fetch_training_page(after, limit)
+
+    def fetch_online_states(self, user_ids):
+        return self.local.fetch_online_states(user_ids)
+
+    def fetch_model_page(self, after=None, limit=1000):
+        return self.local.fetch_model_page(after, limit)
+
+    def fetch_model(self, user_id):
+        row = self.local.fetch_model(user_id)
+        if row is not None:
+            return row
+
+        # Read-through: the user may have enrolled on another device
+        remote_id = self._remote_id(user_id, register=False)
+        if remote_id is None:
+            return None
+        row = self.remote.fetch_model(remote_id)
+        if row is None:
+            return None
+        row = dict(row, user_id=user_id)
+        self.local.upsert_model(row)
+        return self.local.fetch_model(user_id)
+
+    def _mark_pending(self, user_id):
+        with self.local._connection() as conn:
+            conn.execute("insert or ignore into pending_sync (user_id) values (?)", (user_id,))
+
+    def _remote_id(self, user_id, register=True):
+        """
+        Remote id for a local user. Unless register is False, the username
+        is registered remotely if it isn't there yet; otherwise it's None.
+        """
+        with self.local._connection() as conn:
+            row = conn.execute(
+                "select remote_id from remote_users where user_id = ?", (user_id,)
+            ).fetchone()
+        if row is not None:
+            return row["remote_id"]
+
+        user = self.local.fetch_user(user_id)
+        if user is None:
+            return None
+        if register:
+            remote_user = self.remote.upsert_user(user["username"])
+        else:
+            remote_user = self.remote.find_user(user["username"])
+        if not remote_user:
+            return None
+        with self.local._connection() as conn:
+            conn.execute(
+                "insert or replace into remote_users (user_id, remote_id) values (?, ?)",
+                (user_id, remote_user["id"]),
+            )
+        return remote_user["id"]
+
+    def sync(self):
+        """
+        Pushes every pending row to the remote. Returns how many were pushed.
+        Rows that fail are queued again for the next attempt.
+        """
+        with self.sync_lock:
+            with self.local._connection() as conn:
+                pending = [r["user_id"] for r in conn.execute("select user_id from pending_sync")]
+
+            pushed = 0
+            for user_id in pending:
+                # Claim the row before reading it: a write landing after the
+                # read queues it again instead of being dropped with the claim
+                with self.local._connection() as conn:
+                    conn.execute("delete from pending_sync where user_id = ?", (user_id,))
+                row = self.local.fetch_row(user_id)
+                try:
+                    if row is not None:
+                        remote_id = self._remote_id(user_id)
+                        if remote_id is None:
+                            self._mark_pending(user_id)
+                            continue
+                        # Missing samples and history are left out rather than cleared remotely
+                        self.remote.upsert_model({
+                            "user_id": remote_id,
+                            **{c: row[c] for c in MODEL_COLUMNS
+                               if c not in OPTIONAL_COLUMNS or row[c] is not None},
+                        })
+                except Exception as e:
+                    self.last_error = e
+                    print(f"[ERROR] Sync failed for {user_id}: {e}")
+                    self._mark_pending(user_id)
+                    continue
+                pushed += 1
+            return pushed
+
+    def pending(self):
+        with self.local._connection() as conn:
+            return conn.execute("select count(*) from pending_sync").fetchone()[0]
+
+    def _sync_loop(self):
+        while not self.stopping.wait(self.sync_interval):
+            try:
+                self.sync()
+            except Exception as e:
+                self.last_error = e
+                print(f"[ERROR] Sync loop error: {e}")
+
+    def close(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+        try:
+            self.sync()
+        except Exception as e:
+            print(f"[ERROR] Final sync failed: {e}")
+        self.local.close()
+        self.remote.close()
+
+
+def create_backend(kind: str, url: str = None, key: str = None,
+                   sqlite_path: str = "bioauth.db", sync_interval: float = 5.0):
+    """
+    Backend by name: "supabase", "sqlite" or "local-first"
+    (SQLite with background sync to Supabase).
+    """
+    if kind == "supabase":
+        return SupabaseBackend(url, key)
+    if kind == "sqlite":
+        return SQLiteBackend(sqlite_path)
+    if kind == "local-first":
+        return LocalFirstBackend(SQLiteBackend(sqlite_path), SupabaseBackend(url, key), sync_interval)
+    raise ValueError(f"unknown storage backend: {kind}")
@@ -0,0 +1,140 @@
+import threading
+
+import numpy as np
+import pytest
+
+from async_db import ThreadedDBManager
+from db_manager import DBManager
+from db_manager_test import FakeSupabase
+from storage import LocalFirstBackend, SQLiteBackend, SupabaseBackend
+
+
+def test_sqlite_backend_behaves_like_supabase(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "bio.db"))
+    db = DBManager(backend=backend)
+
+    user = db.register_user("alice")
+    assert db.register_user("alice")["id"] == user["id"]
+
+    std, mean = np.linspace(0.01, 0.05, 85), np.linspace(0.1, 0.3, 85)
+    db.save_model(user["id"], std, mean * 2, 85.0)
+    db.save_model(user["id"], std, mean, 85.0)
+    db.update_mean_vector(user["id"], mean + 1)
+
+    db.cache.clear()
+    model = db.get_model(user["id"])
+    assert np.array_equal(model["transform_matrix"], std)
+    assert np.array_equal(model["mean_vector"], mean + 1)
+    assert model["threshold"] == 85.0
+    assert db.get_model("nobody") is None
+
+    with pytest.raises(ValueError, match="unknown"):
+        backend.update_model(user["id"], {"user_id": "x"})
+
+    mode = backend.connections[0].execute("pragma journal_mode").fetchone()[0]
+    assert mode == "wal"
+    db.close()
+
+    # Survives a restart
+    db = DBManager(backend=SQLiteBackend(str(tmp_path / "bio.db")))
+    assert np.array_equal(db.get_model(user["id"])["mean_vector"], mean + 1)
+    db.close()
+
+
+def test_sqlite_pool_is_shared_across_threads(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "bio.db"), pool_size=3)
+    errors = []
+
+    def worker(n):
+        try:
+            for i in range(50):
+                user = backend.upsert_user(f"user{n}-{i % 5}")
+                backend.upsert_model({"user_id": user["id"], "transform_matrix": "a",
+                                      "mean_vector": str(i), "threshold": 1.0})
+                assert backend.fetch_model(user["id"])["mean_vector"] is not None
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    with backend._connection() as conn:
+        assert conn.execute("select count(*) from biometrics").fetchone()[0] == 30
+    backend.close()
+
+
+def test_local_first_syncs_in_the_background():
+    client = FakeSupabase()
+    remote = SupabaseBackend(client=client)
+    backend = LocalFirstBackend(SQLiteBackend(":memory:"), remote, sync_interval=None)
+    db = DBManager(backend=backend)
+
+    user = db.register_user("carol")
+    for i in range(3):
+        db.save_model(user["id"], np.full(3, 0.02), np.full(3, 0.1 * i), 3.0)
+    db.update_mean_vector(user["id"], np.full(3, 0.5))
+    # Nothing has left the device yet
+    assert client.round_trips == 0 and backend.pending() == 1
+
+    # Offline remote: the row stays queued
+    client.table = None
+    assert backend.sync() == 0 and backend.pending() == 1
+    del client.table
+
+    # One user upsert plus one coalesced model write
+    assert backend.sync() == 1 and backend.pending() == 0
+    assert client.round_trips == 2
+    remote_id = client.tables["users"][0]["id"]
+    assert remote_id != user["id"]
+    assert DBManager(backend=remote).get_model(remote_id)["mean_vector"][0] == 0.5
+
+    # A new device reads the model through from the remote
+    other = DBManager(backend=LocalFirstBackend(SQLiteBackend(":memory:"), remote, sync_interval=None))
+    new_user = other.register_user("carol")
+    model = other.get_model(new_user["id"])
+    assert np.array_equal(model["mean_vector"], np.full(3, 0.5))
+    assert other.backend.local.fetch_model(new_user["id"]) is not None
+    assert other.backend.pending() == 0
+
+
+def test_local_first_read_through_only_reads_the_remote():
+    client = FakeSupabase()
+    remote = SupabaseBackend(client=client)
+    db = ThreadedDBManager(backend=LocalFirstBackend(SQLiteBackend(":memory:"), remote, sync_interval=None))
+    user = db.register_user("dave")
+
+    # Unknown remotely: a miss, and no remote user created by looking
+    assert db.get_model(user["id"]).result(timeout=5) is None
+    assert not client.tables.get("users")
+
+    db.save_model(user["id"], np.full(3, 0.02), np.full(3, 0.1), 3.0)
+    future = db.get_model(user["id"])
+    assert future.done() and future.result()["threshold"] == 3.0
+    db.close()
+
+
+def test_local_first_sync_keeps_writes_made_during_a_push():
+    client = FakeSupabase()
+    remote = SupabaseBackend(client=client)
+    backend = LocalFirstBackend(SQLiteBackend(":memory:"), remote, sync_interval=None)
+    db = DBManager(backend=backend)
+    user = db.register_user("erin")
+    db.save_model(user["id"], np.full(3, 0.02), np.full(3, 0.1), 3.0)
+
+    # An adaptive update lands while the row is on its way to the remote
+    push = remote.upsert_model
+
+    def racing_push(row):
+        push(row)
+        db.update_mean_vector(user["id"], np.full(3, 0.2))
+
+    remote.upsert_model = racing_push
+    assert backend.sync() == 1 and backend.pending() == 1
+    remote.upsert_model = push
+    assert backend.sync() == 1 and backend.pending() == 0
+    remote_id = client.tables["users"][0]["id"]
+    assert DBManager(backend=remote).get_model(remote_id)["mean_vector"][0] == 0.2
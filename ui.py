@@ -1,19 +1,40 @@
 import customtkinter as ctk
-import time
+from async_db import deliver
+from biometrics import BACKSPACE_CODE, EVENT_DOWN, EVENT_UP
+from free_text import LEARN_CONFIDENCE, ContinuousAuthenticator, FreeTextProfile
+from keystroke_buffer import TIMESTAMP_SCALE, KeystrokeBuffer, clock
+from metrics import METRICS
+from replay_guard import ReplayGuard
+from session_archive import (KIND_ENROLL, KIND_VERIFY, OUTCOME_ACCEPTED, OUTCOME_REJECTED,
+                             OUTCOME_UNUSABLE)
 # Removed pynput to fix macOS crash (Trace/BPT trap)
 # Using native Tkinter bindings instead.
 import tkinter as tk
 
 PASSPHRASE = "The quick brown fox jumps over the lazy dog"
 REQUIRED_SAMPLES = 10
+# Saving a new model: tries after the first, with the delay doubling from SAVE_RETRY_MS
+SAVE_RETRIES = 4
+SAVE_RETRY_MS = 1000
 
 class AuthUI(ctk.CTk):
-    def __init__(self, db_manager, biometrics_engine):
+    def __init__(self, db_manager, biometrics_engine, archive=None, daemon=None):
         print("[DEBUG] AuthUI __init__ start")
         super().__init__()
         
         self.db = db_manager
         self.bio = biometrics_engine
+        # Optional session_archive.ArchiveWriter for raw keystroke sessions
+        self.archive = archive
+        # Optional auth_client.ThreadedAuthClient: enrollment and scoring run in the daemon
+        self.daemon = daemon
+        # Recent accepted attempts, to refuse a replayed event stream (the daemon keeps its own)
+        self.replays = ReplayGuard()
+        # A daemon verification is in flight (its result comes back through deliver)
+        self.verify_pending = False
+        # Free-text typing rhythm of the logged-in user (continuous authentication)
+        self.free_text = None
+        self.continuous = None
         
         print("[DEBUG] Setting Up Window...")
         self.title("Keystroke Auth")
@@ -25,7 +46,10 @@ class AuthUI(ctk.CTk):
         self.model_data = None
         
         # Data Collection
-        self.current_keys = []
+        # Preallocated capture: nothing is allocated per key event
+        self.keys = KeystrokeBuffer()
+        self.key_stream = self.bio.new_stream(len(PASSPHRASE), TIMESTAMP_SCALE)
+        self.pending_submission = None
         self.training_samples = []
         self.listener = None
         self.listening_active = False
@@ -50,21 +74,26 @@ class AuthUI(ctk.CTk):
         # Allowed chars set for strict filtering
         self.allowed_chars = set(PASSPHRASE)
 
+    @METRICS.timed("ui.key_press")
     def on_key_press(self, event):
-        timestamp = time.time()
+        timestamp = clock()
         char = event.char
         # Strict Filter: Only allow chars exactly in the passphrase
         if not char or (char not in self.allowed_chars and char != '\r'):
              if event.keysym == "BackSpace":
-                 self.current_keys.append(("Key.backspace", 'down', timestamp))
+                 self.keys.push(BACKSPACE_CODE, EVENT_DOWN, timestamp)
+                 self.key_stream.push_code(BACKSPACE_CODE, EVENT_DOWN, timestamp)
              return
         
         if char == '\r': return # Ignore Enter itself
 
-        self.current_keys.append((char, 'down', timestamp))
+        code = ord(char)
+        self.keys.push(code, EVENT_DOWN, timestamp)
+        self.key_stream.push_code(code, EVENT_DOWN, timestamp)
 
+    @METRICS.timed("ui.key_release")
     def on_key_release(self, event):
-        timestamp = time.time()
+        timestamp = clock()
         char = event.char
         # Strict Filter Match
         if not char or (char not in self.allowed_chars and char != '\r'):
@@ -72,7 +101,51 @@ class AuthUI(ctk.CTk):
         
         if char == '\r': return
 
-        self.current_keys.append((char, 'up', timestamp))
+        code = ord(char)
+        self.keys.push(code, EVENT_UP, timestamp)
+        self.key_stream.push_code(code, EVENT_UP, timestamp)
+
+        # Enter was pressed before the last key came up; submit now
+        if self.pending_submission and not self.key_stream.is_waiting:
+            callback, self.pending_submission = self.pending_submission, None
+            callback()
+
+    def stop_listener(self):
+        """Ends passphrase capture (Tk bindings die with their widgets)."""
+        self.listening_active = False
+        self.clear_keys()
+
+    def archive_session(self, kind, outcome, events=None):
+        """
+        Queues the captured session (or events, a copy of keys.view() taken
+        earlier) for the raw archive (never blocks).
+        """
+        if events is None:
+            events = self.keys.view() if len(self.keys) else None
+        if self.archive is not None and events is not None:
+            user_id = self.current_user['id'] if self.current_user else None
+            self.archive.record(user_id, PASSPHRASE, *events, kind, outcome)
+
+    def clear_keys(self):
+        self.keys.clear()
+        self.key_stream.reset()
+        self.pending_submission = None
+
+    def current_features(self):
+        """
+        Streamed vector when complete (O(1)), else a full extraction.
+        None when the capture is unusable, including one that outgrew the
+        key buffer (its oldest events are gone).
+        """
+        if self.keys.overflowed:
+            METRICS.count("capture.overflows")
+            return None
+        if self.key_stream.is_complete:
+            return self.key_stream.features()
+        # n_keys=None keeps extract_features' length, for the onboarding messages
+        X, valid = self.bio.extract_features_batch(*self.keys.packed(),
+                                                   timestamp_scale=TIMESTAMP_SCALE)
+        return X[0] if valid[0] else None
 
     # --- LOGIN VIEW ---
     def show_login(self):
@@ -86,25 +159,54 @@ class AuthUI(ctk.CTk):
         self.username_entry = ctk.CTkEntry(self.container, placeholder_text="Username")
         self.username_entry.pack(pady=10)
         
-        ctk.CTkButton(self.container, text="Continue", command=self.handle_login).pack(pady=20)
+        self.btn_login = ctk.CTkButton(self.container, text="Continue", command=self.handle_login)
+        self.btn_login.pack(pady=20)
         
         self.lbl_msg = ctk.CTkLabel(self.container, text="", text_color="red")
         self.lbl_msg.pack()
 
+    def set_login_loading(self, loading, message=""):
+        self.btn_login.configure(state="disabled" if loading else "normal")
+        self.username_entry.configure(state="disabled" if loading else "normal")
+        self.lbl_msg.configure(text=message, text_color="gray" if loading else "red")
+
     def handle_login(self):
         username = self.username_entry.get()
         if not username: return
         
-        user = self.db.register_user(username)
-        if user:
-            self.current_user = user
-            # Check if model exists
-            model = self.db.get_model(user['id'])
-            if model:
-                self.model_data = model
-                self.show_widget_mode()
-            else:
-                self.show_onboarding()
+        # DB calls may be Futures (AsyncDBManager); results come back via after()
+        self.set_login_loading(True, "Connecting...")
+        deliver(self, self.db.register_user(username), self.on_user_registered, self.on_login_error)
+
+    def on_user_registered(self, user):
+        if not user:
+            self.set_login_loading(False, "Login failed. Try again.")
+            return
+        self.current_user = user
+        self.free_text = None
+        # Check if model exists
+        self.lbl_msg.configure(text="Loading profile...")
+        deliver(self, self.db.get_model(user['id']), self.on_model_loaded, self.on_login_error)
+
+    def on_model_loaded(self, model):
+        if model:
+            self.model_data = model
+            if self.daemon is None:
+                user_id = self.current_user['id']
+                deliver(self, self.db.get_recent_attempts(user_id),
+                        lambda vectors: self.replays.load(user_id, vectors), self.log_db_error)
+            self.show_widget_mode()
+        else:
+            self.show_onboarding()
+
+    def on_login_error(self, error):
+        METRICS.count("db.errors")
+        print(f"[ERROR] Login request failed: {error}")
+        self.set_login_loading(False, "Connection error. Try again.")
+
+    def log_db_error(self, error):
+        METRICS.count("db.errors")
+        print(f"[ERROR] Database request failed: {error}")
 
     # --- ONBOARDING VIEW ---
     def show_onboarding(self):
@@ -139,8 +241,7 @@ class AuthUI(ctk.CTk):
         self.input_entry = ctk.CTkEntry(self.container, width=450, placeholder_text="Type phrase here...", font=("Courier", 14))
         self.input_entry.pack(pady=10)
 
-        # Retry Logic Wrapper
-        self.input_entry.bind("<Return>", lambda e: self.attempt_submission_with_retry(self.handle_onboarding_submission_logic))
+        self.input_entry.bind("<Return>", lambda e: self.submit_when_ready(self.handle_onboarding_submission_logic))
         
         # Keystroke Bindings
         self.setup_keystroke_bindings(self.input_entry)
@@ -154,7 +255,7 @@ class AuthUI(ctk.CTk):
         self.input_entry.focus()
 
     def reset_input_state(self):
-        self.current_keys.clear()
+        self.clear_keys()
         self.lbl_feedback.configure(text="Start typing...", text_color="gray")
         self.lbl_passphrase.configure(text_color="cyan") # Reset color
 
@@ -172,19 +273,15 @@ class AuthUI(ctk.CTk):
             self.lbl_feedback.configure(text="Typo detected! Check your spelling.", text_color="#FF5555")
             self.lbl_passphrase.configure(text_color="orange")
 
-    def attempt_submission_with_retry(self, callback, attempts=0):
-        features = self.bio.extract_features(self.current_keys)
-        
-        expected_len = len(PASSPHRASE) + (len(PASSPHRASE) - 1)
-        
-        if features is not None and len(features) == expected_len:
-            callback()
+    def submit_when_ready(self, callback):
+        # If Enter beat the last key-up, on_key_release submits once it lands.
+        # A second Enter while waiting submits whatever we have.
+        if self.key_stream.is_waiting and self.pending_submission is None:
+            METRICS.count("ui.submit_deferred")
+            self.pending_submission = callback
             return
-
-        if attempts < 3:
-            self.after(50, lambda: self.attempt_submission_with_retry(callback, attempts+1))
-        else:
-            callback()
+        self.pending_submission = None
+        callback()
 
     def handle_onboarding_submission_logic(self):
         self.handle_onboarding_submission(None)
@@ -197,11 +294,11 @@ class AuthUI(ctk.CTk):
             self.lbl_progress.configure(text=f"Progress: {len(self.training_samples)}/{REQUIRED_SAMPLES}")
             self.identify_typo(text)
             self.input_entry.delete(0, 'end')
-            self.current_keys = []
+            self.clear_keys()
             return
             
         # 2. Extract Features
-        features = self.bio.extract_features(self.current_keys)
+        features = self.current_features()
         
         expected_dwells = len(PASSPHRASE)
         expected_flights = len(PASSPHRASE) - 1
@@ -211,7 +308,8 @@ class AuthUI(ctk.CTk):
         if features is None:
             self.lbl_feedback.configure(text="Oops! Please type naturally without using Backspace.", text_color="orange")
             self.input_entry.delete(0, 'end')
-            self.current_keys = []
+            self.archive_session(KIND_ENROLL, OUTCOME_UNUSABLE)
+            self.clear_keys()
             return
 
         if len(features) != expected_total:
@@ -222,7 +320,8 @@ class AuthUI(ctk.CTk):
              
              self.lbl_feedback.configure(text=msg, text_color="orange")
              self.input_entry.delete(0, 'end')
-             self.current_keys = []
+             self.archive_session(KIND_ENROLL, OUTCOME_UNUSABLE)
+             self.clear_keys()
              return
         
         # 4. Success!
@@ -234,7 +333,8 @@ class AuthUI(ctk.CTk):
         self.lbl_feedback.configure(text=f"Great! Sample {count} recorded.", text_color="#55FF55")
         
         self.input_entry.delete(0, 'end')
-        self.current_keys = []
+        self.archive_session(KIND_ENROLL, OUTCOME_ACCEPTED)
+        self.clear_keys()
         
         if count >= REQUIRED_SAMPLES:
             self.finish_onboarding()
@@ -254,20 +354,56 @@ class AuthUI(ctk.CTk):
         self.lbl_progress.configure(text="Training Model...", text_color="yellow")
         self.update()
         
-        # Train
-        std_vec, mean_vec, threshold = self.bio.train_model(self.training_samples)
-        
-        # Save (We store std_vec in the 'transform_matrix' column for schema compat)
-        self.db.save_model(self.current_user['id'], std_vec, mean_vec, threshold)
+        if self.daemon is not None:
+            # The daemon trains and stores the model
+            self.save_trained_model(0)
+            return
+
+        # Train (same model as train_model, plus the state for online updates)
+        std_vec, mean_vec, threshold, state = self.bio.enroll(self.training_samples)
         
         self.model_data = {
-            "transform_matrix": std_vec, # Actually std_vector now
+            "transform_matrix": std_vec, # std_vector, or the scorer's matrix
             "mean_vector": mean_vec,
-            "threshold": threshold
+            "threshold": threshold,
+            "online_state": state
         }
         
+        self.save_trained_model(0)
+
+    def save_trained_model(self, attempt):
+        """Stores the trained model; a failed save is retried (not retrained) with backoff."""
+        self.lbl_progress.configure(text="Saving Model...", text_color="yellow")
+        on_error = lambda error: self.on_save_error(error, attempt)
+        if self.daemon is not None:
+            deliver(self, self.daemon.enroll(self.current_user['id'], self.training_samples),
+                    self.on_enrolled, on_error)
+            return
+
+        # Save (We store std_vec in the 'transform_matrix' column for schema compat)
+        model = self.model_data
+        deliver(self, self.db.save_model(self.current_user['id'], model['transform_matrix'],
+                                         model['mean_vector'], model['threshold'],
+                                         model['online_state'], self.training_samples),
+                lambda _: self.after(1000, self.show_widget_mode), on_error)
+
+    def on_enrolled(self, model):
+        self.model_data = model
         self.after(1000, self.show_widget_mode)
 
+    def on_save_error(self, error, attempt):
+        self.log_db_error(error)
+        if attempt >= SAVE_RETRIES:
+            print(f"[ERROR] Giving up on saving the model after {attempt + 1} tries")
+            self.lbl_progress.configure(text="Could not save model. Check the connection and log in again.",
+                                        text_color="red")
+            return
+        delay = SAVE_RETRY_MS * 2 ** attempt
+        self.lbl_progress.configure(text=f"Could not save model. Retrying in {delay // 1000}s...",
+                                    text_color="orange")
+        METRICS.count("db.save_retries")
+        self.after(delay, lambda: self.save_trained_model(attempt + 1))
+
     # --- WIDGET VIEW ---
     def show_widget_mode(self):
         self.stop_listener() # Verify explicit only
@@ -278,7 +414,7 @@ class AuthUI(ctk.CTk):
         # Create a specific Toplevel for the widget or reuse root?
         # Reusing root is easier for lifecycle.
         self.clear_frame()
-        self.geometry("250x120+50+50") # Bottom corner approx?
+        self.geometry("250x190+50+50") # Bottom corner approx?
         self.deiconify()
         self.attributes('-topmost', True)
         self.title("BioAuth Widget")
@@ -296,7 +432,64 @@ class AuthUI(ctk.CTk):
         self.btn_verify = ctk.CTkButton(self.container, text="Verify", command=self.open_verify_popup)
         self.btn_verify.pack(pady=10)
 
+        # Continuous authentication: rolling confidence while typing anything
+        if self.free_text is None:
+            self.free_text = FreeTextProfile.from_model(self.model_data, PASSPHRASE, REQUIRED_SAMPLES)
+        self.continuous = ContinuousAuthenticator(self.free_text, TIMESTAMP_SCALE)
+        self.shown_confidence = None
+        # keycode -> code pushed for each key held down in the free-text box
+        self.free_keys_down = {}
+        self.lbl_confidence = ctk.CTkLabel(self.container, text="Confidence: --", text_color="gray")
+        self.lbl_confidence.pack()
+        self.btn_free_text = ctk.CTkButton(self.container, text="Type Freely", command=self.open_free_text_popup)
+        self.btn_free_text.pack(pady=5)
+
+    def open_free_text_popup(self):
+        if hasattr(self, 'free_popup') and self.free_popup.winfo_exists():
+            self.free_popup.lift()
+            return
 
+        self.free_popup = ctk.CTkToplevel(self)
+        self.free_popup.geometry("500x250")
+        self.free_popup.title("Continuous Verification")
+        ctk.CTkLabel(self.free_popup, text="Type anything; the widget shows how sure it is that it's you.").pack(pady=10)
+        self.free_text_box = ctk.CTkTextbox(self.free_popup, width=460, height=170)
+        self.free_text_box.pack(pady=5)
+        self.free_text_box.bind("<KeyPress>", self.on_free_key_press)
+        self.free_text_box.bind("<KeyRelease>", self.on_free_key_release)
+        self.free_text_box.focus()
+
+    @METRICS.timed("ui.free_key_press")
+    def on_free_key_press(self, event):
+        timestamp = clock()
+        if event.keysym == "BackSpace":
+            self.continuous.push_code(BACKSPACE_CODE, EVENT_DOWN, timestamp)
+        elif event.char:
+            # Released by keycode: Shift+a can come up as 'a' after a Down 'A'
+            self.free_keys_down[event.keycode] = ord(event.char)
+            self.continuous.push_code(ord(event.char), EVENT_DOWN, timestamp)
+
+    @METRICS.timed("ui.free_key_release")
+    def on_free_key_release(self, event):
+        timestamp = clock()
+        code = self.free_keys_down.pop(event.keycode, None)
+        if code is not None:
+            self.continuous.push_code(code, EVENT_UP, timestamp)
+            self.show_confidence()
+
+    def show_confidence(self):
+        confidence = self.continuous.confidence
+        # "--" until enough keys; Tk is only touched when the number changes
+        if confidence is None or int(confidence) == self.shown_confidence:
+            return
+        shown = self.shown_confidence = int(confidence)
+        if shown >= LEARN_CONFIDENCE:
+            color = "#00FF00"
+        elif shown >= 40:
+            color = "orange"
+        else:
+            color = "#FF0000"
+        self.lbl_confidence.configure(text=f"Confidence: {shown}%", text_color=color)
 
     def open_verify_popup(self):
         # Popup window
@@ -319,15 +512,15 @@ class AuthUI(ctk.CTk):
         
         self.verify_entry.focus()
         
-        self.verify_entry.bind("<Return>", lambda e: self.attempt_submission_with_retry(self.perform_verification_logic))
+        self.verify_entry.bind("<Return>", lambda e: self.submit_when_ready(self.perform_verification_logic))
         
         # Use safe bindings
         self.setup_keystroke_bindings(self.verify_entry)
         # Clear keys on focus
-        self.verify_entry.bind("<FocusIn>", lambda e: self.current_keys.clear())
+        self.verify_entry.bind("<FocusIn>", lambda e: self.clear_keys())
         
         # Reset keys
-        self.current_keys = []
+        self.clear_keys()
 
     def perform_verification_logic(self):
         self.perform_verification(None)
@@ -336,10 +529,11 @@ class AuthUI(ctk.CTk):
         text = self.verify_entry.get()
         if text != PASSPHRASE:
             self.verify_entry.delete(0, 'end')
+            self.clear_keys()
             self.lbl_verify_msg.configure(text="Wrong Passphrase! Try again.", text_color="red")
             return
 
-        features = self.bio.extract_features(self.current_keys)
+        features = self.current_features()
         try:
              mean_vec = self.model_data['mean_vector']
         except:
@@ -347,34 +541,94 @@ class AuthUI(ctk.CTk):
         
         if features is None or features.shape != mean_vec.shape:
              self.verify_entry.delete(0, 'end')
+             self.archive_session(KIND_VERIFY, OUTCOME_UNUSABLE)
+             METRICS.count("verify.unusable")
+             self.clear_keys()
              self.lbl_verify_msg.configure(text="Typing unclear. Try smoother.", text_color="orange")
              return
 
+        if self.daemon is not None:
+            if self.verify_pending:
+                return
+            # Scored, and adapted on a confident accept, by the daemon; the keys
+            # are copied for the archive, as the user may type on meanwhile
+            self.verify_pending = True
+            self.lbl_verify_msg.configure(text="Verifying...", text_color="gray")
+            events = tuple(a.copy() for a in self.keys.view())
+            deliver(self, self.daemon.verify(self.current_user['id'], features, adapt=True),
+                    lambda result: self.on_verified(features, *result, events=events),
+                    self.on_verify_error)
+            return
+
         success, dist, score = self.bio.authenticate(
             features,
             self.model_data['mean_vector'],
             self.model_data['transform_matrix'],
             self.model_data['threshold']
         )
-        
+        replay = False
+        if success:
+            user_id = self.current_user['id']
+            if self.replays.is_replay(user_id, features):
+                # Too close to an earlier attempt to be typed again: refused, and not learned from
+                replay = True
+                success = False
+            else:
+                self.replays.record(user_id, features)
+                deliver(self, self.db.save_recent_attempts(user_id, self.replays.history(user_id)),
+                        lambda _: None, self.log_db_error)
+        self.on_verified(features, success, dist, score, replay)
+
+    def on_verify_error(self, error):
+        self.verify_pending = False
+        self.log_db_error(error)
+        if self.popup.winfo_exists():
+            self.lbl_verify_msg.configure(text="Verifier unavailable. Try again.", text_color="orange")
+
+    def on_verified(self, features, success, dist, score, replay, events=None):
+        self.verify_pending = False
+        if replay:
+            print("[INFO] Replayed attempt rejected")
+            METRICS.count("verify.replays")
+        self.archive_session(KIND_VERIFY, OUTCOME_ACCEPTED if success else OUTCOME_REJECTED, events)
+        METRICS.count("verify.accepted" if success else "verify.rejected")
+        if not self.popup.winfo_exists():
+            # Closed while the daemon was scoring: just the widget status
+            self.update_widget_status(success, score)
+            return
+
         if success:
             self.popup.destroy()
             
             # --- ADAPTIVE LEARNING (The "Smartness") ---
             # If high confidence (Score > 85?), update the model
-            if score > 85:
+            # (online updates exist for scaled Manhattan models only)
+            if self.daemon is None and score > 85 and self.model_data['transform_matrix'].ndim == 1:
                 print("[INFO] Adaptive Update Triggered")
-                new_mean = self.bio.adapt_model(self.model_data['mean_vector'], features)
-                self.db.update_mean_vector(self.current_user['id'], new_mean)
+                METRICS.count("verify.adaptive_updates")
+                # Online update of mean, std and threshold (constant memory)
+                state = self.bio.adapt_online_model(self.model_data, features)
+                deliver(self, self.db.update_online_model(self.current_user['id'], state),
+                        lambda _: None, self.log_db_error)
                 # Update local state
-                self.model_data['mean_vector'] = new_mean
+                std_vec, mean_vec, threshold = state.model()
+                self.model_data.update({
+                    "transform_matrix": std_vec,
+                    "mean_vector": mean_vec,
+                    "threshold": threshold,
+                    "online_state": state
+                })
                 self.update_widget_status(True, score, "Verified + Learned")
             else:
                 self.update_widget_status(True, score)
                 
         else:
             self.verify_entry.delete(0, 'end')
-            self.lbl_verify_msg.configure(text=f"Failed ({int(score)}%). Try again.", text_color="red")
+            self.clear_keys()
+            if replay:
+                self.lbl_verify_msg.configure(text="Replayed input rejected.", text_color="red")
+            else:
+                self.lbl_verify_msg.configure(text=f"Failed ({int(score)}%). Try again.", text_color="red")
             self.update_widget_status(False, score, "Last Attempt Failed")
 
     def update_widget_status(self, success, score, message=None):
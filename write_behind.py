@@ -0,0 +1,125 @@
+import threading
+import time
+
+from metrics import METRICS
+
+# Flush once this many users have updates pending, even before the timer
+MAX_PENDING = 256
+
+
+class WriteBehindQueue:
+    """
+    Coalesces partial model updates per user and writes them in batches.
+
+    put(user_id, fields) merges fields into whatever is already pending
+    for that user (last writer wins per column), so a user verifying ten
+    times between flushes costs one row write instead of ten. A
+    background thread hands the pending set to write(updates), a list of
+    (user_id, fields) such as StorageBackend.update_models, every
+    interval seconds, or as soon as max_pending users are waiting.
+    close() flushes whatever is left.
+
+    A failed batch is put back (under anything newer) and retried on the
+    next flush; last_error keeps the exception.
+    """
+
+    def __init__(self, write, interval=1.0, max_pending=MAX_PENDING):
+        self.write = write
+        self.interval = interval
+        self.max_pending = max_pending
+        self.pending = {}  # user_id -> merged fields
+        self.cond = threading.Condition()
+        # Held for the length of each write, so discard() can't race a batch in flight
+        self.write_lock = threading.Lock()
+        self.closed = False
+        self.last_error = None
+
+        self.updates = 0  # put() calls
+        self.written = 0  # rows written
+        self.batches = 0
+
+        self.thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self.thread.start()
+
+    def __len__(self):
+        return len(self.pending)
+
+    def put(self, user_id, fields):
+        with self.cond:
+            if self.closed:
+                raise RuntimeError("WriteBehindQueue is closed")
+            pending = self.pending.get(user_id)
+            if pending is None:
+                self.pending[user_id] = dict(fields)
+            else:
+                pending.update(fields)
+            self.updates += 1
+            if len(self.pending) >= self.max_pending:
+                self.cond.notify()
+
+    def get(self, user_id):
+        """The fields still waiting to be written for user_id (a copy), or None."""
+        with self.cond:
+            pending = self.pending.get(user_id)
+            return dict(pending) if pending is not None else None
+
+    def discard(self, user_id):
+        """
+        Drops user_id's pending fields, e.g. before a full save_model that
+        replaces them, and returns them (or None). Waits for a batch in
+        flight, so it can't land later.
+        """
+        with self.write_lock:
+            with self.cond:
+                return self.pending.pop(user_id, None)
+
+    def flush(self):
+        """Writes everything pending now, on the calling thread."""
+        with self.write_lock:
+            with self.cond:
+                if not self.pending:
+                    return
+                batch, self.pending = self.pending, {}
+            try:
+                with METRICS.timer("db.write_behind_flush"):
+                    self.write(list(batch.items()))
+            except Exception as e:
+                METRICS.count("db.write_behind_errors")
+                self.last_error = e
+                print(f"[ERROR] Write-behind flush failed: {e}")
+                with self.cond:
+                    # Anything put since the batch was taken is newer
+                    for user_id, fields in batch.items():
+                        self.pending[user_id] = {**fields, **self.pending.get(user_id, {})}
+                raise
+            self.written += len(batch)
+            self.batches += 1
+
+    def close(self):
+        """Stops the flush thread and writes whatever is still pending."""
+        with self.cond:
+            if self.closed:
+                return
+            self.closed = True
+            self.cond.notify()
+        self.thread.join()
+        self.flush()
+
+    def _run(self):
+        failed = False
+        while True:
+            with self.cond:
+                deadline = time.monotonic() + self.interval
+                # After a failed write, wait out the interval however much is pending
+                while not self.closed and (failed or len(self.pending) < self.max_pending):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+                if self.closed:
+                    return
+            try:
+                self.flush()
+                failed = False
+            except Exception:
+                failed = True  # kept in pending and logged; retried next interval
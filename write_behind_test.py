@@ -0,0 +1,102 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from async_db import AsyncDBManager
+from async_db_test import SlowAsyncSupabase
+from db_manager import DBManager, row_to_model
+from online_model import OnlineModelState
+from storage import SQLiteBackend
+from write_behind import WriteBehindQueue
+
+
+class CountingBackend(SQLiteBackend):
+    def __init__(self):
+        super().__init__(":memory:")
+        self.batches = []
+
+    def update_models(self, updates):
+        self.batches.append(len(updates))
+        super().update_models(updates)
+
+
+def test_adaptive_updates_coalesce_per_user():
+    backend = CountingBackend()
+    db = DBManager(backend=backend, write_behind=60)
+    users = [db.register_user(f"user{u}")["id"] for u in range(3)]
+    rng = np.random.default_rng(0)
+    for user_id in users:
+        db.save_model(user_id, np.full(4, 0.02), np.full(4, 0.1), 4.0)
+
+    state = OnlineModelState.from_samples(0.1 + 0.01 * rng.random((10, 4)))
+    for i in range(20):
+        state.update(0.1 + 0.01 * rng.random(4))
+        db.update_online_model(users[i % 3], state)
+    db.update_mean_vector(users[0], np.full(4, 0.3))
+
+    # Nothing written yet, but a cold read already sees the queued update
+    assert backend.batches == [] and len(db.writes) == 3
+    db.cache.clear()
+    assert np.array_equal(db.get_model(users[0])["mean_vector"], np.full(4, 0.3))
+    assert np.array_equal(db.get_model(users[1])["transform_matrix"], state.model()[0])
+
+    # 21 updates, one batch of three rows
+    db.flush()
+    assert backend.batches == [3] and db.writes.updates == 21
+    assert np.array_equal(row_to_model(backend.fetch_model(users[0]))["mean_vector"], np.full(4, 0.3))
+    assert np.array_equal(row_to_model(backend.fetch_model(users[1]))["mean_vector"], state.model()[1])
+
+    # Re-enrollment drops a queued update instead of being overwritten by it
+    db.update_mean_vector(users[2], np.full(4, 0.5))
+    db.save_model(users[2], np.full(4, 0.03), np.full(4, 0.2), 4.0)
+    db.flush()
+    assert backend.batches == [3]
+    assert np.array_equal(row_to_model(backend.fetch_model(users[2]))["mean_vector"], np.full(4, 0.2))
+    db.close()
+
+
+def test_flushes_on_size_and_retries_failed_batches():
+    written = []
+    failures = [ConnectionError("network down")]
+    wrote = threading.Event()
+
+    def write(updates):
+        if failures:
+            raise failures.pop()
+        written.append(dict(updates))
+        wrote.set()
+
+    queue = WriteBehindQueue(write, interval=60, max_pending=3)
+    for u in range(3):
+        queue.put(u, {"threshold": 1.0})
+    # The size threshold wakes the flush thread, whose write fails
+    deadline = time.monotonic() + 5
+    while queue.last_error is None:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+    queue.put(0, {"threshold": 2.0, "mean_vector": "m"})
+    assert len(queue) == 3 and queue.get(0) == {"threshold": 2.0, "mean_vector": "m"}
+
+    queue.close()
+    assert written == [{0: {"threshold": 2.0, "mean_vector": "m"}, 1: {"threshold": 1.0},
+                        2: {"threshold": 1.0}}]
+    with pytest.raises(RuntimeError):
+        queue.put(0, {"threshold": 3.0})
+
+
+def test_async_manager_queues_off_the_loop():
+    client = SlowAsyncSupabase(0.01)
+    db = AsyncDBManager(None, None, client=client, write_behind=60)
+    user = db.register_user("carol").result()
+    db.save_model(user["id"], np.full(3, 0.02), np.full(3, 0.1), 3.0).result()
+    trips = client.round_trips
+
+    for v in range(10):
+        db.update_mean_vector(user["id"], np.full(3, v)).result()
+    assert client.round_trips == trips
+
+    db.close()
+    assert client.round_trips == trips + 1
+    assert np.array_equal(row_to_model(client.tables["biometrics"][0])["mean_vector"], np.full(3, 9))